@@ -0,0 +1,71 @@
+"""ledger_amount_cents
+
+Revision ID: 3f7a9c2e4b16
+Revises: 9d4e1b7a2c53
+Create Date: 2026-10-19 15:48:12.530971
+
+Replaces the double precision ledger_entries.amount with an exact BIGINT
+amount_cents. Existing values are rounded to the nearest cent through
+NUMERIC, so float noise such as 12.299999999 becomes 1230. The backfill runs
+in small committed batches and the covering index is rebuilt concurrently.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7a9c2e4b16'
+down_revision: Union[str, None] = '9d4e1b7a2c53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+BACKFILL_CENTS = sa.text("""
+    UPDATE ledger_entries SET amount_cents = ROUND(amount::numeric * 100)::bigint
+    WHERE id IN (SELECT id FROM ledger_entries WHERE amount_cents IS NULL ORDER BY id LIMIT :batch_size)
+""")
+
+BACKFILL_AMOUNTS = sa.text("""
+    UPDATE ledger_entries SET amount = amount_cents / 100.0
+    WHERE id IN (SELECT id FROM ledger_entries WHERE amount IS NULL ORDER BY id LIMIT :batch_size)
+""")
+
+
+def _run_batches(statement: sa.TextClause) -> None:
+    connection = op.get_bind()
+    while True:
+        with op.get_context().autocommit_block():
+            updated = connection.execute(statement, {"batch_size": BATCH_SIZE}).rowcount
+        if not updated:
+            break
+
+
+def upgrade() -> None:
+    op.add_column('ledger_entries', sa.Column('amount_cents', sa.BigInteger(), nullable=True))
+
+    _run_batches(BACKFILL_CENTS)
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_ledger_entries_user_period_cents', 'ledger_entries', ['user_id', 'year', 'month'], unique=False, postgresql_include=['category_id', 'credit_card_id', 'amount_cents'], postgresql_concurrently=True)
+
+    # Catch up rows written by the previous release while the backfill ran
+    op.execute(BACKFILL_CENTS.bindparams(batch_size=2 ** 31 - 1))
+
+    op.alter_column('ledger_entries', 'amount_cents', existing_type=sa.BigInteger(), nullable=False)
+    op.drop_index('ix_ledger_entries_user_period', table_name='ledger_entries')
+    op.execute("ALTER INDEX ix_ledger_entries_user_period_cents RENAME TO ix_ledger_entries_user_period")
+    op.drop_column('ledger_entries', 'amount')
+
+
+def downgrade() -> None:
+    op.add_column('ledger_entries', sa.Column('amount', sa.DOUBLE_PRECISION(precision=53), autoincrement=False, nullable=True))
+    _run_batches(BACKFILL_AMOUNTS)
+    op.alter_column('ledger_entries', 'amount', existing_type=sa.DOUBLE_PRECISION(precision=53), nullable=False)
+
+    op.drop_index('ix_ledger_entries_user_period', table_name='ledger_entries')
+    op.create_index('ix_ledger_entries_user_period', 'ledger_entries', ['user_id', 'year', 'month'], unique=False, postgresql_include=['category_id', 'credit_card_id', 'amount'])
+    op.drop_column('ledger_entries', 'amount_cents')
@@ -0,0 +1,40 @@
+"""add_merchant_categories_table
+
+Revision ID: 5e8b2d7c1f04
+Revises: a41f6c2d9e73
+Create Date: 2026-10-19 11:03:47.518220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8b2d7c1f04'
+down_revision: Union[str, None] = 'a41f6c2d9e73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('merchant_categories',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('merchant', sa.String(length=255), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('hit_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['spending_categories.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'merchant', name='unique_user_merchant')
+    )
+    op.create_index(op.f('ix_merchant_categories_id'), 'merchant_categories', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_merchant_categories_id'), table_name='merchant_categories')
+    op.drop_table('merchant_categories')
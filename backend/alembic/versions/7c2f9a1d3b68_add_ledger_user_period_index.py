@@ -0,0 +1,26 @@
+"""add_ledger_user_period_index
+
+Revision ID: 7c2f9a1d3b68
+Revises: 5e8b2d7c1f04
+Create Date: 2026-10-19 14:21:09.304117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2f9a1d3b68'
+down_revision: Union[str, None] = '5e8b2d7c1f04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_ledger_entries_user_period', 'ledger_entries', ['user_id', 'year', 'month'], unique=False, postgresql_include=['category', 'credit_card', 'amount'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ledger_entries_user_period', table_name='ledger_entries')
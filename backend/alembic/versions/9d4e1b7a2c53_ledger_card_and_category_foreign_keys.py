@@ -0,0 +1,120 @@
+"""ledger_card_and_category_foreign_keys
+
+Revision ID: 9d4e1b7a2c53
+Revises: 7c2f9a1d3b68
+Create Date: 2026-10-19 15:02:41.718342
+
+Replaces the free-text ledger_entries.credit_card/category copies with
+credit_card_id/category_id foreign keys. The backfill runs in small
+committed batches so rows are only locked briefly, and the new indexes are
+built concurrently. Names without a matching card/category get one created
+so no ledger data is lost.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4e1b7a2c53'
+down_revision: Union[str, None] = '7c2f9a1d3b68'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+BACKFILL_CATEGORY_IDS = sa.text("""
+    UPDATE ledger_entries l SET category_id = c.id
+    FROM spending_categories c
+    WHERE c.category_name = l.category
+      AND l.id IN (SELECT id FROM ledger_entries WHERE category_id IS NULL ORDER BY id LIMIT :batch_size)
+""")
+
+# Cards are per user and names may repeat across users; prefer the entry owner's card
+BACKFILL_CARD_IDS = sa.text("""
+    UPDATE ledger_entries l SET credit_card_id = (
+        SELECT cc.id FROM credit_cards cc
+        WHERE cc.name = l.credit_card
+        ORDER BY (cc.user_id = l.user_id) DESC, cc.id
+        LIMIT 1
+    )
+    WHERE l.id IN (SELECT id FROM ledger_entries WHERE credit_card_id IS NULL ORDER BY id LIMIT :batch_size)
+""")
+
+BACKFILL_NAMES = sa.text("""
+    UPDATE ledger_entries l SET category = c.category_name, credit_card = cc.name
+    FROM spending_categories c, credit_cards cc
+    WHERE c.id = l.category_id AND cc.id = l.credit_card_id
+      AND l.id IN (SELECT id FROM ledger_entries WHERE category IS NULL ORDER BY id LIMIT :batch_size)
+""")
+
+
+def _create_missing_references() -> None:
+    op.execute("""
+        INSERT INTO spending_categories (category_name)
+        SELECT DISTINCT l.category FROM ledger_entries l
+        WHERE NOT EXISTS (SELECT 1 FROM spending_categories c WHERE c.category_name = l.category)
+    """)
+    op.execute("""
+        INSERT INTO credit_cards (user_id, name, opening_time)
+        SELECT DISTINCT l.user_id, l.credit_card, now() FROM ledger_entries l
+        WHERE NOT EXISTS (SELECT 1 FROM credit_cards cc WHERE cc.name = l.credit_card)
+    """)
+
+
+def _run_batches(statement: sa.TextClause) -> None:
+    connection = op.get_bind()
+    while True:
+        with op.get_context().autocommit_block():
+            updated = connection.execute(statement, {"batch_size": BATCH_SIZE}).rowcount
+        if not updated:
+            break
+
+
+def upgrade() -> None:
+    op.add_column('ledger_entries', sa.Column('category_id', sa.Integer(), nullable=True))
+    op.add_column('ledger_entries', sa.Column('credit_card_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('ledger_entries_category_id_fkey', 'ledger_entries', 'spending_categories', ['category_id'], ['id'])
+    op.create_foreign_key('ledger_entries_credit_card_id_fkey', 'ledger_entries', 'credit_cards', ['credit_card_id'], ['id'])
+
+    _create_missing_references()
+    _run_batches(BACKFILL_CATEGORY_IDS)
+    _run_batches(BACKFILL_CARD_IDS)
+
+    with op.get_context().autocommit_block():
+        op.create_index('unique_ledger_entry_ids', 'ledger_entries', ['year', 'month', 'user_id', 'credit_card_id', 'category_id'], unique=True, postgresql_concurrently=True)
+        op.create_index('ix_ledger_entries_user_period_ids', 'ledger_entries', ['user_id', 'year', 'month'], unique=False, postgresql_include=['category_id', 'credit_card_id', 'amount'], postgresql_concurrently=True)
+
+    # Catch up rows written by the previous release while the backfill ran
+    _create_missing_references()
+    op.execute(BACKFILL_CATEGORY_IDS.bindparams(batch_size=2 ** 31 - 1))
+    op.execute(BACKFILL_CARD_IDS.bindparams(batch_size=2 ** 31 - 1))
+
+    op.alter_column('ledger_entries', 'category_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('ledger_entries', 'credit_card_id', existing_type=sa.Integer(), nullable=False)
+    op.drop_constraint('unique_ledger_entry', 'ledger_entries', type_='unique')
+    op.execute("ALTER TABLE ledger_entries ADD CONSTRAINT unique_ledger_entry UNIQUE USING INDEX unique_ledger_entry_ids")
+    op.drop_index('ix_ledger_entries_user_period', table_name='ledger_entries')
+    op.execute("ALTER INDEX ix_ledger_entries_user_period_ids RENAME TO ix_ledger_entries_user_period")
+    op.drop_column('ledger_entries', 'category')
+    op.drop_column('ledger_entries', 'credit_card')
+
+
+def downgrade() -> None:
+    op.add_column('ledger_entries', sa.Column('credit_card', sa.VARCHAR(length=100), autoincrement=False, nullable=True))
+    op.add_column('ledger_entries', sa.Column('category', sa.VARCHAR(length=100), autoincrement=False, nullable=True))
+    _run_batches(BACKFILL_NAMES)
+    op.alter_column('ledger_entries', 'category', existing_type=sa.VARCHAR(length=100), nullable=False)
+    op.alter_column('ledger_entries', 'credit_card', existing_type=sa.VARCHAR(length=100), nullable=False)
+
+    op.drop_constraint('unique_ledger_entry', 'ledger_entries', type_='unique')
+    op.create_unique_constraint('unique_ledger_entry', 'ledger_entries', ['year', 'month', 'user_id', 'credit_card', 'category'])
+    op.drop_index('ix_ledger_entries_user_period', table_name='ledger_entries')
+    op.create_index('ix_ledger_entries_user_period', 'ledger_entries', ['user_id', 'year', 'month'], unique=False, postgresql_include=['category', 'credit_card', 'amount'])
+
+    op.drop_constraint('ledger_entries_credit_card_id_fkey', 'ledger_entries', type_='foreignkey')
+    op.drop_constraint('ledger_entries_category_id_fkey', 'ledger_entries', type_='foreignkey')
+    op.drop_column('ledger_entries', 'credit_card_id')
+    op.drop_column('ledger_entries', 'category_id')
@@ -0,0 +1,36 @@
+"""add_ledger_archives_table
+
+Revision ID: b7d2f4e81c05
+Revises: e5c1a8f3d927
+Create Date: 2026-10-19 21:07:43.118904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2f4e81c05'
+down_revision: Union[str, None] = 'e5c1a8f3d927'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ledger_archives',
+    sa.Column('year', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('file_path', sa.String(length=500), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('total_cents', sa.BigInteger(), nullable=False),
+    sa.Column('checksum', sa.String(length=64), nullable=True),
+    sa.Column('removed_from_hot', sa.Boolean(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('removed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('year')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ledger_archives')
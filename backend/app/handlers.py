@@ -2,15 +2,28 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi import HTTPException
+from database.health import DatabaseUnavailableError
+
+def _database_unavailable_cause(exc: BaseException):
+    """Find a circuit-breaker rejection that a service re-raised as a generic error"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, DatabaseUnavailableError):
+            return exc
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return None
 
 def setup_exception_handlers(app: FastAPI) -> None:
     """Setup global exception handlers for better error messages"""
     
     @app.exception_handler(HTTPException)
     async def http_exception_handler(request: Request, exc: HTTPException):
+        exc = _database_unavailable_cause(exc) or exc
         return JSONResponse(
             status_code=exc.status_code,
-            content={"detail": exc.detail, "error_type": "http_exception"}
+            content={"detail": exc.detail, "error_type": "http_exception"},
+            headers=exc.headers
         )
 
     @app.exception_handler(RequestValidationError)
@@ -22,6 +35,9 @@ def setup_exception_handlers(app: FastAPI) -> None:
 
     @app.exception_handler(Exception)
     async def general_exception_handler(request: Request, exc: Exception):
+        unavailable = _database_unavailable_cause(exc)
+        if unavailable is not None:
+            return await http_exception_handler(request, unavailable)
         print(f"❌ Unhandled exception: {type(exc).__name__}: {str(exc)}")
         import traceback
         traceback.print_exc()
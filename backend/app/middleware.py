@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from datetime import datetime
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from config import ALLOWED_ORIGINS
 
@@ -13,4 +14,19 @@ def setup_cors_middleware(app: FastAPI) -> None:
         allow_methods=["*"],
         allow_headers=["*"],
         expose_headers=["*"],
-    ) 
\ No newline at end of file
+    )
+
+def setup_snapshot_middleware(app: FastAPI) -> None:
+    """Mark responses served from the local read-only snapshot with its age"""
+    
+    @app.middleware("http")
+    async def mark_snapshot_responses(request: Request, call_next):
+        response = await call_next(request)
+        taken_at = getattr(request.state, "snapshot_taken_at", None)
+        if taken_at is not None:
+            age = int((datetime.utcnow() - taken_at).total_seconds())
+            response.headers["X-Data-Source"] = "snapshot"
+            response.headers["X-Snapshot-Taken-At"] = taken_at.isoformat() + "Z"
+            response.headers["X-Snapshot-Age"] = str(age)
+            response.headers["Warning"] = '110 - "Response is Stale"'
+        return response
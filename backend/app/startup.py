@@ -1,62 +1,85 @@
+import time
+
 from fastapi import FastAPI
-from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
 
-# Global database connection status
-database_available = False
+def _on_database_available() -> None:
+    # Runs on the prober thread each time the database becomes available
+    from database.database import prewarm_pool
+    from database.database_config import get_pool_config
+    from services.invalidation_bus import flush_all
+    from services.ledger_journal import ledger_journal
+    # Caches may hold rows read from the snapshot during the outage
+    flush_all()
+    # Apply writes journaled during the outage without waiting for the next poll
+    ledger_journal.wake()
+    count = get_pool_config()["prewarm_connections"]
+    if count > 0:
+        started = time.perf_counter()
+        warmed = prewarm_pool(count)
+        print(f"🔥 Pre-warmed {warmed} pooled connection(s) in {(time.perf_counter() - started) * 1000:.0f}ms")
 
 def setup_database_startup(app: FastAPI) -> None:
-    """Setup database connection test on startup"""
+    """Setup the background database health prober"""
+    
+    @app.on_event("startup")
+    async def start_database_health_prober():
+        # Don't hold up serving on the database; the first probe settles availability shortly
+        from database.database import engine
+        from database.health import database_health
+        database_health.start(engine, on_available=_on_database_available)
+    
+    @app.on_event("startup")
+    async def start_snapshot_refresher():
+        # Keeps the local copy that ledger reads fall back to during an outage
+        from database.database import engine
+        from database.snapshot import ledger_snapshot
+        ledger_snapshot.start(engine)
+    
+    @app.on_event("startup")
+    async def start_ledger_journal_replay():
+        # Replays ledger writes accepted while the database was down, including ones
+        # journaled before this worker restarted
+        from services.ledger_journal import ledger_journal
+        ledger_journal.start()
     
     @app.on_event("startup")
-    async def test_database_connection():
-        global database_available
-        try:
-            from database.database import engine
-            from config import DATABASE_URL
-            
-            print("🔍 Testing database connection...")
-            print(f"   URL: {DATABASE_URL}")
-            
-            print("   ⏳ Attempting to connect...")
-            
-            with engine.connect() as connection:
-                # Test basic connection
-                result = connection.execute(text("SELECT 1"))
-                print("   ✅ Basic connection successful!")
-                
-                # Test database name
-                result = connection.execute(text("SELECT current_database()"))
-                db_name = result.scalar()
-                print(f"   📊 Connected to database: {db_name}")
-                
-                # List all tables
-                result = connection.execute(text("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                    ORDER BY table_name
-                """))
-                
-                tables = [row[0] for row in result]
-                print(f"   📋 Available tables: {tables}")
-                
-                # Test user permissions
-                result = connection.execute(text("SELECT current_user"))
-                user = result.scalar()
-                print(f"   👤 Connected as user: {user}")
-                
-                database_available = True
-                print("   🎉 Database connection successful!")
-                print("✅ Database is available for authentication")
-                
-        except Exception as e:
-            error_type = type(e).__name__
-            error_msg = str(e)
-            print(f"❌ Database connection failed: {error_type}")
-            print(f"💬 Error details: {error_msg}")
-            print("⚠️  Falling back to simplified authentication (no database)")
-            database_available = False
+    async def start_cache_invalidation_listener():
+        # Keeps this worker's in-process caches consistent with writes on other workers;
+        # the listener retries in the background if the database is not up yet
+        from database.database import engine
+        from services.invalidation_bus import start_listener
+        start_listener(engine)
+    
+    @app.on_event("shutdown")
+    async def stop_cache_invalidation_listener():
+        from services.invalidation_bus import stop_listener
+        stop_listener()
+    
+    @app.on_event("shutdown")
+    async def stop_ledger_journal_replay():
+        from services.ledger_journal import ledger_journal
+        ledger_journal.stop()
+    
+    @app.on_event("shutdown")
+    async def stop_snapshot_refresher():
+        from database.snapshot import ledger_snapshot
+        ledger_snapshot.stop()
+    
+    @app.on_event("shutdown")
+    async def stop_database_health_prober():
+        from database.health import database_health
+        database_health.stop()
 
 def get_database_status() -> bool:
-    """Get current database availability status"""
-    return database_available 
\ No newline at end of file
+    """Get current database availability status, as of the last background probe"""
+    from database.health import database_health
+    return database_health.available
+
+async def wait_for_database_status() -> bool:
+    """Get database availability, waiting (bounded) for the first probe if it hasn't finished"""
+    from database.health import database_health, STARTING
+    from database.database_config import get_pool_config
+    if database_health.state == STARTING:
+        await run_in_threadpool(database_health.wait_for_first_probe, get_pool_config()["startup_probe_timeout"])
+    return database_health.available
\ No newline at end of file
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Request, Response, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from database.models import User
 from auth import get_current_user, google_auth, logout, get_user_profile
 from auth_simple import google_auth_simple, logout_simple
 from database.database import get_db
-from app.startup import get_database_status
+from app.startup import wait_for_database_status
 from config import ENVIRONMENT
 from datetime import datetime
 from urllib.parse import urlparse
@@ -38,7 +38,7 @@ def _extract_database_info(database_url: str) -> dict:
 @router.post("/auth/google")
 async def auth_google(request: GoogleAuthRequest, response: Response, db = Depends(get_db)):
     """Google OAuth authentication endpoint"""
-    database_available = get_database_status()
+    database_available = await wait_for_database_status()
     if database_available:
         return await google_auth({"token": request.token}, response, db, request.stay_logged_in)
     else:
@@ -47,7 +47,7 @@ async def auth_google(request: GoogleAuthRequest, response: Response, db = Depen
 @router.post("/logout")
 async def auth_logout(response: Response):
     """Logout endpoint"""
-    database_available = get_database_status()
+    database_available = await wait_for_database_status()
     if database_available:
         return await logout(response)
     else:
@@ -100,6 +100,47 @@ async def get_pool_status():
             "timestamp": datetime.utcnow().isoformat()
         }
 
+@router.get("/debug/reference-cache")
+async def get_reference_cache_stats(current_user: User = Depends(get_current_user)):
+    """Get reference-data cache, request coalescing, invalidation bus and change feed statistics"""
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    from services.reference_cache import reference_cache
+    from services.request_coalescer import request_coalescer
+    from services.invalidation_bus import get_bus_stats
+    from services.change_feed import change_feed
+    return {
+        "reference_cache": reference_cache.get_stats(),
+        "request_coalescer": request_coalescer.get_stats(),
+        "invalidation_bus": get_bus_stats(),
+        "change_feed": change_feed.get_stats(),
+        "environment": ENVIRONMENT,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/debug/llm-metrics")
+async def get_llm_metrics(current_user: User = Depends(get_current_user)):
+    """Get model call latency, token and cost totals per route and per user"""
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    from services.llm_metrics import llm_metrics
+    return {
+        **llm_metrics.get_stats(),
+        "environment": ENVIRONMENT,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@router.get("/metrics/llm", response_class=PlainTextResponse)
+async def get_llm_metrics_prometheus(current_user: User = Depends(get_current_user)):
+    """Model call totals per route in Prometheus text format"""
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    from services.llm_metrics import llm_metrics
+    return llm_metrics.render_prometheus()
+
 # Core endpoints
 @router.get("/")
 async def root():
@@ -108,42 +149,28 @@ async def root():
 
 @router.get("/health")
 async def health_check():
-    """Health check endpoint with optimized database check"""
-    database_available = get_database_status()
-    
-    # Use cached database status to reduce connection overhead
-    db_status = "connected" if database_available else "disconnected"
-    db_error = None
-    
-    # Only do a full database check if we haven't established connection yet
-    if not database_available:
-        try:
-            from database.database import engine
-            from sqlalchemy import text
-            
-            # Use existing engine from database module
-            with engine.connect() as connection:
-                result = connection.execute(text("SELECT 1"))
-                db_status = "connected"
-                
-        except Exception as e:
-            db_status = "disconnected"
-            db_error = str(e)
+    """Health check endpoint, answered from the background prober's cached state"""
+    from database.health import database_health
+    from database.snapshot import ledger_snapshot
+    health = database_health.get_status()
     
     # Extract database connection info (hide sensitive data)
     from config import DATABASE_URL
     db_info = _extract_database_info(DATABASE_URL)
     
     return {
-        "status": "healthy" if db_status == "connected" else "degraded",
+        "status": "healthy" if health["available"] else "degraded",
         "backend": {
             "address": f"{ENVIRONMENT} server",
             "environment": ENVIRONMENT
         },
         "database": {
-            "status": db_status,
-            "available": database_available,
-            "error": db_error,
+            "status": "connected" if health["available"] else "disconnected",
+            "available": health["available"],
+            "error": health["error"],
+            "circuit": health["state"],
+            "last_checked": health["last_checked"],
+            "read_only_snapshot_age": ledger_snapshot.age_seconds() if health["state"] == "open" else None,
             "host": db_info["host"],
             "port": db_info["port"],
             "database": db_info["database"]
@@ -152,6 +179,20 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@router.get("/debug/db-health")
+async def get_db_health():
+    """Get the database health prober, circuit breaker, read-only snapshot and write journal state"""
+    from database.health import database_health
+    from database.snapshot import ledger_snapshot
+    from services.ledger_journal import ledger_journal
+    return {
+        "db_health": database_health.get_status(),
+        "snapshot": ledger_snapshot.get_stats(),
+        "ledger_journal": ledger_journal.get_stats(),
+        "environment": ENVIRONMENT,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 # Catch-all route to serve React app for client-side routing
 @router.get("/{full_path:path}")
 async def serve_react_app(full_path: str, request: Request):
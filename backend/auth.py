@@ -1,6 +1,5 @@
 from fastapi import HTTPException, Depends, Response, Cookie, Header
 from jose import jwt, JWTError
-import requests
 from datetime import datetime, timedelta
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
@@ -12,6 +11,8 @@ from database.models import User
 from database.db_models import UserRole
 
 from database.database import get_db
+from database.health import DatabaseUnavailableError, database_health
+from database.snapshot import SnapshotSession
 from services.user_service import UserService
 
 # Import centralized configuration
@@ -27,6 +28,9 @@ async def verify_google_token(id_token: str):
         # TODO: Implement proper guest user handling
         return {"name": "Guest User", "email": "guest@example.com", "role": "GUEST"}
     
+    # Only needed at sign-in, so kept out of the import path at startup
+    import requests
+    
     try:
         # Get Google's public keys
         keys_url = "https://www.googleapis.com/oauth2/v1/certs"
@@ -108,6 +112,10 @@ async def get_current_user(
                 role=str(user_data.get('role', UserRole.GUEST.value))
             )
         
+        # Simplified-auth tokens carry a fake id, so they must not read another user's snapshot data
+        if user_data.get("auth") == "simple" and isinstance(db, SnapshotSession):
+            raise DatabaseUnavailableError(database_health.retry_after())
+        
         # For regular users, get fresh user data from database
         try:
             db_user = UserService.get_user_by_id(db, user_data["id"])
@@ -39,7 +39,8 @@ async def google_auth_simple(token: dict, response: Response, stay_logged_in: bo
             "email": user_data["email"],
             "name": user_data["name"],
             "picture": user_data["picture"],
-            "id": 1  # Fake ID
+            "id": 1,  # Fake ID
+            "auth": "simple"  # Not a real account; never served data from the snapshot
         }
         
         # Determine expiration based on stay_logged_in preference
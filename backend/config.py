@@ -2,6 +2,7 @@
 Centralized configuration management
 """
 import os
+import tempfile
 from dotenv import load_dotenv
 
 def load_environment():
@@ -53,6 +54,91 @@ GCS_PREFIX = os.getenv("GCS_PREFIX", "dev/")
 
 # Google AI configuration
 MODEL_NAME_GENAI = os.getenv("MODEL_NAME_GENAI", "gemini-2.0-flash")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+# Model backend: "genai" calls the Gemini API, "fake" serves scripted responses offline
+LLM_BACKEND = os.getenv("LLM_BACKEND", "genai")
+FAKE_LLM_SCRIPT = os.getenv("FAKE_LLM_SCRIPT")  # Optional JSON file of scripted responses
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))  # Delay before the first chunk
+FAKE_LLM_CHUNK_CHARS = int(os.getenv("FAKE_LLM_CHUNK_CHARS", "40"))  # Characters per streamed chunk
+FAKE_LLM_CHUNK_INTERVAL_MS = float(os.getenv("FAKE_LLM_CHUNK_INTERVAL_MS", "0"))  # Delay between streamed chunks
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))  # Fraction of calls that fail, 0-1
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED")) if os.getenv("FAKE_LLM_SEED") else None
+
+# Model call retries and cost accounting
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))  # Retries for rate-limited/unavailable model calls
+LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.5"))  # Doubled on each retry
+LLM_INPUT_PRICE_PER_MILLION = float(os.getenv("LLM_INPUT_PRICE_PER_MILLION", "0.10"))  # USD per 1M prompt tokens
+LLM_OUTPUT_PRICE_PER_MILLION = float(os.getenv("LLM_OUTPUT_PRICE_PER_MILLION", "0.40"))  # USD per 1M output tokens
+
+# AI request concurrency configuration
+AI_MAX_CONCURRENT_REQUESTS = int(os.getenv("AI_MAX_CONCURRENT_REQUESTS", "4"))  # Model calls in flight per process
+AI_MAX_CONCURRENT_PER_USER = int(os.getenv("AI_MAX_CONCURRENT_PER_USER", "1"))
+AI_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AI_QUEUE_TIMEOUT_SECONDS", "30"))  # Max wait for a free slot
+AI_REQUEST_TIMEOUT_SECONDS = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", "60"))  # Max time for one model call
+
+# AI image upload configuration
+AI_MAX_IMAGE_BYTES = int(os.getenv("AI_MAX_IMAGE_BYTES", str(15 * 1024 * 1024)))  # Per-image upload limit
+AI_MAX_IMAGES = int(os.getenv("AI_MAX_IMAGES", "10"))  # Images per request
+AI_IMAGE_MAX_DIMENSION = int(os.getenv("AI_IMAGE_MAX_DIMENSION", "1024"))  # Longest side sent to the model
+AI_IMAGE_WORKERS = int(os.getenv("AI_IMAGE_WORKERS", "4"))  # Parallel image decode threads
+
+# AI extraction result cache configuration
+AI_RESULT_CACHE_SIZE = int(os.getenv("AI_RESULT_CACHE_SIZE", "256"))  # Cached extractions per process
+AI_RESULT_CACHE_TTL_SECONDS = int(os.getenv("AI_RESULT_CACHE_TTL_SECONDS", "3600"))
+
+# AI prompt configuration
+AI_PROMPT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "8000"))  # Approximate tokens of user input per extraction
+
+# AI background extraction job configuration
+EXTRACTION_JOB_WORKERS = int(os.getenv("EXTRACTION_JOB_WORKERS", "3"))  # Parallel page calls per process
+EXTRACTION_JOB_STALE_SECONDS = int(os.getenv("EXTRACTION_JOB_STALE_SECONDS", "600"))  # Report unfinished jobs as failed after this
+
+# Cross-worker cache invalidation (Postgres LISTEN/NOTIFY)
+CACHE_BUS_ENABLED = os.getenv("CACHE_BUS_ENABLED", "true").lower() == "true"
+CACHE_BUS_CHANNEL = os.getenv("CACHE_BUS_CHANNEL", "cache_invalidation")
+CACHE_BUS_HEARTBEAT_SECONDS = float(os.getenv("CACHE_BUS_HEARTBEAT_SECONDS", "30"))  # Probe the listener connection this often
+CACHE_BUS_RECONNECT_MAX_SECONDS = float(os.getenv("CACHE_BUS_RECONNECT_MAX_SECONDS", "30"))  # Cap on reconnect backoff
+
+# Ledger write journal (accepts new entries while the database is down)
+LEDGER_JOURNAL_PATH = os.getenv("LEDGER_JOURNAL_PATH")  # Required: a persistent volume that outlives the instance
+# Off without a persistent path - a 202 for a write kept in the temp directory could be lost on scale-down
+LEDGER_JOURNAL_ENABLED = (
+    os.getenv("LEDGER_JOURNAL_ENABLED", "true").lower() == "true"
+    and bool(LEDGER_JOURNAL_PATH)
+    and not os.path.realpath(LEDGER_JOURNAL_PATH).startswith(os.path.realpath(tempfile.gettempdir()) + os.sep)
+)
+# Writes are authenticated against the read-only snapshot while the database is down, so journaling needs it
+if LEDGER_JOURNAL_ENABLED and (
+    os.getenv("DB_SNAPSHOT_ENABLED", "true").lower() != "true"
+    or (ENVIRONMENT == "production" and not os.getenv("DB_SNAPSHOT_PATH"))
+):
+    raise ValueError("❌ LEDGER_JOURNAL_ENABLED requires the read-only snapshot: set DB_SNAPSHOT_ENABLED=true and DB_SNAPSHOT_PATH (or LEDGER_JOURNAL_ENABLED=false)")
+LEDGER_JOURNAL_REPLAY_INTERVAL_SECONDS = float(os.getenv("LEDGER_JOURNAL_REPLAY_INTERVAL_SECONDS", "5"))
+LEDGER_JOURNAL_RETENTION_HOURS = float(os.getenv("LEDGER_JOURNAL_RETENTION_HOURS", "72"))  # Keep resolved records visible this long
+
+# Idempotency-Key handling for ledger writes
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))  # Retries within this window replay the stored response
+IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS", "600"))  # Expired keys are purged at most this often
+IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS = float(os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS", "120"))  # Without the journal, a retry takes over an unfinished claim this old
+
+# Coalescing of identical concurrent GET requests
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() == "true"
+
+# Binary columnar responses (Arrow stream / msgpack) for analytics clients
+COLUMNAR_BATCH_ROWS = int(os.getenv("COLUMNAR_BATCH_ROWS", "65536"))  # Rows per Arrow record batch and per fetch from the database
+
+# Cold archive of closed ledger years (Parquet files, needs pyarrow)
+LEDGER_ARCHIVE_DIR = os.getenv("LEDGER_ARCHIVE_DIR", os.path.join(tempfile.gettempdir(), "ledger_archive"))  # Shared durable storage (e.g. a mounted bucket) in production
+LEDGER_ARCHIVE_DIR_CONFIGURED = bool(os.getenv("LEDGER_ARCHIVE_DIR"))  # Rows are only removed from the hot table into an explicitly configured directory
+LEDGER_ARCHIVE_MIN_AGE_YEARS = int(os.getenv("LEDGER_ARCHIVE_MIN_AGE_YEARS", "1"))  # Years at least this far before the current one can be archived
+LEDGER_ARCHIVE_COMPRESSION = os.getenv("LEDGER_ARCHIVE_COMPRESSION", "zstd")
+
+# Chatbot history configuration
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "4000"))  # Approximate tokens resent per message
+CHAT_HISTORY_KEEP_RECENT_TURNS = int(os.getenv("CHAT_HISTORY_KEEP_RECENT_TURNS", "4"))  # Turns kept verbatim after compaction
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+CHAT_MESSAGE_TOKEN_BUDGET = int(os.getenv("CHAT_MESSAGE_TOKEN_BUDGET", "2000"))  # Longer messages are truncated
 
 # Debug: Print configuration (without sensitive data)
 print(f"🔧 Environment: {ENVIRONMENT}")
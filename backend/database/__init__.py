@@ -1,6 +1,6 @@
 # Database package
 from .database import get_db, engine, get_pool_status
-from .db_models import Base, User, UserRole, LedgerEntry, CreditCard, FitnessEntry, TravelEntry, SpendingCategory
+from .db_models import Base, User, UserRole, LedgerEntry, CreditCard, FitnessEntry, TravelEntry, SpendingCategory, ExtractionJob, MerchantCategory, IdempotencyKey, LedgerArchive
 from .models import User as UserSchema, LedgerEntry as LedgerEntrySchema, CreditCard as CreditCardSchema, FitnessEntry as FitnessEntrySchema, TravelEntry as TravelEntrySchema, SpendingCategory as SpendingCategorySchema
 from .database_config import get_pool_config, print_config
 
@@ -18,6 +18,10 @@ __all__ = [
     'FitnessEntry',
     'TravelEntry',
     'SpendingCategory',
+    'ExtractionJob',
+    'MerchantCategory',
+    'IdempotencyKey',
+    'LedgerArchive',
     'UserSchema',
     'LedgerEntrySchema',
     'CreditCardSchema',
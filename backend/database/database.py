@@ -1,11 +1,16 @@
-from sqlalchemy import create_engine
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import QueuePool
 
 # Import centralized configuration
 from config import DATABASE_URL
 from database.database_config import get_pool_config, print_config
+from database.health import OPEN, database_health
+from database.snapshot import ledger_snapshot
 
 # Get pool configuration
 pool_config = get_pool_config()
@@ -37,12 +42,26 @@ except Exception as e:
     print(f"❌ Failed to create SQLAlchemy engine: {e}")
     raise
 
+@event.listens_for(engine, "handle_error")
+def _report_connection_error(context):
+    # Let the health prober re-check right away rather than at its next interval
+    if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+        database_health.report_connection_error()
+
+class CircuitBreakerSession(Session):
+    """Session that fails fast instead of connecting while the database circuit is open"""
+
+    def get_bind(self, *args, **kwargs):
+        database_health.check()
+        return super().get_bind(*args, **kwargs)
+
 # Create SessionLocal class with optimized settings
 try:
     SessionLocal = sessionmaker(
         autocommit=False, 
         autoflush=False, 
         bind=engine,
+        class_=CircuitBreakerSession,
         expire_on_commit=False  # Prevent lazy loading issues
     )
     print("✅ SessionLocal created successfully")
@@ -55,8 +74,18 @@ Base = declarative_base()
 print("✅ SQLAlchemy Base class created")
 
 # Dependency to get database session with better error handling
-def get_db():
-    db = SessionLocal()
+def _snapshot_session(request: Request):
+    """Serve reads from the local snapshot while the database circuit is open"""
+    if database_health.state != OPEN:
+        return None
+    db = ledger_snapshot.session()
+    if db is not None:
+        # Picked up by the snapshot middleware to mark the response as stale
+        request.state.snapshot_taken_at = ledger_snapshot.taken_at
+    return db
+
+def get_db(request: Request):
+    db = _snapshot_session(request) or SessionLocal()
     try:
         yield db
     except Exception as e:
@@ -75,6 +104,11 @@ def get_db():
         except Exception as close_error:
             print(f"⚠️ Error closing database session: {close_error}")
 
+def get_request_session(request: Request):
+    """A session chosen like get_db's, for work that outlives the dependency (streamed
+    responses: get_db's session is closed before the body is sent). The caller closes it."""
+    return _snapshot_session(request) or SessionLocal()
+
 # Function to get database session without dependency injection (for background tasks)
 def get_db_session():
     """Get a database session for background tasks or manual usage"""
@@ -93,4 +127,24 @@ def get_pool_status():
             "invalid": pool.invalid()
         }
     except Exception as e:
-        return {"error": str(e)} 
\ No newline at end of file
+        return {"error": str(e)}
+
+def prewarm_pool(count: int) -> int:
+    """Open up to count pooled connections in parallel so early requests skip the connect handshake"""
+    count = min(count, pool_config["pool_size"])
+    if count <= 0:
+        return 0
+
+    connections = []
+    with ThreadPoolExecutor(max_workers=count, thread_name_prefix="db-prewarm") as executor:
+        futures = [executor.submit(engine.connect) for _ in range(count)]
+        for future in futures:
+            try:
+                connections.append(future.result())
+            except Exception as e:
+                print(f"⚠️ Failed to pre-warm a pooled connection: {e}")
+
+    # Closing checks them back in to the pool, open
+    for connection in connections:
+        connection.close()
+    return len(connections)
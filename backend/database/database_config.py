@@ -2,6 +2,7 @@
 Database connection configuration and monitoring
 """
 import os
+import tempfile
 from typing import Dict, Any
 
 # Database connection pool settings
@@ -12,6 +13,22 @@ DB_POOL_CONFIG = {
     "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "300")),   # Seconds before recycling connections
     "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "10")), # Connection timeout
     "statement_timeout": int(os.getenv("DB_STATEMENT_TIMEOUT", "30000")), # Statement timeout in ms
+    "prewarm_connections": int(os.getenv("DB_POOL_PREWARM", "2")),  # Connections opened in the background at startup
+    "startup_probe_timeout": float(os.getenv("DB_STARTUP_PROBE_TIMEOUT", "5")),  # Seconds sign-in waits for the first health probe
+}
+
+# Background health probe and circuit breaker settings
+HEALTH_CONFIG = {
+    "probe_interval": float(os.getenv("DB_HEALTH_PROBE_INTERVAL", "15")),  # Seconds between probes while healthy
+    "backoff_max": float(os.getenv("DB_HEALTH_BACKOFF_MAX", "60")),  # Cap on the retry backoff while down
+}
+
+# Local read-only snapshot served while the database circuit is open
+SNAPSHOT_CONFIG = {
+    "enabled": os.getenv("DB_SNAPSHOT_ENABLED", "true").lower() == "true",
+    "path": os.getenv("DB_SNAPSHOT_PATH", os.path.join(tempfile.gettempdir(), "ledger_snapshot.sqlite3")),  # Required in production
+    "interval": float(os.getenv("DB_SNAPSHOT_INTERVAL", "300")),  # Seconds between refreshes while healthy
+    "batch_rows": int(os.getenv("DB_SNAPSHOT_BATCH_ROWS", "5000")),  # Rows copied per round trip
 }
 
 # Connection monitoring settings
@@ -25,6 +42,14 @@ def get_pool_config() -> Dict[str, Any]:
     """Get database pool configuration"""
     return DB_POOL_CONFIG.copy()
 
+def get_health_config() -> Dict[str, Any]:
+    """Get database health probe configuration"""
+    return HEALTH_CONFIG.copy()
+
+def get_snapshot_config() -> Dict[str, Any]:
+    """Get read-only snapshot configuration"""
+    return SNAPSHOT_CONFIG.copy()
+
 def get_monitoring_config() -> Dict[str, Any]:
     """Get monitoring configuration"""
     return MONITORING_CONFIG.copy()
@@ -38,6 +63,10 @@ def print_config():
     print(f"   🔄 Pool Recycle: {DB_POOL_CONFIG['pool_recycle']}s")
     print(f"   🔗 Connect Timeout: {DB_POOL_CONFIG['connect_timeout']}s")
     print(f"   ⏰ Statement Timeout: {DB_POOL_CONFIG['statement_timeout']}ms")
+    print(f"   🔥 Pool Pre-warm: {DB_POOL_CONFIG['prewarm_connections']}")
+    print(f"   🔍 Startup Probe Timeout: {DB_POOL_CONFIG['startup_probe_timeout']}s")
+    print(f"   🩺 Health Probe Interval: {HEALTH_CONFIG['probe_interval']}s (backoff up to {HEALTH_CONFIG['backoff_max']}s)")
+    print(f"   📸 Read-only Snapshot: {SNAPSHOT_CONFIG['enabled']} (every {SNAPSHOT_CONFIG['interval']}s)")
     print(f"   📈 Monitoring Enabled: {MONITORING_CONFIG['enable_pool_monitoring']}")
     print("=" * 60)
 
@@ -49,6 +78,9 @@ if os.getenv("ENVIRONMENT") == "production":
         "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "3")),  # Less overflow
         "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "600")),  # Recycle every 10 minutes
     })
+    # The default temp directory is in memory on Cloud Run and counts against the instance's memory limit
+    if not os.getenv("DB_SNAPSHOT_PATH"):
+        SNAPSHOT_CONFIG["enabled"] = False
 elif os.getenv("ENVIRONMENT") == "development":
     # Development settings - more permissive
     DB_POOL_CONFIG.update({
@@ -1,9 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, Date, ForeignKey, Enum, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, Date, ForeignKey, Enum, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database.database import Base
+from decimal import Decimal, ROUND_HALF_UP
 import enum
 
+def to_cents(amount: float) -> int:
+    """Convert a dollar amount to integer cents, rounding half away from zero"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def from_cents(cents: int) -> float:
+    """Convert integer cents to a dollar amount for the API"""
+    return cents / 100
+
 class UserRole(enum.Enum):
     ADMIN = "ADMIN"
     REGULAR = "REGULAR"
@@ -89,17 +98,93 @@ class LedgerEntry(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     year = Column(Integer, nullable=False)
     month = Column(Integer, nullable=False)
-    category = Column(String(100), nullable=False)
-    amount = Column(Float, nullable=False)
-    credit_card = Column(String(100), nullable=False)
+    category_id = Column(Integer, ForeignKey("spending_categories.id"), nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)  # Exact; the API still speaks dollars via .amount
+    credit_card_id = Column(Integer, ForeignKey("credit_cards.id"), nullable=False)
     notes = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # Unique constraint for (year, month, user_id, credit_card, category)
+    # Unique constraint for (year, month, user_id, credit_card_id, category_id)
+    __table_args__ = (
+        UniqueConstraint('year', 'month', 'user_id', 'credit_card_id', 'category_id', name='unique_ledger_entry'),
+        # Per-user aggregates (chatbot tools, summaries) are answered from this index alone
+        Index('ix_ledger_entries_user_period', 'user_id', 'year', 'month', postgresql_include=['category_id', 'credit_card_id', 'amount_cents']),
+    )
+    
+    # Relationships - names are joined in on load, so renames only touch the card/category row
+    user = relationship("User", back_populates="ledger_entries")
+    card = relationship("CreditCard", lazy="joined")
+    spending_category = relationship("SpendingCategory", lazy="joined")
+    
+    @property
+    def category(self):
+        return self.spending_category.category_name if self.spending_category else None
+    
+    @property
+    def credit_card(self):
+        return self.card.name if self.card else None
+    
+    @property
+    def amount(self) -> float:
+        return from_cents(self.amount_cents) if self.amount_cents is not None else None
+    
+    @amount.setter
+    def amount(self, value: float) -> None:
+        self.amount_cents = to_cents(value)
+
+class ExtractionJob(Base):
+    __tablename__ = "extraction_jobs"
+    
+    id = Column(String(36), primary_key=True)  # UUID
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    total_pages = Column(Integer, nullable=False)
+    completed_pages = Column(Integer, nullable=False, default=0)
+    result = Column(Text)  # JSON: merged entries and per-page results
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class MerchantCategory(Base):
+    __tablename__ = "merchant_categories"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    merchant = Column(String(255), nullable=False)  # Normalized merchant name
+    category_id = Column(Integer, ForeignKey("spending_categories.id", ondelete="CASCADE"), nullable=False)
+    hit_count = Column(Integer, nullable=False, default=1)  # Times the user accepted this mapping
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
     __table_args__ = (
-        UniqueConstraint('year', 'month', 'user_id', 'credit_card', 'category', name='unique_ledger_entry'),
+        UniqueConstraint('user_id', 'merchant', name='unique_user_merchant'),
     )
     
     # Relationship
-    user = relationship("User", back_populates="ledger_entries") 
\ No newline at end of file
+    category = relationship("SpendingCategory")
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True)  # Client-supplied Idempotency-Key header
+    route = Column(String(100), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # Rejects a reused key with a different body
+    status_code = Column(Integer)  # Null while the first request is still running
+    response_body = Column(Text)  # JSON replayed to retries
+    response_digest = Column(String(64))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class LedgerArchive(Base):
+    __tablename__ = "ledger_archives"
+    
+    year = Column(Integer, primary_key=True, autoincrement=False)  # Archived years are read-only
+    file_path = Column(String(500), nullable=False)  # Parquet export of the year's ledger_entries rows
+    row_count = Column(Integer, nullable=False, default=0)
+    total_cents = Column(BigInteger, nullable=False, default=0)  # Checked against the file after export
+    checksum = Column(String(64))  # sha256 of the file; null until the export has finished
+    removed_from_hot = Column(Boolean, nullable=False, default=False)  # Rows live only in the file
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+    removed_at = Column(DateTime(timezone=True))
@@ -0,0 +1,162 @@
+"""
+Background database health prober and circuit breaker.
+
+One thread per worker probes the database with SELECT 1: every
+DB_HEALTH_PROBE_INTERVAL seconds while it is healthy, and with exponential
+backoff (capped at DB_HEALTH_BACKOFF_MAX) once a probe fails. A failed probe
+opens the circuit; sessions then refuse to touch the database and requests
+fail fast with 503 instead of each waiting out connect_timeout. The next
+successful probe closes the circuit again.
+
+Connection errors seen by requests don't open the circuit themselves (a stale
+pooled connection is not an outage) - they wake the prober to check right away.
+"""
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from database.database_config import get_health_config
+
+STARTING = "starting"
+CLOSED = "closed"
+OPEN = "open"
+
+# Minimum gap between probes, however often the prober is woken
+MIN_PROBE_GAP_SECONDS = 1.0
+
+health_config = get_health_config()
+
+
+class DatabaseUnavailableError(HTTPException):
+    """Raised instead of connecting while the circuit is open"""
+
+    def __init__(self, retry_after: int, detail: str = "Database is currently unavailable. Please try again later."):
+        super().__init__(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class DatabaseHealth:
+    def __init__(self):
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._first_probe = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.engine = None
+        self.on_available: Optional[Callable[[], None]] = None
+        self.state = STARTING
+        self.consecutive_failures = 0
+        self.probes = 0
+        self.rejected = 0
+        self.last_checked: Optional[datetime] = None
+        self.last_available: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.latency_ms: Optional[float] = None
+        self._next_probe_at = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.state == CLOSED
+
+    def check(self) -> None:
+        """Raise DatabaseUnavailableError if the circuit is open"""
+        if self.state == OPEN:
+            self.rejected += 1
+            raise DatabaseUnavailableError(self.retry_after())
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._next_probe_at - time.monotonic()))
+
+    def report_connection_error(self) -> None:
+        """Ask the prober to check now; called when a request hits a connection error"""
+        self._wake.set()
+
+    def wait_for_first_probe(self, timeout: float) -> None:
+        """Block until the first probe has finished, or timeout"""
+        self._first_probe.wait(timeout)
+
+    def start(self, engine, on_available: Optional[Callable[[], None]] = None) -> None:
+        if self._thread is not None:
+            return
+        self.engine = engine
+        self.on_available = on_available
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-health-prober", daemon=True)
+        self._thread.start()
+        print(f"🩺 Database health prober started (every {health_config['probe_interval']}s)")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _probe(self) -> None:
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                self._probe()
+                self.latency_ms = round((time.perf_counter() - started) * 1000, 2)
+                recovered = self.state != CLOSED
+                self.state = CLOSED
+                self.consecutive_failures = 0
+                self.last_error = None
+                self.last_available = datetime.utcnow()
+                delay = health_config["probe_interval"]
+                backoff = 1.0
+                if recovered:
+                    print(f"✅ Database is available ({self.latency_ms:.0f}ms), circuit closed")
+                    if self.on_available is not None:
+                        try:
+                            self.on_available()
+                        except Exception as e:
+                            print(f"⚠️ Database recovery hook failed: {e}")
+            except Exception as e:
+                self.consecutive_failures += 1
+                self.last_error = f"{type(e).__name__}: {str(e)}"[:200]
+                if self.state != OPEN:
+                    print(f"❌ Database probe failed, circuit open: {self.last_error}")
+                self.state = OPEN
+                delay = backoff
+                backoff = min(backoff * 2, health_config["backoff_max"])
+            finally:
+                self.probes += 1
+                self.last_checked = datetime.utcnow()
+                self._first_probe.set()
+
+            self._next_probe_at = time.monotonic() + delay
+            self._wake.wait(delay)
+            self._wake.clear()
+            # Woken early by a request error: still leave a short gap between probes
+            self._stop.wait(max(0.0, started + MIN_PROBE_GAP_SECONDS - time.perf_counter()))
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "available": self.available,
+            "consecutive_failures": self.consecutive_failures,
+            "probes": self.probes,
+            "rejected_requests": self.rejected,
+            "latency_ms": self.latency_ms,
+            "last_checked": self.last_checked.isoformat() if self.last_checked else None,
+            "last_available": self.last_available.isoformat() if self.last_available else None,
+            "next_probe_in": self.retry_after() if self._thread is not None else None,
+            "error": self.last_error,
+        }
+
+
+# Shared by every request in this process
+database_health = DatabaseHealth()
@@ -0,0 +1,232 @@
+"""
+Local read-only snapshot of ledger and reference data.
+
+While the database is healthy, a background thread copies the users, credit
+card and spending category tables, plus the ledger of every active user,
+into a SQLite file with the same schema every DB_SNAPSHOT_INTERVAL seconds.
+Each copy is built next to the live file and swapped in atomically, so
+readers never see a partial snapshot. Workers on a host share the file: only
+the one holding its lock refreshes it, and only once it is older than the
+interval. The file holds every user's ledger, so it is readable by the owner only.
+
+While the health circuit is open, get_db hands out read-only sessions on the
+snapshot instead of Postgres sessions, so the existing services keep serving
+reads unchanged. Writes are refused with 503 and responses are marked with
+the snapshot's age.
+"""
+import fcntl
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Column, DateTime, MetaData, Table, create_engine, event, select
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+
+from database.database_config import get_snapshot_config
+from database.health import DatabaseUnavailableError, database_health
+
+snapshot_config = get_snapshot_config()
+
+# Copied in this order so foreign keys always point at rows already present.
+# ledger_archives lets archived years keep being read from their files.
+SNAPSHOT_TABLES = ["users", "credit_cards", "spending_categories", "ledger_entries", "ledger_archives"]
+
+_info_metadata = MetaData()
+snapshot_info = Table("snapshot_info", _info_metadata, Column("taken_at", DateTime, nullable=False))
+
+
+class SnapshotReadOnlyError(DatabaseUnavailableError):
+    """Raised for writes while reads are being served from the snapshot"""
+
+    def __init__(self):
+        super().__init__(
+            database_health.retry_after(),
+            detail="Database is currently unavailable, so changes can't be saved. Data is read-only until it is back.",
+        )
+
+
+class SnapshotSession(Session):
+    """Read-only session on the local snapshot"""
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise SnapshotReadOnlyError()
+        super().flush(objects)
+
+
+@event.listens_for(SnapshotSession, "do_orm_execute")
+def _reject_writes(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        raise SnapshotReadOnlyError()
+
+
+class LedgerSnapshot:
+    def __init__(self, path: str = snapshot_config["path"]):
+        self.path = path
+        self.source_engine = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # NullPool: every session opens the file afresh, so swapped-in copies are picked up
+        self._engine = create_engine(f"sqlite:///file:{path}?mode=ro&uri=true", poolclass=NullPool)
+        self._sessionmaker = sessionmaker(
+            bind=self._engine,
+            class_=SnapshotSession,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+        self.taken_at: Optional[datetime] = None
+        self.rows: Dict[str, int] = {}
+        self.refreshes = 0
+        self.served = 0
+        self.last_duration_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def start(self, source_engine) -> None:
+        if not snapshot_config["enabled"] or self._thread is not None:
+            return
+        self.source_engine = source_engine
+        self._load_existing()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ledger-snapshot", daemon=True)
+        self._thread.start()
+        print(f"📸 Read-only snapshot refresher started ({self.path}, every {snapshot_config['interval']}s)")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _load_existing(self) -> None:
+        """Pick up a snapshot left by an earlier process or refreshed by another worker"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with self._engine.connect() as connection:
+                self.taken_at = connection.execute(select(snapshot_info.c.taken_at)).scalar()
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable snapshot {self.path}: {e}")
+
+    def _is_fresh(self) -> bool:
+        """Whether the file was refreshed (by any worker) within the interval"""
+        try:
+            return time.time() - os.path.getmtime(self.path) < snapshot_config["interval"]
+        except OSError:
+            return False
+
+    def refresh_if_stale(self) -> bool:
+        """Refresh unless another worker is refreshing or just did; returns whether this one did"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        lock_fd = os.open(f"{self.path}.lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            try:
+                if self._is_fresh():
+                    return False
+                self.refresh()
+                return True
+            finally:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        finally:
+            os.close(lock_fd)
+
+    def _run(self) -> None:
+        database_health.wait_for_first_probe(snapshot_config["interval"])
+        while not self._stop.is_set():
+            delay = snapshot_config["interval"]
+            if database_health.available:
+                try:
+                    if not self.refresh_if_stale():
+                        # Serve the copy another worker made
+                        self._load_existing()
+                except Exception as e:
+                    self.last_error = f"{type(e).__name__}: {str(e)}"[:200]
+                    print(f"⚠️ Snapshot refresh failed: {self.last_error}")
+            else:
+                # Keep the last good copy; check again once the database may be back
+                delay = min(delay, database_health.retry_after() + 1)
+            self._stop.wait(delay)
+
+    def refresh(self) -> None:
+        """Copy the snapshot tables from the database and swap the new file in"""
+        from database.database import Base
+        import database.db_models  # noqa: F401 - registers the tables on Base.metadata
+
+        started = time.perf_counter()
+        taken_at = datetime.utcnow()
+        tables = [Base.metadata.tables[name] for name in SNAPSHOT_TABLES]
+        users = Base.metadata.tables["users"]
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+        # Created owner-only before SQLite opens it; its journal files inherit the mode
+        os.close(os.open(temporary_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+
+        rows = {}
+        target = create_engine(f"sqlite:///{temporary_path}", poolclass=NullPool)
+        try:
+            Base.metadata.create_all(target, tables=tables)
+            _info_metadata.create_all(target)
+            with self.source_engine.connect() as source, target.begin() as destination:
+                if source.dialect.name == "postgresql":
+                    # One consistent view across every table
+                    source.execution_options(isolation_level="REPEATABLE READ")
+                with source.begin():
+                    for table in tables:
+                        query = select(table)
+                        if table.name == "ledger_entries":
+                            query = query.where(table.c.user_id.in_(select(users.c.id).where(users.c.is_active.isnot(False))))
+                        result = source.execute(query.execution_options(yield_per=snapshot_config["batch_rows"]))
+                        rows[table.name] = 0
+                        for batch in result.partitions():
+                            destination.execute(table.insert(), [dict(row._mapping) for row in batch])
+                            rows[table.name] += len(batch)
+                destination.execute(snapshot_info.insert(), {"taken_at": taken_at})
+        except Exception:
+            target.dispose()
+            os.remove(temporary_path)
+            raise
+        target.dispose()
+        os.replace(temporary_path, self.path)
+
+        self.taken_at = taken_at
+        self.rows = rows
+        self.refreshes += 1
+        self.last_error = None
+        self.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def session(self) -> Optional[Session]:
+        """A read-only session on the snapshot, or None if there is no snapshot yet"""
+        if self.taken_at is None:
+            return None
+        self.served += 1
+        return self._sessionmaker()
+
+    def age_seconds(self) -> Optional[int]:
+        if self.taken_at is None:
+            return None
+        return int((datetime.utcnow() - self.taken_at).total_seconds())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": snapshot_config["enabled"],
+            "path": self.path,
+            "taken_at": self.taken_at.isoformat() if self.taken_at else None,
+            "age_seconds": self.age_seconds(),
+            "rows": self.rows,
+            "refreshes": self.refreshes,
+            "served_sessions": self.served,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error,
+        }
+
+
+# Shared by every request in this process
+ledger_snapshot = LedgerSnapshot()
@@ -1,22 +1,122 @@
 from fastapi import APIRouter, Depends, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from pydantic import BaseModel
 from database.models import User
 from auth import get_current_user
 from database.database import get_db
 from services.ai_assistant_service import AIAssistantService
+from services.extraction_job_service import ExtractionJobService
+from services.merchant_category_service import MerchantCategoryService
 
 router = APIRouter(prefix="/ai-assistant", tags=["ai-assistant"])
 
+class AcceptedEntry(BaseModel):
+    category: str
+    merchants: Optional[List[str]] = None
+
+class LearnMerchantsRequest(BaseModel):
+    entries: List[AcceptedEntry]
+
 @router.post("/process-expense")
 async def process_expense_with_ai(
     prompt: str = Form(...),
     images: List[UploadFile] = File(default=[]),
+    use_cache: bool = Form(True),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Process text and images to extract expense information using AI
+
+    Set use_cache to false to bypass the extraction result cache.
+    """
+    return await AIAssistantService.process_expense_with_ai(db, prompt, images, current_user.id, use_cache)
+
+@router.post("/process-expense-stream")
+async def process_expense_with_ai_stream(
+    prompt: str = Form(...),
+    images: List[UploadFile] = File(default=[]),
+    use_cache: bool = Form(True),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Extract expense entries, streaming each one as a server-sent event as soon as it is parsed"""
+    stream = await AIAssistantService.start_expense_stream(db, prompt, images, current_user.id, use_cache)
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
+
+@router.post("/jobs")
+async def submit_extraction_job(
+    prompt: str = Form(...),
+    images: List[UploadFile] = File(default=[]),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Submit a multi-page statement for background extraction, one model call per page"""
+    return await ExtractionJobService.submit_job(db, prompt, images, current_user.id)
+
+@router.get("/jobs/{job_id}")
+async def get_extraction_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status and (once finished) the merged entries of an extraction job"""
+    is_admin = current_user.role == "ADMIN"
+    return ExtractionJobService.get_job(db, job_id, current_user.id, is_admin)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_extraction_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stream extraction job progress as server-sent events until it finishes"""
+    is_admin = current_user.role == "ADMIN"
+    # Fail with a regular 404 before the stream starts
+    ExtractionJobService.get_job(db, job_id, current_user.id, is_admin)
+    
+    return StreamingResponse(
+        ExtractionJobService.stream_job_progress(job_id, current_user.id, is_admin),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
+
+@router.get("/merchant-rules")
+async def get_merchant_rules(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """List the current user's merchant-to-category rules used for local categorization"""
+    return MerchantCategoryService.get_merchant_rules(db, current_user.id)
+
+@router.post("/merchant-rules/learn")
+async def learn_merchant_rules(
+    request: LearnMerchantsRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Learn merchant-to-category rules from entries the user accepted"""
+    return MerchantCategoryService.learn_merchants(db, current_user.id, [entry.model_dump() for entry in request.entries])
+
+@router.delete("/merchant-rules/{rule_id}")
+async def delete_merchant_rule(
+    rule_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Process text and images to extract expense information using AI"""
-    return AIAssistantService.process_expense_with_ai(db, prompt, images)
+    """Delete one of the current user's merchant rules"""
+    return MerchantCategoryService.delete_merchant_rule(db, rule_id, current_user.id)
 
 @router.get("/health")
 async def ai_assistant_health():
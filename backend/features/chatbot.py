@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
@@ -31,9 +32,13 @@ async def send_chat_message(
     db: Session = Depends(get_db)
 ):
     """Send a message to the chatbot and get a response"""
-    return ChatbotService.send_message(
+    # Model calls, tool queries and retry backoff all block, so keep them off the event loop
+    return await run_in_threadpool(
+        ChatbotService.send_message,
         chat_message.message, 
-        chat_message.conversation_history
+        chat_message.conversation_history,
+        current_user.id,
+        db
     )
 
 @router.post("/send-message-stream")
@@ -49,7 +54,8 @@ async def send_chat_message_stream(
             # Get streaming response from chatbot service
             async for chunk in ChatbotService.send_message_stream(
                 chat_message.message, 
-                chat_message.conversation_history
+                chat_message.conversation_history,
+                current_user.id
             ):
                 yield chunk
             
@@ -78,4 +84,4 @@ async def reset_chat(
     db: Session = Depends(get_db)
 ):
     """Reset the chat session"""
-    return ChatbotService.reset_chat() 
\ No newline at end of file
+    return ChatbotService.reset_chat(current_user.id)
\ No newline at end of file
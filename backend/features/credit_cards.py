@@ -1,21 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
 from database.models import User, CreditCard, CreateCreditCardRequest, UpdateCreditCardRequest
 from auth import get_current_user
 from database.database import get_db
 from services.credit_card_service import CreditCardService
+from services.reference_cache import reference_response, CREDIT_CARDS, USERS
+from services.request_coalescer import request_coalescer
 
 router = APIRouter(prefix="/credit-cards", tags=["credit-cards"])
 
 @router.get("/")
 async def get_credit_cards(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: User = Depends(get_current_user)
 ):
-    """Get all credit cards - admin can see all, others see only their own"""
+    """Get all credit cards - admin can see all, others see only their own (ETag-revalidated)"""
     is_admin = current_user.role == "ADMIN"
-    return CreditCardService.get_credit_cards(db, current_user.id, is_admin)
+    cached = await request_coalescer.run(
+        request,
+        request_coalescer.key(request, "all" if is_admin else current_user.id, (CREDIT_CARDS, USERS)),
+        lambda db: CreditCardService.get_credit_cards(db, current_user.id, is_admin)
+    )
+    return reference_response(request, cached)
 
 @router.post("/")
 async def create_credit_card(
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from typing import List, Optional
 from database.models import User, LedgerEntry, CreateLedgerEntryRequest, UpdateLedgerEntryRequest
 from auth import get_current_user
-from database.database import get_db
-from services.ledger_service import LedgerService
+from database.database import get_db, get_request_session
+from database.health import DatabaseUnavailableError
+from config import LEDGER_JOURNAL_ENABLED, COLUMNAR_BATCH_ROWS
+from services.ledger_service import LedgerService, LEDGER_ENTRY_COLUMNS
+from services.ledger_aggregate_service import LedgerAggregateService, MAX_ROWS
+from services.ledger_archive_service import LedgerArchiveService
+from services.change_feed import change_feed
+from services.ledger_journal import ledger_journal, journal_response, CREATE, BATCH
+from services.idempotency_service import IdempotencyService, LEDGER_CREATE_ROUTE, LEDGER_BATCH_ROUTE
+from services.request_coalescer import request_coalescer, LEDGER_GROUPS
+from services.columnar_encoding import accepted_binary_type, columnar_response, records_response
 
 from pydantic import BaseModel
 
@@ -15,30 +26,128 @@ class BatchLedgerEntryRequest(BaseModel):
 
 @router.get("/entries")
 async def get_ledger_entries(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: User = Depends(get_current_user)
 ):
-    """Get all ledger entries for the current user"""
+    """Get all ledger entries for the current user (identical concurrent requests share one query)
+
+    Sent as an Arrow stream or msgpack columns instead of JSON when the Accept header asks for one.
+    """
     is_admin = current_user.role == "ADMIN"
-    return LedgerService.get_ledger_entries(db, current_user.id, is_admin)
+    scope = "all" if is_admin else current_user.id
+    media_type = accepted_binary_type(request)
+    if media_type is not None:
+        def stream_rows():
+            # Rows are read while the body streams, after the dependency's session is closed
+            stream_db = get_request_session(request)
+            try:
+                yield from LedgerService.iter_ledger_entry_rows(stream_db, current_user.id, is_admin, COLUMNAR_BATCH_ROWS)
+            finally:
+                stream_db.close()
+        return columnar_response(media_type, LEDGER_ENTRY_COLUMNS, stream_rows)
+    return await request_coalescer.json_response(
+        request, scope, LEDGER_GROUPS,
+        lambda db: LedgerService.get_ledger_entries(db, current_user.id, is_admin)
+    )
 
 @router.post("/entries")
 async def create_ledger_entry(
     entry: CreateLedgerEntryRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
 ):
-    """Create a new ledger entry"""
-    return LedgerService.create_ledger_entry(db, entry, current_user.id)
+    """Create a new ledger entry (journaled with 202 if the database is down)
+
+    Retries with the same Idempotency-Key get the stored response back.
+    """
+    try:
+        return IdempotencyService.run(
+            db, current_user.id, idempotency_key, LEDGER_CREATE_ROUTE, entry,
+            lambda: LedgerService.create_ledger_entry(db, entry, current_user.id, idempotency_key)
+        )
+    except DatabaseUnavailableError:
+        if not LEDGER_JOURNAL_ENABLED:
+            raise
+        return await journal_response(CREATE, [entry], current_user.id, idempotency_key)
 
 @router.post("/entries/batch")
 async def create_ledger_entries_batch(
     batch_request: BatchLedgerEntryRequest,
     current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Create multiple ledger entries in a single transaction (journaled with 202 if the database is down)
+
+    Retries with the same Idempotency-Key get the stored response back.
+    """
+    try:
+        return IdempotencyService.run(
+            db, current_user.id, idempotency_key, LEDGER_BATCH_ROUTE, batch_request.entries,
+            lambda: LedgerService.create_ledger_entries_batch(db, batch_request.entries, current_user.id, idempotency_key)
+        )
+    except DatabaseUnavailableError:
+        if not LEDGER_JOURNAL_ENABLED:
+            raise
+        return await journal_response(BATCH, batch_request.entries, current_user.id, idempotency_key)
+
+@router.get("/journal")
+async def get_ledger_journal(
+    current_user: User = Depends(get_current_user)
+):
+    """Status of ledger writes journaled during database outages, including conflicts found on replay"""
+    is_admin = current_user.role == "ADMIN"
+    return ledger_journal.get_status(current_user.id, is_admin)
+
+@router.get("/archives")
+async def get_ledger_archives(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """List archived ledger years and the size of the hot table (admin only)"""
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return LedgerArchiveService.list_archives(db)
+
+@router.post("/archives/{year}")
+async def archive_ledger_year(
+    year: int,
+    remove_from_hot: bool = False,
+    current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Create multiple ledger entries in a single transaction"""
-    return LedgerService.create_ledger_entries_batch(db, batch_request.entries, current_user.id)
+    """Export a closed year to Parquet and make it read-only, optionally removing it from the hot table (admin only)"""
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return await run_in_threadpool(LedgerArchiveService.archive_year, db, year, remove_from_hot)
+
+@router.delete("/archives/{year}")
+async def restore_ledger_year(
+    year: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Put an archived year back into the hot table and reopen it for edits (admin only)"""
+    if current_user.role != "ADMIN":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return await run_in_threadpool(LedgerArchiveService.restore_year, db, year)
+
+@router.get("/changes")
+async def stream_ledger_changes(
+    current_user: User = Depends(get_current_user)
+):
+    """Stream ledger, credit card and category changes visible to the current user (server-sent events)"""
+    is_admin = current_user.role == "ADMIN"
+    return StreamingResponse(
+        change_feed.stream(current_user.id, is_admin),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
 
 @router.get("/entries/{entry_id}")
 async def get_ledger_entry(
@@ -71,4 +180,47 @@ async def delete_ledger_entry(
     is_admin = current_user.role == "ADMIN"
     return LedgerService.delete_ledger_entry(db, entry_id, current_user.id, is_admin)
 
- 
\ No newline at end of file
+@router.get("/summary/monthly")
+async def get_monthly_summary(
+    request: Request,
+    year: Optional[int] = None,
+    category: Optional[str] = None,
+    credit_card: Optional[str] = None,
+    limit: int = Query(12, ge=1, le=MAX_ROWS),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the current user's total spend per month (JSON, Arrow stream or msgpack)"""
+    return await records_response(
+        request, current_user.id, LEDGER_GROUPS,
+        lambda db: LedgerAggregateService.get_monthly_totals(db, current_user.id, year, category, credit_card, limit)
+    )
+
+@router.get("/summary/categories")
+async def get_category_summary(
+    request: Request,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    credit_card: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_ROWS),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the current user's total spend per category (JSON, Arrow stream or msgpack)"""
+    return await records_response(
+        request, current_user.id, LEDGER_GROUPS,
+        lambda db: LedgerAggregateService.get_category_totals(db, current_user.id, year, month, credit_card, limit)
+    )
+
+@router.get("/summary/cards")
+async def get_card_summary(
+    request: Request,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_ROWS),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the current user's total spend per credit card (JSON, Arrow stream or msgpack)"""
+    return await records_response(
+        request, current_user.id, LEDGER_GROUPS,
+        lambda db: LedgerAggregateService.get_card_totals(db, current_user.id, year, month, category, limit)
+    )
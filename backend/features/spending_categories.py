@@ -1,20 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
 from database.models import User, SpendingCategory, CreateSpendingCategoryRequest, UpdateSpendingCategoryRequest
 from auth import get_current_user
 from database.database import get_db
 from services.spending_category_service import SpendingCategoryService
+from services.reference_cache import reference_response, SPENDING_CATEGORIES
+from services.request_coalescer import request_coalescer
 
 router = APIRouter(prefix="/spending-categories", tags=["spending-categories"])
 
 @router.get("/")
 async def get_spending_categories(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    current_user: User = Depends(get_current_user)
 ):
-    """Get all spending categories"""
-    return SpendingCategoryService.get_spending_categories(db)
+    """Get all spending categories (ETag-revalidated)"""
+    cached = await request_coalescer.run(
+        request,
+        request_coalescer.key(request, "all", (SPENDING_CATEGORIES,)),
+        lambda db: SpendingCategoryService.get_spending_categories(db)
+    )
+    return reference_response(request, cached)
 
 @router.post("/")
 async def create_spending_category(
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from database.models import User, UserRole
 from auth import get_current_user
 from database.database import get_db
 from services.user_service import UserService
+from services.reference_cache import reference_response
 from typing import Dict, Any, List
 from pydantic import BaseModel
 
@@ -183,11 +184,8 @@ async def delete_user(
 
 @router.get("/list-names")
 async def list_user_names(
+    request: Request,
     db: Session = Depends(get_db)
-) -> List[Dict[str, Any]]:
-    """List all user names for dropdown (no auth required)"""
-    users = UserService.get_all_users(db)
-    return [
-        {"id": user.id, "name": user.name, "email": user.email}
-        for user in users
-    ]
\ No newline at end of file
+):
+    """List all user names for dropdown (no auth required, ETag-revalidated)"""
+    return reference_response(request, UserService.get_user_names(db))
\ No newline at end of file
@@ -3,9 +3,10 @@ import uvicorn
 
 # Import configuration
 from config import ENVIRONMENT
+from services.json_encoding import FastJSONResponse
 
 # Import setup functions
-from app.middleware import setup_cors_middleware
+from app.middleware import setup_cors_middleware, setup_snapshot_middleware
 from app.handlers import setup_exception_handlers
 from app.startup import setup_database_startup
 
@@ -23,9 +24,10 @@ from features.chatbot import router as chatbot_router
 
 
 # Create FastAPI app
-app = FastAPI(title="Bravo Cui's Life Tracking", version="1.0.0")
+app = FastAPI(title="Bravo Cui's Life Tracking", version="1.0.0", default_response_class=FastJSONResponse)
 
 # Setup middleware and handlers
+setup_snapshot_middleware(app)
 setup_cors_middleware(app)
 setup_exception_handlers(app)
 setup_database_startup(app)
@@ -1,23 +1,32 @@
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-from database.db_models import SpendingCategory as DBSpendingCategory
+from services.spending_category_service import SpendingCategoryService
 from pydantic import BaseModel
-from google import genai
-from google.genai import types
 import json
 import base64
-from PIL import Image
-import io
-import os
+import time
+import asyncio
 from fastapi import HTTPException, UploadFile
-from config import MODEL_NAME_GENAI
+from starlette.concurrency import run_in_threadpool
+from config import MODEL_NAME_GENAI, GOOGLE_API_KEY, LLM_BACKEND, AI_MAX_CONCURRENT_REQUESTS, AI_MAX_CONCURRENT_PER_USER, AI_QUEUE_TIMEOUT_SECONDS, AI_REQUEST_TIMEOUT_SECONDS, AI_RESULT_CACHE_SIZE, AI_RESULT_CACHE_TTL_SECONDS
+from services.llm_limiter import LLMConcurrencyLimiter
+from services.image_pipeline import spool_images, decode_images, close_spooled
+from services.ai_result_cache import TTLCache, make_cache_key
+from services.expense_stream_parser import IncrementalExpenseParser
+from services.merchant_category_service import MerchantCategoryService
+from services.llm_client import get_model_client
+from services.llm_metrics import llm_metrics
+from services.prompt_builder import build_extraction_prompt, render_extraction_system_prompt
 
-# Configure Google Generative AI
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if GOOGLE_API_KEY:
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-else:
-    client = None
+# Shared limiter so slow extractions queue instead of starving the instance
+limiter = LLMConcurrencyLimiter(
+    max_concurrent=AI_MAX_CONCURRENT_REQUESTS,
+    max_per_user=AI_MAX_CONCURRENT_PER_USER,
+    queue_timeout=AI_QUEUE_TIMEOUT_SECONDS
+)
+
+# Identical prompt/images/categories/model return the previous extraction
+result_cache = TTLCache(max_entries=AI_RESULT_CACHE_SIZE, ttl_seconds=AI_RESULT_CACHE_TTL_SECONDS)
 
 class AIAssistantRequest(BaseModel):
     prompt: str
@@ -29,211 +38,482 @@ class ExpenseEntry(BaseModel):
     year: Optional[int] = None
     month: Optional[int] = None
     notes: Optional[str] = ""
+    merchants: Optional[List[str]] = None
 
 class AIAssistantResponse(BaseModel):
     entries: List[ExpenseEntry]
     confidence: float
     raw_response: str
     full_prompt: str
+    queue_time_ms: Optional[float] = None
+    timings: Optional[Dict[str, Any]] = None
+    cached: bool = False
+    lines_resolved_locally: int = 0
+
+def _extraction_config(system_prompt: str) -> Dict[str, Any]:
+    return {
+        "system_instruction": system_prompt,
+        "max_output_tokens": 2000,
+        "temperature": 0.3,
+        "top_p": 0.8,
+        "top_k": 20,
+    }
+
+def _raise_service_not_configured_error() -> None:
+    raise HTTPException(
+        status_code=500, 
+        detail="AI service not configured. Please set GOOGLE_API_KEY environment variable."
+    )
+
+def _has_period(entry: ExpenseEntry) -> bool:
+    return entry.year is not None or entry.month is not None
+
+def _period_key(entry: ExpenseEntry):
+    return (entry.category, entry.year, entry.month)
 
 class AIAssistantService:
     @staticmethod
     def get_available_categories(db: Session) -> List[str]:
-        """Get available spending categories from database"""
-        try:
-            categories = db.query(DBSpendingCategory).all()
-            return [cat.category_name for cat in categories]
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        """Get available spending category names, served from the reference cache"""
+        return SpendingCategoryService.get_category_names(db)
 
 
 
     @staticmethod
     def create_system_prompt(category_names: List[str]) -> str:
         """Create the system prompt for AI processing"""
-        return f"""
-        You are an AI assistant that extracts expense information from credit card statements and receipts.
-        
-        IMPORTANT: You must use ONLY these exact category names from the database:
-        {', '.join(category_names)}
-        
-        If an expense doesn't match any of these categories, categorize it as "Others".
-        
-        Analyze the provided text and images to identify expense entries. For each expense found, extract:
-        - Category (MUST be one of the exact categories listed above, or "Others" if no match)
-        - Amount (as a number)
-        - Year and month if mentioned in the text/image
-        - Notes explaining how the amount was calculated from the user input
-
-        Aggregate the "Others" category into one entry. In the notes field, explain how you calculated
-        the amount from the input.
-        
-        Return your response as a valid JSON array with this exact structure:
-        [
-            {{
-                "category": "string (must be one of the exact categories listed above)",
-                "amount": number,
-                "year": number (optional),
-                "month": number (optional, 1-12),
-                "notes": "string explaining how this amount was calculated from the input"
-            }}
-        ]
-        
-        Guidelines:
-        - If no year/month is mentioned, omit those fields
-        - Categories MUST be exact matches from the provided list, or "Others"
-        - Amounts can be positive or negative numbers (negative for credits/refunds)
-        - Include both expenses (positive) and credits/refunds (negative)
-        - In the notes field, explain how you calculated the amount from the input
-        - If you're unsure about any field, omit it rather than guess
-        - Sum up multiple small expenses into single entries when appropriate
-        - Notes should be short, but concise and to the point
-
-        Example Notes:
-        - Bad note: Extracted from the 'Shopping' row in the provided spending breakdown.
-        - Bad note: Calculated by summing 'Personal' ($13.42) and 'Home' ($11.67) expenses, as these categories are not in the allowed list.
-        - Good note: From 'Shopping' row.
-        - Good note: Sum: 'Personal' ($13.42) + 'Home' ($11.67) = $25.09.
+        return render_extraction_system_prompt(category_names)
+
+    @staticmethod
+    async def generate_extraction(contents: List[Any], system_prompt: str, user_id: Optional[int] = None, route: str = "/ai-assistant/process-expense", metrics_user_id: Optional[int] = None):
+        """Run one extraction call through the limiter, returning (text, queue seconds, model seconds, call metrics)
+
+        user_id applies the per-user concurrency cap; metrics_user_id only
+        attributes the call for callers that bound concurrency themselves.
         """
+        async with limiter.slot(user_id) as queue_time:
+            model_started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    get_model_client().agenerate(
+                        model=MODEL_NAME_GENAI,
+                        contents=contents,
+                        config=_extraction_config(system_prompt),
+                        route=route,
+                        user_id=user_id if user_id is not None else metrics_user_id,
+                        queue_time=queue_time
+                    ),
+                    timeout=AI_REQUEST_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                raise HTTPException(
+                    status_code=504,
+                    detail=f"AI processing timed out after {AI_REQUEST_TIMEOUT_SECONDS:.0f} seconds"
+                )
+            model_time = time.perf_counter() - model_started
+        
+        # Extract the response text
+        return response.text.strip(), queue_time, model_time, response.call
 
     @staticmethod
-    def process_expense_with_ai(db: Session, prompt: str, images: List[UploadFile] = None) -> AIAssistantResponse:
-        """Process text and images to extract expense information using AI"""
+    def parse_expense_entries(response_text: str) -> List[ExpenseEntry]:
+        """Parse the JSON array of expense entries out of a model response"""
+        # Look for JSON in the response (it might be wrapped in markdown)
+        if '```json' in response_text:
+            # Extract JSON from markdown code block
+            start = response_text.find('```json') + 7
+            end = response_text.find('```', start)
+            json_str = response_text[start:end].strip()
+        elif '```' in response_text:
+            # Extract JSON from code block
+            start = response_text.find('```') + 3
+            end = response_text.find('```', start)
+            json_str = response_text[start:end].strip()
+        else:
+            # Try to find JSON array in the response
+            start = response_text.find('[')
+            end = response_text.rfind(']') + 1
+            if start != -1 and end != 0:
+                json_str = response_text[start:end]
+            else:
+                json_str = response_text
         
-        if not client:
-            raise HTTPException(
-                status_code=500, 
-                detail="AI service not configured. Please set GOOGLE_API_KEY environment variable."
+        # Parse the JSON
+        parsed_data = json.loads(json_str)
+        
+        # Validate the structure
+        if not isinstance(parsed_data, list):
+            raise ValueError("Response is not a list")
+        
+        entries = []
+        for item in parsed_data:
+            entry = AIAssistantService.entry_from_item(item)
+            if entry:
+                entries.append(entry)
+        
+        return entries
+
+    @staticmethod
+    def entry_from_item(item: Any) -> Optional[ExpenseEntry]:
+        """Convert one parsed JSON object to an ExpenseEntry, skipping malformed items"""
+        if not isinstance(item, dict):
+            return None
+        
+        # Validate required fields
+        if 'category' not in item or 'amount' not in item:
+            return None
+        
+        # Create expense entry
+        return ExpenseEntry(
+            category=item['category'],
+            amount=float(item['amount']),
+            year=item.get('year'),
+            month=item.get('month'),
+            notes=item.get('notes', ''),
+            merchants=item.get('merchants') if isinstance(item.get('merchants'), list) else None
+        )
+
+    @staticmethod
+    def merge_local_entries(local_entries: List[ExpenseEntry], model_entries: List[ExpenseEntry]) -> List[ExpenseEntry]:
+        """Fold locally categorized lines into the model's entry for the same category and period
+
+        Local entries without a year and month are kept as entries of their own,
+        so spend is never moved into another month.
+        """
+        merged = [entry.model_copy() for entry in model_entries]
+        for local in local_entries:
+            target = None
+            if _has_period(local):
+                target = next((entry for entry in merged if _period_key(entry) == _period_key(local)), None)
+            if target is None:
+                merged.append(local)
+                continue
+            target.amount = round(target.amount + local.amount, 2)
+            target.notes = f"{target.notes}; {local.notes}" if target.notes else local.notes
+            target.merchants = (target.merchants or []) + [m for m in local.merchants or [] if m not in (target.merchants or [])]
+        return merged
+
+    @staticmethod
+    async def prepare_extraction(db: Session, prompt: str, images: List[UploadFile], use_cache: bool, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Build the prompts and model contents for a request, or return a cached response"""
+        # Fetch available categories from database
+        category_names = await run_in_threadpool(AIAssistantService.get_available_categories, db)
+        
+        # Resolve lines from known merchants locally; only the rest goes to the model
+        local = {"entries": [], "remaining_prompt": prompt, "resolved_lines": 0}
+        if user_id:
+            local = await run_in_threadpool(MerchantCategoryService.categorize_lines, db, user_id, prompt)
+        local_entries = [ExpenseEntry(**item) for item in local["entries"]]
+        prompt = local["remaining_prompt"]
+        
+        # Prepare the prompt for the AI; the system prompt goes only in the system instruction
+        built = build_extraction_prompt(category_names, prompt)
+        system_prompt = built["system_prompt"]
+        contents = [built["user_content"]]
+        
+        # What the model sees, for display
+        full_prompt = f"{system_prompt}\n\n{built['user_content']}"
+        
+        # Spool uploads (hashing them as they arrive) and check the result cache
+        spooled, preprocess_timings = await spool_images(images or [])
+        try:
+            cache_key = make_cache_key(
+                prompt,
+                [item.digest for item in spooled],
+                category_names,
+                MODEL_NAME_GENAI
             )
+            cached_response = result_cache.get(cache_key) if use_cache else None
+            if cached_response is None:
+                # Decode and downscale images off the event loop
+                processed_images, decode_timings = await decode_images(spooled)
+                preprocess_timings.update(decode_timings)
+                contents.extend(processed_images)
+        finally:
+            close_spooled(spooled)
+        
+        return {
+            "system_prompt": system_prompt,
+            "full_prompt": full_prompt,
+            "contents": contents,
+            "cache_key": cache_key,
+            "cached_response": cached_response,
+            "preprocess_timings": preprocess_timings,
+            "prompt_stats": built["stats"],
+            "local_entries": local_entries,
+            "lines_resolved_locally": local["resolved_lines"],
+            # Nothing left for the model only if lines were resolved locally, no other text remains and there are no images.
+            # Uploads count even on a cache hit, when they are not decoded into contents.
+            "needs_model": bool(spooled) or local["resolved_lines"] == 0 or bool(prompt.strip()),
+        }
+
+    @staticmethod
+    async def process_expense_with_ai(db: Session, prompt: str, images: List[UploadFile] = None, user_id: Optional[int] = None, use_cache: bool = True) -> AIAssistantResponse:
+        """Process text and images to extract expense information using AI"""
+        
+        if not get_model_client():
+            _raise_service_not_configured_error()
         
         try:
-            # Fetch available categories from database
-            category_names = AIAssistantService.get_available_categories(db)
+            prepared = await AIAssistantService.prepare_extraction(db, prompt, images, use_cache, user_id)
+            local_entries = prepared["local_entries"]
+            local_update = {"lines_resolved_locally": prepared["lines_resolved_locally"]}
             
-            # Prepare the prompt for the AI
-            system_prompt = AIAssistantService.create_system_prompt(category_names)
-            
-            # Combine system prompt with user prompt
-            full_prompt = f"{system_prompt}\n\nUser input: {prompt}"
+            if not prepared["needs_model"]:
+                return AIAssistantResponse(
+                    entries=local_entries,
+                    confidence=1.0 if local_entries else 0.0,
+                    raw_response="All lines resolved from known merchants; the model was not called.",
+                    full_prompt=prepared["full_prompt"],
+                    **local_update
+                )
             
-            # Prepare contents for AI
-            contents = [full_prompt]
+            if prepared["cached_response"] is not None:
+                cached_response = prepared["cached_response"]
+                return cached_response.model_copy(update={
+                    "entries": AIAssistantService.merge_local_entries(local_entries, cached_response.entries),
+                    "cached": True,
+                    "queue_time_ms": None,
+                    "timings": None,
+                    **local_update
+                })
             
-            # Add images if provided
-            if images:
-                for image_file in images:
-                    if image_file.content_type.startswith('image/'):
-                        # Read and process the image
-                        image_data = image_file.file.read()
-                        image = Image.open(io.BytesIO(image_data))
-                        
-                        # Convert to RGB if necessary
-                        if image.mode != 'RGB':
-                            image = image.convert('RGB')
-                        
-                        # Resize if too large (Gemini has size limits)
-                        max_size = 1024
-                        if max(image.size) > max_size:
-                            ratio = max_size / max(image.size)
-                            new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                            image = image.resize(new_size, Image.Resampling.LANCZOS)
-                        
-                        contents.append(image)
+            system_prompt = prepared["system_prompt"]
+            full_prompt = prepared["full_prompt"]
+            contents = prepared["contents"]
+            cache_key = prepared["cache_key"]
+            preprocess_timings = prepared["preprocess_timings"]
             
-            # Generate response from AI with system instruction
-            response = client.models.generate_content(
-                model=MODEL_NAME_GENAI,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    max_output_tokens=2000,
-                    temperature=0.3,
-                    top_p=0.8,
-                    top_k=20,
-                )
+            # Generate response from AI with system instruction, without blocking the event loop
+            response_text, queue_time, model_time, call = await AIAssistantService.generate_extraction(
+                contents, system_prompt, user_id
             )
-            
-            # Extract the response text
-            response_text = response.text.strip()
+            queue_time_ms = round(queue_time * 1000, 2)
+            timings = {
+                "preprocess": preprocess_timings,
+                "prompt": prepared["prompt_stats"],
+                "queue_ms": queue_time_ms,
+                "model_ms": round(model_time * 1000, 2),
+                "prompt_tokens": call.prompt_tokens,
+                "output_tokens": call.output_tokens,
+                "retries": call.retries
+            }
             
             # Try to parse JSON from the response
             try:
-                # Look for JSON in the response (it might be wrapped in markdown)
-                if '```json' in response_text:
-                    # Extract JSON from markdown code block
-                    start = response_text.find('```json') + 7
-                    end = response_text.find('```', start)
-                    json_str = response_text[start:end].strip()
-                elif '```' in response_text:
-                    # Extract JSON from code block
-                    start = response_text.find('```') + 3
-                    end = response_text.find('```', start)
-                    json_str = response_text[start:end].strip()
-                else:
-                    # Try to find JSON array in the response
-                    start = response_text.find('[')
-                    end = response_text.rfind(']') + 1
-                    if start != -1 and end != 0:
-                        json_str = response_text[start:end]
-                    else:
-                        json_str = response_text
-                
-                # Parse the JSON
-                parsed_data = json.loads(json_str)
-                
-                # Validate the structure
-                if not isinstance(parsed_data, list):
-                    raise ValueError("Response is not a list")
-                
-                entries = []
-                for item in parsed_data:
-                    if not isinstance(item, dict):
-                        continue
-                    
-                    # Validate required fields
-                    if 'category' not in item or 'amount' not in item:
-                        continue
-                    
-                    # Create expense entry
-                    entry = ExpenseEntry(
-                        category=item['category'],
-                        amount=float(item['amount']),
-                        year=item.get('year'),
-                        month=item.get('month'),
-                        notes=item.get('notes', '')
-                    )
-                    entries.append(entry)
+                entries = AIAssistantService.parse_expense_entries(response_text)
                 
                 # Calculate confidence based on response quality
                 confidence = 0.8 if entries else 0.0
                 
-                return AIAssistantResponse(
+                result = AIAssistantResponse(
                     entries=entries,
                     confidence=confidence,
                     raw_response=response_text,
-                    full_prompt=full_prompt
+                    full_prompt=full_prompt,
+                    queue_time_ms=queue_time_ms,
+                    timings=timings
                 )
                 
+                # Only cache usable extractions so a bad parse can be retried
+                if entries:
+                    result_cache.set(cache_key, result)
+                
+                return result.model_copy(update={
+                    "entries": AIAssistantService.merge_local_entries(local_entries, entries),
+                    **local_update
+                })
+                
             except (json.JSONDecodeError, ValueError, KeyError) as e:
                 # If JSON parsing fails, return the raw response for debugging
                 return AIAssistantResponse(
-                    entries=[],
+                    entries=local_entries,
                     confidence=0.0,
                     raw_response=f"Failed to parse AI response as JSON: {str(e)}\n\nRaw response:\n{response_text}",
-                    full_prompt=full_prompt
+                    full_prompt=full_prompt,
+                    queue_time_ms=queue_time_ms,
+                    timings=timings,
+                    **local_update
                 )
                 
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"AI processing failed: {str(e)}"
             )
 
+    @staticmethod
+    async def start_expense_stream(db: Session, prompt: str, images: List[UploadFile] = None, user_id: Optional[int] = None, use_cache: bool = True):
+        """Prepare an extraction and return a generator streaming its entries as server-sent events
+
+        Preparation (category lookup, upload spooling) happens before the response
+        starts, so errors there are still returned as regular HTTP errors.
+        """
+        if not get_model_client():
+            _raise_service_not_configured_error()
+        
+        try:
+            prepared = await AIAssistantService.prepare_extraction(db, prompt, images, use_cache, user_id)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"AI processing failed: {str(e)}"
+            )
+        return AIAssistantService._stream_extraction(prepared, user_id)
+
+    @staticmethod
+    async def _stream_extraction(prepared: Dict[str, Any], user_id: Optional[int]):
+        def event(payload: Dict[str, Any]) -> str:
+            return f"data: {json.dumps(payload)}\n\n"
+        
+        # Entries already sent, by position. As in merge_local_entries, a model entry takes over the
+        # slot of a local entry for the same category and period; model entries are never merged together.
+        sent: List[ExpenseEntry] = []
+        local_slots: List[int] = []
+        
+        def local_event(entry: ExpenseEntry) -> str:
+            local_slots.append(len(sent))
+            sent.append(entry)
+            return event({"type": "entry", "index": len(sent) - 1, "entry": entry.model_dump()})
+        
+        def entry_event(entry: ExpenseEntry) -> str:
+            index = next(
+                (i for i in local_slots if _has_period(sent[i]) and _period_key(sent[i]) == _period_key(entry)),
+                None
+            )
+            if index is None:
+                index = len(sent)
+                sent.append(entry)
+            else:
+                local_slots.remove(index)
+                sent[index] = AIAssistantService.merge_local_entries([sent[index]], [entry])[0]
+            return event({"type": "entry", "index": index, "entry": sent[index].model_dump()})
+        
+        try:
+            # Locally categorized lines are available before the model even starts
+            for entry in prepared["local_entries"]:
+                yield local_event(entry)
+            
+            if not prepared["needs_model"]:
+                yield event({
+                    "type": "done",
+                    "confidence": 1.0 if sent else 0.0,
+                    "raw_response": "All lines resolved from known merchants; the model was not called.",
+                    "full_prompt": prepared["full_prompt"],
+                    "lines_resolved_locally": prepared["lines_resolved_locally"],
+                    "cached": False
+                })
+                return
+            
+            cached_response = prepared["cached_response"]
+            if cached_response is not None:
+                for entry in cached_response.entries:
+                    yield entry_event(entry)
+                yield event({
+                    "type": "done",
+                    "confidence": cached_response.confidence,
+                    "raw_response": cached_response.raw_response,
+                    "full_prompt": cached_response.full_prompt,
+                    "lines_resolved_locally": prepared["lines_resolved_locally"],
+                    "cached": True
+                })
+                return
+            
+            parser = IncrementalExpenseParser()
+            entries: List[ExpenseEntry] = []
+            started = time.perf_counter()
+            first_entry_ms = None
+            
+            async with limiter.slot(user_id) as queue_time:
+                model_started = time.perf_counter()
+                deadline = model_started + AI_REQUEST_TIMEOUT_SECONDS
+                try:
+                    iterator = get_model_client().agenerate_stream(
+                        model=MODEL_NAME_GENAI,
+                        contents=prepared["contents"],
+                        config=_extraction_config(prepared["system_prompt"]),
+                        route="/ai-assistant/process-expense-stream",
+                        user_id=user_id,
+                        queue_time=queue_time
+                    ).__aiter__()
+                    call = None
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(
+                                iterator.__anext__(),
+                                timeout=max(deadline - time.perf_counter(), 0)
+                            )
+                        except StopAsyncIteration:
+                            break
+                        
+                        call = chunk.call
+                        # Forward each entry as soon as its JSON object is complete
+                        for item in parser.feed(chunk.text):
+                            entry = AIAssistantService.entry_from_item(item)
+                            if entry:
+                                if first_entry_ms is None:
+                                    first_entry_ms = round((time.perf_counter() - started) * 1000, 2)
+                                entries.append(entry)
+                                yield entry_event(entry)
+                except asyncio.TimeoutError:
+                    yield event({"type": "error", "detail": f"AI processing timed out after {AI_REQUEST_TIMEOUT_SECONDS:.0f} seconds"})
+                    return
+                model_ms = round((time.perf_counter() - model_started) * 1000, 2)
+            
+            response_text = parser.text.strip()
+            timings = {
+                "preprocess": prepared["preprocess_timings"],
+                "prompt": prepared["prompt_stats"],
+                "queue_ms": round(queue_time * 1000, 2),
+                "model_ms": model_ms,
+                "ttft_ms": call.ttft_ms if call else None,
+                "first_entry_ms": first_entry_ms,
+                "prompt_tokens": call.prompt_tokens if call else None,
+                "output_tokens": call.output_tokens if call else None,
+                "retries": call.retries if call else 0
+            }
+            if not parser.done and not entries:
+                response_text = f"Failed to parse AI response as JSON: no complete entries found\n\nRaw response:\n{response_text}"
+            
+            result = AIAssistantResponse(
+                entries=entries,
+                confidence=0.8 if entries else 0.0,
+                raw_response=response_text,
+                full_prompt=prepared["full_prompt"],
+                queue_time_ms=timings["queue_ms"],
+                timings=timings
+            )
+            if entries:
+                result_cache.set(prepared["cache_key"], result)
+            
+            yield event({
+                "type": "done",
+                "confidence": result.confidence,
+                "raw_response": result.raw_response,
+                "full_prompt": result.full_prompt,
+                "timings": timings,
+                "lines_resolved_locally": prepared["lines_resolved_locally"],
+                "cached": False
+            })
+        except HTTPException as e:
+            yield event({"type": "error", "detail": str(e.detail)})
+        except Exception as e:
+            yield event({"type": "error", "detail": f"AI processing failed: {str(e)}"})
+
     @staticmethod
     def get_health_status() -> Dict[str, Any]:
         """Get AI assistant health status"""
+        client = get_model_client()
         return {
             "status": "healthy" if client else "unconfigured",
             "model_available": client is not None,
-            "api_key_configured": GOOGLE_API_KEY is not None
+            "backend": LLM_BACKEND,
+            "api_key_configured": GOOGLE_API_KEY is not None,
+            "limiter": limiter.get_stats(),
+            "model_calls": llm_metrics.get_call_counts(),
+            "result_cache": result_cache.get_stats()
         } 
\ No newline at end of file
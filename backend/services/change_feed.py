@@ -0,0 +1,120 @@
+"""
+Row-level change events for open browser sessions.
+
+The ledger, credit-card and spending-category services publish an event in
+the same transaction as each write. Events travel over the invalidation bus,
+so they reach subscribers on every worker once the write commits, and are
+fanned out here to the server-sent event streams connected to this worker.
+
+Each event names its audience: the owning user(s), or everyone for shared
+reference data. Admins receive every event. If a subscriber falls behind or
+the bus may have missed messages, the subscriber is told to resync, which
+clients handle by refetching.
+"""
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from services import invalidation_bus
+
+LEDGER_CHANGES = "ledger_changes"
+
+# Events buffered per connection before it is told to resync instead
+SUBSCRIBER_QUEUE_SIZE = 256
+KEEPALIVE_SECONDS = 15
+
+RESYNC = {"type": "resync"}
+
+
+def publish_change(db: Session, kind: str, action: str, data: Dict[str, Any], audience: Optional[List[int]] = None) -> None:
+    """Queue a change event that is delivered once this transaction commits
+
+    kind is "ledger_entry", "credit_card" or "spending_category"; action is
+    "created", "updated" or "deleted". audience lists the user ids allowed to
+    see the event, or None for everyone.
+    """
+    event = {"type": kind, "action": action, "data": data, "audience": audience}
+    invalidation_bus.publish(db, LEDGER_CHANGES, jsonable_encoder(event))
+
+
+class _Subscriber:
+    def __init__(self, user_id: int, is_admin: bool):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def can_see(self, event: Dict[str, Any]) -> bool:
+        audience = event.get("audience")
+        return self.is_admin or audience is None or self.user_id in audience
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        # Runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Drop the backlog; the client refetches everything anyway
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List[_Subscriber] = []
+        self.delivered = 0
+
+    def deliver(self, event: Optional[Dict[str, Any]]) -> None:
+        """Fan an event out to visible subscribers; None means events may have been missed"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if event is None or subscriber.can_see(event):
+                outgoing = RESYNC if event is None else {key: value for key, value in event.items() if key != "audience"}
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber.offer, outgoing)
+                    self.delivered += 1
+                except RuntimeError:
+                    # The subscriber's loop has closed
+                    pass
+
+    async def stream(self, user_id: int, is_admin: bool) -> AsyncIterator[str]:
+        """Yield server-sent events for one connection until the client goes away"""
+        subscriber = _Subscriber(user_id, is_admin)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        try:
+            yield "retry: 5000\n\n"
+            yield f"data: {json.dumps({'type': 'ready'})}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                if event is RESYNC:
+                    subscriber.overflowed = False
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            with self._lock:
+                self._subscribers.remove(subscriber)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "delivered": self.delivered}
+
+
+# Shared by every stream in this process
+change_feed = ChangeFeed()
+
+invalidation_bus.subscribe(LEDGER_CHANGES, change_feed.deliver)
@@ -0,0 +1,169 @@
+"""
+Conversation history management for the chatbot.
+
+Keeps the running conversation as a list of turns with approximate token
+counts. Once the history grows past the configured budget, older turns are
+compacted into a short rolling summary so every request resends a bounded
+amount of context. The summarization call is made without holding the
+history's lock, and async callers run it in the threadpool (aadd_exchange).
+"""
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from services.llm_client import InstrumentedModelClient
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text with Gemini/SentencePiece style tokenizers
+CHARS_PER_TOKEN = 4
+
+SUMMARY_INSTRUCTION = """Summarize the following conversation between a user and an AI assistant
+for a personal life tracking application. Keep facts, numbers, names and open
+questions the assistant may need later. Write at most a few short sentences.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the token count of a piece of text"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class ChatTurn:
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.tokens = estimate_tokens(content)
+
+    def to_content(self) -> Dict[str, Any]:
+        return {"role": self.role, "parts": [{"text": self.content}]}
+
+
+class ChatHistoryManager:
+    """Token-budgeted conversation history with rolling summarization"""
+
+    def __init__(
+        self,
+        client: InstrumentedModelClient,
+        model_name: str,
+        token_budget: int,
+        keep_recent_turns: int = 4,
+        summary_max_tokens: int = 300,
+    ):
+        self.client = client
+        self.model_name = model_name
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.summary: str = ""
+        self.turns: List[ChatTurn] = []
+        self.compactions = 0
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+
+    @property
+    def summary_tokens(self) -> int:
+        return estimate_tokens(self.summary)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.summary_tokens + sum(turn.tokens for turn in self.turns)
+
+    def build_contents(self, message: str) -> List[Dict[str, Any]]:
+        """Build the request contents: summary, recent turns, then the new message"""
+        with self._lock:
+            contents = []
+            if self.summary:
+                contents.append({"role": "user", "parts": [{"text": f"Summary of our conversation so far: {self.summary}"}]})
+                contents.append({"role": "model", "parts": [{"text": "Understood."}]})
+            contents.extend(turn.to_content() for turn in self.turns)
+        contents.append({"role": "user", "parts": [{"text": message}]})
+        return contents
+
+    def add_exchange(self, message: str, response_text: str) -> None:
+        """Record a completed user/model exchange and compact if over budget
+
+        Compacting makes a blocking model call; async code uses aadd_exchange.
+        """
+        with self._lock:
+            self.turns.append(ChatTurn("user", message))
+            self.turns.append(ChatTurn("model", response_text))
+            over_budget = self.total_tokens > self.token_budget
+        if over_budget:
+            self._compact()
+
+    async def aadd_exchange(self, message: str, response_text: str) -> None:
+        """add_exchange without blocking the event loop on the summarization call"""
+        await run_in_threadpool(self.add_exchange, message, response_text)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "turns": len(self.turns),
+                "summary_tokens": self.summary_tokens,
+                "total_tokens": self.total_tokens,
+                "token_budget": self.token_budget,
+                "compactions": self.compactions,
+            }
+
+    def _compact(self) -> None:
+        """Fold everything but the most recent turns into the rolling summary"""
+        # One summarization at a time; a concurrent exchange leaves it to the running one
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                # Keep whole exchanges so the history still alternates user/model
+                keep = self.keep_recent_turns - (self.keep_recent_turns % 2)
+                older = self.turns[:-keep] if keep else list(self.turns)
+                earlier_summary = self.summary
+            if not older:
+                return
+
+            # The model call runs without the lock so readers and writers aren't held up
+            summary = self._summarize(older, earlier_summary)
+            with self._lock:
+                if self.turns[:len(older)] != older:
+                    # Reset while summarizing
+                    return
+                if summary is None:
+                    # Summarization failed - drop the oldest turns rather than blow the budget
+                    logger.warning(f"Chat summarization failed, dropping {len(older)} old turns")
+                else:
+                    self.summary = summary
+                self.turns = self.turns[len(older):]
+                self.compactions += 1
+                logger.info(f"Compacted chat history to {self.total_tokens} tokens (budget {self.token_budget})")
+        finally:
+            self._compact_lock.release()
+
+    def _summarize(self, turns: List[ChatTurn], earlier_summary: str = "") -> Optional[str]:
+        transcript = "\n".join(f"{turn.role}: {turn.content}" for turn in turns)
+        if earlier_summary:
+            transcript = f"Earlier summary: {earlier_summary}\n{transcript}"
+
+        try:
+            response = self.client.generate(
+                model=self.model_name,
+                contents=[f"{SUMMARY_INSTRUCTION}\n\n{transcript}"],
+                config={
+                    "max_output_tokens": self.summary_max_tokens,
+                    "temperature": 0.2,
+                },
+                route="chatbot-summary",
+            )
+            text = response.text.strip()
+            return text or None
+        except Exception as e:
+            logger.error(f"Error summarizing chat history: {str(e)}", exc_info=True)
+            return None
@@ -0,0 +1,110 @@
+"""
+Function-call tools that let the chatbot answer questions about the caller's
+spending.
+
+Each tool maps to an aggregate query in LedgerAggregateService, always scoped
+to the user who sent the message, so the model receives a few compact rows
+instead of raw ledger data in the prompt.
+"""
+from typing import Any, Callable, Dict, List
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from services.ledger_aggregate_service import LedgerAggregateService
+
+_YEAR = {"type": "INTEGER", "description": "Four-digit year, e.g. 2025"}
+_MONTH = {"type": "INTEGER", "description": "Month number, 1-12"}
+_CATEGORY = {"type": "STRING", "description": "Exact spending category name"}
+_CARD = {"type": "STRING", "description": "Exact credit card name"}
+_LIMIT = {"type": "INTEGER", "description": "Maximum number of rows to return"}
+
+TOOL_DECLARATIONS: List[Dict[str, Any]] = [
+    {
+        "name": "get_total_spend",
+        "description": "Total amount the user spent, optionally filtered by year, month, category and credit card.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {"year": _YEAR, "month": _MONTH, "category": _CATEGORY, "credit_card": _CARD},
+        },
+    },
+    {
+        "name": "get_monthly_totals",
+        "description": "The user's total spend per month, most recent first.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {"year": _YEAR, "category": _CATEGORY, "credit_card": _CARD, "limit": _LIMIT},
+        },
+    },
+    {
+        "name": "get_category_totals",
+        "description": "The user's total spend per spending category, largest first.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {"year": _YEAR, "month": _MONTH, "credit_card": _CARD, "limit": _LIMIT},
+        },
+    },
+    {
+        "name": "get_card_totals",
+        "description": "The user's total spend per credit card, largest first.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {"year": _YEAR, "month": _MONTH, "category": _CATEGORY, "limit": _LIMIT},
+        },
+    },
+    {
+        "name": "get_top_merchants",
+        "description": "Merchants the user has most often confirmed in AI expense imports, with their category.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {"category": _CATEGORY, "limit": _LIMIT},
+        },
+    },
+]
+
+_TOOLS: Dict[str, Callable[..., Any]] = {
+    "get_total_spend": LedgerAggregateService.get_total,
+    "get_monthly_totals": LedgerAggregateService.get_monthly_totals,
+    "get_category_totals": LedgerAggregateService.get_category_totals,
+    "get_card_totals": LedgerAggregateService.get_card_totals,
+    "get_top_merchants": LedgerAggregateService.get_top_merchants,
+}
+
+# Generation config fields that enable the tools; we run them ourselves
+TOOL_CONFIG: Dict[str, Any] = {
+    "tools": [{"function_declarations": TOOL_DECLARATIONS}],
+    "automatic_function_calling": {"disable": True},
+}
+
+
+def execute_tool(db: Session, user_id: int, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one tool call for a user, returning a JSON-serializable response"""
+    tool = _TOOLS.get(name)
+    if tool is None:
+        return {"error": f"Unknown tool: {name}"}
+
+    # Only pass declared arguments; the user is never taken from the model
+    declared = next(decl for decl in TOOL_DECLARATIONS if decl["name"] == name)["parameters"]["properties"]
+    kwargs = {key: value for key, value in (args or {}).items() if key in declared and value is not None}
+    for key in ("year", "month", "limit"):
+        if key in kwargs:
+            try:
+                kwargs[key] = int(kwargs[key])
+            except (TypeError, ValueError):
+                return {"error": f"Invalid {key}: {kwargs[key]}"}
+
+    try:
+        return {"result": tool(db, user_id, **kwargs)}
+    except HTTPException as e:
+        return {"error": str(e.detail)}
+
+
+def tool_turns(db: Session, user_id: int, function_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Build the model's function-call turn and our function-response turn"""
+    return [
+        {"role": "model", "parts": [{"function_call": call} for call in function_calls]},
+        {"role": "user", "parts": [
+            {"function_response": {"name": call["name"], "response": execute_tool(db, user_id, call["name"], call.get("args") or {})}}
+            for call in function_calls
+        ]},
+    ]
@@ -1,41 +1,24 @@
 from typing import Dict, Any, Optional
-from google import genai
-from google.genai import types
-import os
 from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 import asyncio
 import logging
-from config import MODEL_NAME_GENAI
+import threading
+from config import MODEL_NAME_GENAI, GOOGLE_API_KEY, LLM_BACKEND, CHAT_HISTORY_TOKEN_BUDGET, CHAT_HISTORY_KEEP_RECENT_TURNS, CHAT_SUMMARY_MAX_TOKENS
+from services.chat_history import ChatHistoryManager
+from services.llm_client import get_model_client
+from services.prompt_builder import CHAT_SYSTEM_PROMPT, fit_chat_message
+from services.chat_tools import TOOL_CONFIG, tool_turns
+from database.database import get_db_session
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure Google Generative AI
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
 def create_system_prompt() -> str:
     """Create the system prompt for the chatbot"""
-    return """You are a helpful AI assistant for a personal life tracking application. 
-    
-    Your role is to help users with:
-    - General questions about their personal data
-    - Guidance on using the application features
-    - Simple calculations and analysis
-    - Friendly conversation and support
-    
-    Keep your responses:
-    - Helpful and informative
-    - Conversational and friendly
-    - Concise but thorough (aim for 2-3 sentences)
-    - Focused on personal life tracking topics when relevant
-    
-    You can help with questions about expenses, fitness tracking, travel, weather, and general life management topics.
-
-    ALWAYS add [eom] at the end of your response, in a new line.
-    
-    IMPORTANT: Keep responses concise and complete. Avoid long, rambling responses.
-    """
+    return CHAT_SYSTEM_PROMPT
 
 def _raise_service_not_configured_error() -> None:
     """Raise HTTPException for unconfigured chatbot service"""
@@ -58,24 +41,69 @@ def _raise_reset_error(error_message: str) -> None:
         detail=f"Failed to reset chat session: {error_message}"
     )
 
-# Initialize client and chat session
-if GOOGLE_API_KEY:
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    chat = client.chats.create(
-        model=MODEL_NAME_GENAI,
-        config=types.GenerateContentConfig(
-            system_instruction=create_system_prompt(),
-            # max_output_tokens=50,
-            temperature=0.3,
-            top_p=0.8,
-            top_k=20,
-        ),
-        history=[]
-    )
-else:
-    logger.warning("GOOGLE_API_KEY not found, chatbot service will be unavailable")
-    client = None
-    chat = None
+def _create_chat_config() -> Dict[str, Any]:
+    """Create the generation config shared by every chat request"""
+    return {
+        "system_instruction": create_system_prompt(),
+        # "max_output_tokens": 50,
+        "temperature": 0.3,
+        "top_p": 0.8,
+        "top_k": 20,
+    }
+
+# Tool rounds per message before the model must answer from what it has
+MAX_TOOL_ROUNDS = 3
+
+chat_config = _create_chat_config()
+tool_chat_config = {**chat_config, **TOOL_CONFIG}
+
+# The model client (and with it google.genai) is created on the first chat
+# request rather than at import, keeping it out of worker cold starts
+client = None
+_initialized = False
+_init_lock = threading.Lock()
+
+# One conversation per user: tool answers carry the caller's ledger data, so
+# a history must never be replayed to anyone else
+_histories: Dict[Optional[int], ChatHistoryManager] = {}
+_histories_lock = threading.Lock()
+
+def _get_client():
+    """Create the model client on first use"""
+    global client, _initialized
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                client = get_model_client()
+                if not client:
+                    logger.warning("GOOGLE_API_KEY not found, chatbot service will be unavailable")
+                _initialized = True
+    return client
+
+def _get_history(user_id: Optional[int]) -> Optional[ChatHistoryManager]:
+    """The user's conversation history, created on first use"""
+    if not _get_client():
+        return None
+    with _histories_lock:
+        history = _histories.get(user_id)
+        if history is None:
+            history = ChatHistoryManager(
+                client,
+                MODEL_NAME_GENAI,
+                token_budget=CHAT_HISTORY_TOKEN_BUDGET,
+                keep_recent_turns=CHAT_HISTORY_KEEP_RECENT_TURNS,
+                summary_max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+            )
+            _histories[user_id] = history
+    return history
+
+def _run_tools(user_id: int, function_calls: list) -> list:
+    """Run tool calls with their own session - the request's session is closed once streaming starts"""
+    db = get_db_session()
+    try:
+        return tool_turns(db, user_id, function_calls)
+    finally:
+        db.close()
 
 class ChatMessage:
     def __init__(self, role: str, content: str):
@@ -84,19 +112,40 @@ class ChatMessage:
 
 class ChatbotService:
     @staticmethod
-    def send_message(message: str, conversation_history: list = None) -> Dict[str, Any]:
-        """Send a message to the chatbot and get a response"""
+    def send_message(message: str, conversation_history: list = None, user_id: Optional[int] = None, db: Optional[Session] = None) -> Dict[str, Any]:
+        """Send a message to the chatbot and get a response
+
+        With a db session and user, the model may call ledger tools scoped to
+        that user before answering.
+        """
         
-        if not chat:
+        history = _get_history(user_id)
+        if not history:
             logger.error("Chat session not available")
             _raise_service_not_configured_error()
         
         try:
-            # Send the message and get response
-            response = chat.send_message(message)
+            # Send the message along with the budgeted history
+            message = fit_chat_message(message)
+            contents = history.build_contents(message)
+            use_tools = db is not None and user_id is not None
+            for tool_round in range(MAX_TOOL_ROUNDS + 1):
+                response = client.generate(
+                    model=MODEL_NAME_GENAI,
+                    contents=contents,
+                    config=tool_chat_config if use_tools and tool_round < MAX_TOOL_ROUNDS else chat_config,
+                    route="/chatbot/send-message",
+                    user_id=user_id
+                )
+                if not response.function_calls:
+                    break
+                # Answer the model's data questions and let it continue
+                contents.extend(tool_turns(db, user_id, response.function_calls))
+            response_text = response.text.strip()
+            history.add_exchange(message, response_text)
             
             result = {
-                "response": response.text.strip(),
+                "response": response_text,
                 "timestamp": "2024-01-01T00:00:00Z"  # You could add actual timestamp logic
             }
             return result
@@ -106,21 +155,42 @@ class ChatbotService:
             _raise_processing_error(str(e))
 
     @staticmethod
-    async def send_message_stream(message: str, conversation_history: list = None):
+    async def send_message_stream(message: str, conversation_history: list = None, user_id: Optional[int] = None):
         """Send a message to the chatbot and get a streaming response"""
         
-        if not chat:
+        history = _get_history(user_id)
+        if not history:
             logger.error("Chat session not available for streaming")
             _raise_service_not_configured_error()
         
         try:
-            # Send the message and get streaming response
-            response_stream = chat.send_message_stream(message)
+            # Send the message along with the budgeted history and get streaming response
+            message = fit_chat_message(message)
+            contents = history.build_contents(message)
+            use_tools = user_id is not None
             
             # Stream the response chunks as simple text
-            for chunk in response_stream:
-                if chunk.text:
-                    yield chunk.text
+            response_parts = []
+            for tool_round in range(MAX_TOOL_ROUNDS + 1):
+                response_stream = client.agenerate_stream(
+                    model=MODEL_NAME_GENAI,
+                    contents=contents,
+                    config=tool_chat_config if use_tools and tool_round < MAX_TOOL_ROUNDS else chat_config,
+                    route="/chatbot/send-message-stream",
+                    user_id=user_id
+                )
+                function_calls = []
+                async for chunk in response_stream:
+                    function_calls.extend(chunk.function_calls)
+                    if chunk.text:
+                        response_parts.append(chunk.text)
+                        yield chunk.text
+                if not function_calls:
+                    break
+                contents.extend(await run_in_threadpool(_run_tools, user_id, function_calls))
+            
+            # Only record the exchange once the full response has been streamed
+            await history.aadd_exchange(message, "".join(response_parts).strip())
                     
         except Exception as e:
             logger.error(f"Error during streaming: {str(e)}", exc_info=True)
@@ -129,35 +199,33 @@ class ChatbotService:
     @staticmethod
     def get_health_status() -> Dict[str, Any]:
         """Get chatbot health status"""
-        status = "healthy" if chat else "unconfigured"
+        configured = _get_client() is not None
+        status = "healthy" if configured else "unconfigured"
+        with _histories_lock:
+            histories = list(_histories.values())
         
         return {
             "status": status,
-            "model": MODEL_NAME_GENAI if chat else None,
-            "api_key_configured": bool(GOOGLE_API_KEY)
+            "model": MODEL_NAME_GENAI if configured else None,
+            "backend": LLM_BACKEND,
+            "api_key_configured": bool(GOOGLE_API_KEY),
+            "history": {
+                "conversations": len(histories),
+                "compactions": sum(history.compactions for history in histories),
+            } if configured else None
         }
 
     @staticmethod
-    def reset_chat() -> Dict[str, Any]:
-        """Reset the chat session by recreating it"""
-        global chat
-        
-        if not GOOGLE_API_KEY:
+    def reset_chat(user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Reset the user's chat session by clearing their conversation history"""
+        history = _get_history(user_id)
+        if not history:
             logger.error("Cannot reset chat: GOOGLE_API_KEY not found")
             _raise_service_not_configured_error()
         
         try:
-            # Recreate the chat session
-            chat = client.chats.create(
-                model=MODEL_NAME_GENAI,
-                config=types.GenerateContentConfig(
-                    system_instruction=create_system_prompt(),
-                    temperature=0.3,
-                    top_p=0.8,
-                    top_k=20,
-                ),
-                history=[]
-            )
+            # Drop the recent turns and the rolling summary
+            history.reset()
             
             return {
                 "status": "success",
@@ -166,4 +234,4 @@ class ChatbotService:
             
         except Exception as e:
             logger.error(f"Error resetting chat session: {str(e)}", exc_info=True)
-            _raise_reset_error(str(e)) 
\ No newline at end of file
+            _raise_reset_error(str(e))
@@ -0,0 +1,195 @@
+"""
+Binary columnar responses for analytics clients.
+
+Notebooks and chart code can ask for the ledger listing and summaries with
+Accept: application/vnd.apache.arrow.stream (or application/msgpack) instead
+of JSON. Rows come from the query as plain tuples, a partition at a time, and
+are transposed straight into Arrow record batches - no per-row dicts. Row
+responses are streamed as the partitions arrive: the Arrow IPC schema, one
+record batch per partition, then the end-of-stream marker, so an export holds
+one partition in memory rather than the whole result. msgpack responses carry
+the same columns as one map of column name to values per partition, back to
+back (read them with msgpack.Unpacker). Small aggregate responses are encoded
+in one piece and coalesced like their JSON form.
+
+pyarrow and msgpack are optional: they are imported on first use, and a
+server without them answers 406 for that format while JSON keeps working.
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from services.request_coalescer import request_coalescer
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+X_MSGPACK = "application/x-msgpack"
+
+BINARY_MEDIA_TYPES = (ARROW_STREAM, MSGPACK, X_MSGPACK)
+JSON_MEDIA_TYPES = ("application/json", "application/*", "*/*")
+
+# Arrow IPC end-of-stream: continuation marker and a zero-length message
+ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+# (name, kind) column specs; "cents" columns are integer cents sent as dollars
+Columns = Sequence[Tuple[str, str]]
+
+
+def accepted_binary_type(request: Request) -> Optional[str]:
+    """The binary media type the client prefers over JSON, or None for JSON"""
+    best, best_quality = None, 0.0
+    for part in request.headers.get("accept", "").split(","):
+        media_type, _, params = part.partition(";")
+        media_type = media_type.strip().lower()
+        if media_type not in BINARY_MEDIA_TYPES and media_type not in JSON_MEDIA_TYPES:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        # Ties go to the type listed first
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best if best in BINARY_MEDIA_TYPES else None
+
+
+def _import(media_type: str):
+    try:
+        if media_type == ARROW_STREAM:
+            import pyarrow
+            import pyarrow.compute  # noqa: F401 - cents to dollars
+            return pyarrow
+        import msgpack
+        return msgpack
+    except ImportError:
+        package = "pyarrow" if media_type == ARROW_STREAM else "msgpack"
+        raise HTTPException(status_code=406, detail=f"{media_type} responses are not available on this server ({package} is not installed)")
+
+
+def _arrow_type(pa, kind: str):
+    return {
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "string": pa.string(),
+        "float64": pa.float64(),
+        "cents": pa.int64(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }[kind]
+
+
+def arrow_schema(pa, columns: Columns):
+    """Arrow schema of the encoded columns (cents columns become float64 dollars)"""
+    return pa.schema([
+        (name, pa.float64() if kind == "cents" else _arrow_type(pa, kind))
+        for name, kind in columns
+    ])
+
+
+def _arrow_batch(pa, schema, columns: Columns, partition: Sequence[Sequence[Any]]):
+    arrays = []
+    for (name, kind), values in zip(columns, zip(*partition)):
+        array = pa.array(values, type=_arrow_type(pa, kind))
+        if kind == "cents":
+            array = pa.compute.divide(array.cast(pa.float64()), 100.0)
+        arrays.append(array)
+    return pa.record_batch(arrays, schema=schema)
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        # ISO 8601, as in the JSON responses
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} as msgpack")
+
+
+def encode_columns(media_type: str, columns: Columns, partitions: Iterable[Sequence[Sequence[Any]]]) -> Iterator[bytes]:
+    """Encode row partitions (tuples in column order, or Arrow record batches in
+    arrow_schema) as Arrow IPC messages or msgpack column maps, one per partition
+
+    The package is imported before the first partition is read, so a missing
+    one fails here rather than mid-stream.
+    """
+    module = _import(media_type)
+    if media_type == ARROW_STREAM:
+        return _arrow_messages(module, columns, partitions)
+    return _msgpack_maps(module, columns, partitions)
+
+
+def _arrow_messages(pa, columns: Columns, partitions: Iterable[Sequence[Sequence[Any]]]) -> Iterator[bytes]:
+    schema = arrow_schema(pa, columns)
+    yield schema.serialize().to_pybytes()
+    for partition in partitions:
+        if isinstance(partition, pa.RecordBatch):
+            # Already columnar (archived years), in the encoded schema
+            yield partition.serialize().to_pybytes()
+        elif partition:
+            yield _arrow_batch(pa, schema, columns, partition).serialize().to_pybytes()
+    yield ARROW_EOS
+
+
+def _msgpack_maps(msgpack, columns: Columns, partitions: Iterable[Sequence[Sequence[Any]]]) -> Iterator[bytes]:
+    sent = False
+    for partition in partitions:
+        if hasattr(partition, "to_pydict"):
+            # An Arrow record batch of archived rows, already in dollars
+            data = partition.to_pydict()
+        elif partition:
+            data = {
+                name: [value / 100 for value in values] if kind == "cents" else list(values)
+                for (name, kind), values in zip(columns, zip(*partition))
+            }
+        else:
+            continue
+        sent = True
+        yield msgpack.packb(data, default=_msgpack_default)
+    if not sent:
+        # An empty result is still one map with every column
+        yield msgpack.packb({name: [] for name, _ in columns})
+
+
+def encode_records(media_type: str, records: List[Dict[str, Any]]) -> List[bytes]:
+    """Encode a small list of dicts (aggregate rows) in a columnar format"""
+    module = _import(media_type)
+    if media_type == ARROW_STREAM:
+        table = module.Table.from_pylist(records)
+        chunks = [table.schema.serialize().to_pybytes()]
+        chunks.extend(batch.serialize().to_pybytes() for batch in table.to_batches())
+        chunks.append(ARROW_EOS)
+        return chunks
+    names = list(records[0]) if records else []
+    return [module.packb({name: [record[name] for record in records] for name in names}, default=_msgpack_default)]
+
+
+def columnar_response(media_type: str, columns: Columns, load_partitions: Callable[[], Iterable[Sequence[Sequence[Any]]]]) -> StreamingResponse:
+    """Columnar response for a row query, streamed partition by partition as the rows are fetched
+
+    Not coalesced: sharing a flight would mean buffering the whole export.
+    load_partitions is only called once the response starts streaming.
+    """
+    _import(media_type)
+
+    def chunks() -> Iterator[bytes]:
+        yield from encode_columns(media_type, columns, load_partitions())
+
+    return StreamingResponse(chunks(), media_type=media_type, headers={"Vary": "Accept"})
+
+
+async def records_response(request: Request, scope: Hashable, groups: Tuple[str, ...], load_records: Callable[[Session], List[Dict[str, Any]]]):
+    """Coalesced response for aggregate rows, as JSON or the binary format the client asked for"""
+    media_type = accepted_binary_type(request)
+    if media_type is None:
+        return await request_coalescer.json_response(request, scope, groups, load_records)
+    _import(media_type)
+    chunks = await request_coalescer.run(
+        request,
+        request_coalescer.key(request, (scope, media_type), groups),
+        lambda db: encode_records(media_type, load_records(db))
+    )
+    return StreamingResponse(iter(chunks), media_type=media_type, headers={"Vary": "Accept"})
@@ -2,42 +2,50 @@ from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional, Dict, Any
 from database.db_models import CreditCard as DBCreditCard, User as DBUser, LedgerEntry as DBLedgerEntry
 from database.models import CreateCreditCardRequest, UpdateCreditCardRequest
+from services.reference_cache import reference_cache, CachedReference, CREDIT_CARDS
+from services import invalidation_bus
+from services.change_feed import publish_change
+from services.ledger_archive_service import LedgerArchiveService
 from fastapi import HTTPException
 
+def _load_credit_cards(db: Session, current_user_id: int, is_admin: bool) -> List[Dict[str, Any]]:
+    try:
+        if is_admin:
+            credit_cards = db.query(DBCreditCard).options(joinedload(DBCreditCard.user)).all()
+        else:
+            credit_cards = db.query(DBCreditCard).options(joinedload(DBCreditCard.user)).filter(
+                DBCreditCard.user_id == current_user_id
+            ).all()
+        
+        # Convert to response format with user information
+        cards = []
+        for card in credit_cards:
+            user_info = {
+                "id": card.user.id,
+                "name": card.user.name,
+                "email": card.user.email
+            } if card.user else None
+            
+            cards.append({
+                "id": card.id,
+                "user_id": card.user_id,
+                "name": card.name,
+                "opening_time": card.opening_time,
+                "created_at": card.created_at,
+                "updated_at": card.updated_at,
+                "user": user_info
+            })
+        
+        return cards
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 class CreditCardService:
     @staticmethod
-    def get_credit_cards(db: Session, current_user_id: int, is_admin: bool = False) -> List[Dict[str, Any]]:
-        """Get all credit cards - admin can see all, others see only their own"""
-        try:
-            if is_admin:
-                credit_cards = db.query(DBCreditCard).options(joinedload(DBCreditCard.user)).all()
-            else:
-                credit_cards = db.query(DBCreditCard).options(joinedload(DBCreditCard.user)).filter(
-                    DBCreditCard.user_id == current_user_id
-                ).all()
-            
-            # Convert to response format with user information
-            cards = []
-            for card in credit_cards:
-                user_info = {
-                    "id": card.user.id,
-                    "name": card.user.name,
-                    "email": card.user.email
-                } if card.user else None
-                
-                cards.append({
-                    "id": card.id,
-                    "user_id": card.user_id,
-                    "name": card.name,
-                    "opening_time": card.opening_time,
-                    "created_at": card.created_at,
-                    "updated_at": card.updated_at,
-                    "user": user_info
-                })
-            
-            return cards
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    def get_credit_cards(db: Session, current_user_id: int, is_admin: bool = False) -> CachedReference:
+        """Get all credit cards and their ETag - admin can see all, others see only their own"""
+        scope = "all" if is_admin else current_user_id
+        return reference_cache.get(CREDIT_CARDS, scope, lambda: _load_credit_cards(db, current_user_id, is_admin))
 
     @staticmethod
     def create_credit_card(db: Session, card_data: CreateCreditCardRequest) -> Dict[str, Any]:
@@ -56,7 +64,7 @@ class CreditCardService:
             )
             
             db.add(db_card)
-            db.commit()
+            db.flush()
             db.refresh(db_card)
             
             # Return the created card with user information
@@ -66,7 +74,7 @@ class CreditCardService:
                 "email": db_user.email
             }
             
-            return {
+            result = {
                 "id": db_card.id,
                 "user_id": db_card.user_id,
                 "name": db_card.name,
@@ -75,6 +83,11 @@ class CreditCardService:
                 "updated_at": db_card.updated_at,
                 "user": user_info
             }
+            invalidation_bus.publish(db, CREDIT_CARDS)
+            publish_change(db, "credit_card", "created", result, [db_card.user_id])
+            db.commit()
+            
+            return result
         except HTTPException:
             raise
         except Exception as e:
@@ -134,9 +147,6 @@ class CreditCardService:
             if not db_card:
                 raise HTTPException(status_code=404, detail="Credit card not found")
             
-            # Store the old card name for updating ledger entries
-            old_card_name = db_card.name
-            
             # Verify the new user exists if user_id is being changed
             if card_update.user_id != db_card.user_id:
                 db_user = db.query(DBUser).filter(DBUser.id == card_update.user_id).first()
@@ -144,23 +154,13 @@ class CreditCardService:
                     raise HTTPException(status_code=400, detail=f"User with ID {card_update.user_id} not found")
             
             # Update the card
+            previous_user_id = db_card.user_id
             db_card.name = card_update.name
             db_card.user_id = card_update.user_id
             db_card.opening_time = card_update.opening_time
             
-            # Update all related ledger entries if card name changed
-            updated_count = 0
-            if old_card_name != card_update.name:
-                # Use a single UPDATE query instead of iterating
-                result = db.query(DBLedgerEntry).filter(
-                    DBLedgerEntry.credit_card == old_card_name
-                ).update(
-                    {DBLedgerEntry.credit_card: card_update.name},
-                    synchronize_session=False
-                )
-                updated_count = result
-            
-            db.commit()
+            # Ledger entries reference the card by id, so a rename needs no ledger updates
+            db.flush()
             db.refresh(db_card)
             
             # Get user information from the joined load
@@ -170,17 +170,23 @@ class CreditCardService:
                 "email": db_card.user.email
             } if db_card.user else None
             
+            card = {
+                "id": db_card.id,
+                "user_id": db_card.user_id,
+                "name": db_card.name,
+                "opening_time": db_card.opening_time,
+                "created_at": db_card.created_at,
+                "updated_at": db_card.updated_at,
+                "user": user_info
+            }
+            invalidation_bus.publish(db, CREDIT_CARDS)
+            # Clients relabel their ledger entries from this event; both owners need it
+            publish_change(db, "credit_card", "updated", card, sorted({previous_user_id, db_card.user_id}))
+            db.commit()
+            
             return {
-                "card": {
-                    "id": db_card.id,
-                    "user_id": db_card.user_id,
-                    "name": db_card.name,
-                    "opening_time": db_card.opening_time,
-                    "created_at": db_card.created_at,
-                    "updated_at": db_card.updated_at,
-                    "user": user_info
-                },
-                "message": f"Credit card updated successfully. {updated_count} ledger entries were also updated." if updated_count > 0 else "Credit card updated successfully."
+                "card": card,
+                "message": "Credit card updated successfully."
             }
         except HTTPException:
             raise
@@ -192,7 +198,7 @@ class CreditCardService:
 
     @staticmethod
     def delete_credit_card(db: Session, card_id: int, current_user_id: int, is_admin: bool = False) -> Dict[str, str]:
-        """Delete a credit card - prevents deletion if related ledger entries exist"""
+        """Delete a credit card - prevents deletion if related ledger entries exist, archived or not"""
         try:
             # Find the card - allow admin users to delete any card
             query = db.query(DBCreditCard).filter(DBCreditCard.id == card_id)
@@ -206,10 +212,10 @@ class CreditCardService:
             if not db_card:
                 raise HTTPException(status_code=404, detail="Credit card not found")
             
-            # Check for related ledger entries
+            # Check for related ledger entries, including years removed to the archive
             related_entries = db.query(DBLedgerEntry).filter(
-                DBLedgerEntry.credit_card == db_card.name
-            ).count()
+                DBLedgerEntry.credit_card_id == db_card.id
+            ).count() + LedgerArchiveService.count_references(db, "credit_card_id", db_card.id)
             
             if related_entries > 0:
                 raise HTTPException(
@@ -218,6 +224,8 @@ class CreditCardService:
                 )
             
             db.delete(db_card)
+            invalidation_bus.publish(db, CREDIT_CARDS)
+            publish_change(db, "credit_card", "deleted", {"id": db_card.id, "user_id": db_card.user_id}, [db_card.user_id])
             db.commit()
             
             return {"message": "Credit card deleted successfully"}
@@ -0,0 +1,73 @@
+"""
+Incremental parser for the JSON array of expense entries in a streamed model
+response.
+
+The model output arrives in arbitrary text chunks and may be wrapped in a
+markdown code fence. The parser skips everything up to the opening '[' and
+then emits each top-level object as soon as its closing brace arrives, so
+entries can be forwarded to the client before the response is complete.
+"""
+import json
+from typing import Any, Dict, List
+
+
+class IncrementalExpenseParser:
+    def __init__(self):
+        self.text = ""  # Everything fed so far, for raw_response/debugging
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object: List[str] = []
+        self.errors: List[str] = []
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of model output, returning any objects it completed"""
+        self.text += chunk
+        completed = []
+        for char in chunk:
+            if self._done:
+                break
+            if not self._in_array:
+                if char == "[":
+                    self._in_array = True
+                continue
+
+            if self._depth == 0:
+                # Between objects: only a new object or the end of the array matters
+                if char == "{":
+                    self._depth = 1
+                    self._object = [char]
+                elif char == "]":
+                    self._done = True
+                continue
+
+            self._object.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = "".join(self._object)
+                    self._object = []
+                    try:
+                        item = json.loads(raw)
+                        if isinstance(item, dict):
+                            completed.append(item)
+                    except json.JSONDecodeError as e:
+                        self.errors.append(f"{str(e)}: {raw[:200]}")
+        return completed
@@ -0,0 +1,269 @@
+"""
+Background extraction jobs for multi-page statements.
+
+A job splits the uploaded pages into separate model calls that run in
+parallel (bounded by a worker pool), then merges and deduplicates the
+extracted entries. Job state is persisted in the extraction_jobs table so
+clients can poll or stream progress from any instance.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import EXTRACTION_JOB_WORKERS, EXTRACTION_JOB_STALE_SECONDS
+from database.database import get_db_session
+from database.db_models import ExtractionJob as DBExtractionJob
+from services.ai_assistant_service import AIAssistantService, ExpenseEntry
+from services.llm_client import get_model_client
+from services.prompt_builder import build_page_content
+from services.image_pipeline import SpooledImage, spool_images, decode_images, close_spooled
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+# Bounds how many page calls all jobs in this process have in flight
+_worker_pool = asyncio.Semaphore(EXTRACTION_JOB_WORKERS)
+
+# Keep references to running jobs so they aren't garbage collected mid-flight
+_running_jobs: Set[asyncio.Task] = set()
+
+# Wakes up progress streams in this process when a job changes
+_job_events: Dict[str, asyncio.Event] = {}
+# Open progress streams per job; the job's event is dropped when the last one ends
+_job_streams: Dict[str, int] = {}
+
+
+def _job_to_response(job: DBExtractionJob) -> Dict[str, Any]:
+    status = job.status
+    error = job.error
+    # A job whose worker died (e.g. instance restart) would otherwise stay running forever
+    if status not in TERMINAL_STATUSES and job.updated_at is not None:
+        if datetime.now(timezone.utc) - job.updated_at > timedelta(seconds=EXTRACTION_JOB_STALE_SECONDS):
+            status = "failed"
+            error = "Job was interrupted before it finished"
+
+    return {
+        "job_id": job.id,
+        "user_id": job.user_id,
+        "status": status,
+        "total_pages": job.total_pages,
+        "completed_pages": job.completed_pages,
+        "result": json.loads(job.result) if job.result else None,
+        "error": error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+def _notify(job_id: str) -> None:
+    event = _job_events.get(job_id)
+    if event is not None:
+        event.set()
+
+
+def _update_job(job_id: str, **fields) -> None:
+    db = get_db_session()
+    try:
+        db.query(DBExtractionJob).filter(DBExtractionJob.id == job_id).update(fields, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to update extraction job {job_id}: {str(e)}", exc_info=True)
+    finally:
+        db.close()
+
+
+def _increment_progress(job_id: str) -> None:
+    _update_job(job_id, completed_pages=DBExtractionJob.completed_pages + 1)
+
+
+def _duplicate_key(entry: ExpenseEntry) -> Optional[tuple]:
+    """Identity of an entry for spotting the same content printed on several pages
+
+    Entries without notes or merchants can't be told apart from a second real
+    charge of the same amount (a subscription, equal per-page totals), so they
+    are never treated as duplicates.
+    """
+    notes = " ".join((entry.notes or "").lower().split())
+    merchants = tuple(sorted(merchant.lower() for merchant in entry.merchants or []))
+    if not notes and not merchants:
+        return None
+    return (entry.category, entry.year, entry.month, round(entry.amount, 2), notes, merchants)
+
+
+def merge_page_entries(page_results: List[Dict[str, Any]]) -> List[ExpenseEntry]:
+    """Merge per-page entries into one entry per (category, year, month)
+
+    An entry repeated verbatim on another page (same amount, notes and
+    merchants, e.g. a summary table printed on every page) is counted once.
+    Everything categorized as "Others" ends up aggregated into a single entry
+    per month, like a single-request extraction.
+    """
+    first_page: Dict[tuple, int] = {}
+    merged: Dict[tuple, ExpenseEntry] = {}
+    for page in page_results:
+        for item in page.get("entries") or []:
+            entry = ExpenseEntry(**item)
+            duplicate_key = _duplicate_key(entry)
+            if duplicate_key is not None:
+                if first_page.setdefault(duplicate_key, page["page"]) != page["page"]:
+                    continue
+
+            note = f"p{page['page']}: {entry.notes}" if entry.notes else f"p{page['page']}"
+            key = (entry.category, entry.year, entry.month)
+            if key not in merged:
+                merged[key] = entry.model_copy(update={"notes": note})
+            else:
+                existing = merged[key]
+                existing.amount = round(existing.amount + entry.amount, 2)
+                existing.notes = f"{existing.notes}; {note}"
+    return list(merged.values())
+
+
+async def _run_page(job_id: str, user_id: int, index: int, total: int, prompt: str, system_prompt: str, item: Optional[SpooledImage]) -> Dict[str, Any]:
+    async with _worker_pool:
+        page = {"page": index + 1, "entries": [], "error": None}
+        try:
+            contents = [build_page_content(prompt, index + 1, total)]
+            if item is not None:
+                images, _ = await decode_images([item])
+                contents.extend(images)
+            # The job's own worker pool bounds its fan-out, so skip the per-user cap
+            response_text, _, _, _ = await AIAssistantService.generate_extraction(
+                contents, system_prompt, route="/ai-assistant/jobs", metrics_user_id=user_id
+            )
+            page["entries"] = [entry.model_dump() for entry in AIAssistantService.parse_expense_entries(response_text)]
+        except HTTPException as e:
+            page["error"] = str(e.detail)
+        except Exception as e:
+            page["error"] = f"{type(e).__name__}: {str(e)}"
+
+    await run_in_threadpool(_increment_progress, job_id)
+    _notify(job_id)
+    return page
+
+
+async def _run_job(job_id: str, user_id: int, prompt: str, spooled: List[SpooledImage], category_names: List[str]) -> None:
+    try:
+        await run_in_threadpool(_update_job, job_id, status="running")
+        _notify(job_id)
+
+        system_prompt = AIAssistantService.create_system_prompt(category_names)
+        pages: List[Optional[SpooledImage]] = list(spooled) or [None]
+        page_results = await asyncio.gather(*[
+            _run_page(job_id, user_id, index, len(pages), prompt, system_prompt, item)
+            for index, item in enumerate(pages)
+        ])
+
+        entries = merge_page_entries(page_results)
+        succeeded = [page for page in page_results if page["error"] is None]
+        result = {
+            "entries": [entry.model_dump() for entry in entries],
+            "confidence": 0.8 if entries else 0.0,
+            "pages": page_results,
+        }
+        if succeeded:
+            await run_in_threadpool(_update_job, job_id, status="completed", result=json.dumps(result))
+        else:
+            await run_in_threadpool(_update_job, job_id, status="failed", result=json.dumps(result), error="All pages failed")
+    except Exception as e:
+        logger.error(f"Extraction job {job_id} failed: {type(e).__name__}: {str(e)}", exc_info=True)
+        await run_in_threadpool(_update_job, job_id, status="failed", error=str(e))
+    finally:
+        close_spooled(spooled)
+        _notify(job_id)
+        _job_events.pop(job_id, None)
+
+
+class ExtractionJobService:
+    @staticmethod
+    async def submit_job(db: Session, prompt: str, images: List[UploadFile], user_id: int) -> Dict[str, Any]:
+        """Create an extraction job and start processing its pages in the background"""
+        if not get_model_client():
+            raise HTTPException(
+                status_code=500,
+                detail="AI service not configured. Please set GOOGLE_API_KEY environment variable."
+            )
+
+        category_names = await run_in_threadpool(AIAssistantService.get_available_categories, db)
+
+        # Copy the uploads now - the request's files are closed once the response is sent
+        spooled, _ = await spool_images(images or [])
+        try:
+            job = DBExtractionJob(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                status="queued",
+                total_pages=max(len(spooled), 1),
+                completed_pages=0
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+        except Exception as e:
+            db.rollback()
+            close_spooled(spooled)
+            raise HTTPException(status_code=500, detail=f"Failed to create extraction job: {str(e)}")
+
+        task = asyncio.create_task(_run_job(job.id, user_id, prompt, spooled, category_names))
+        _running_jobs.add(task)
+        task.add_done_callback(_running_jobs.discard)
+
+        return _job_to_response(job)
+
+    @staticmethod
+    def get_job(db: Session, job_id: str, current_user_id: int, is_admin: bool = False) -> Dict[str, Any]:
+        """Get the state of an extraction job"""
+        try:
+            query = db.query(DBExtractionJob).filter(DBExtractionJob.id == job_id)
+            if not is_admin:
+                query = query.filter(DBExtractionJob.user_id == current_user_id)
+            job = query.first()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+        if not job:
+            raise HTTPException(status_code=404, detail="Extraction job not found")
+        return _job_to_response(job)
+
+    @staticmethod
+    async def stream_job_progress(job_id: str, current_user_id: int, is_admin: bool = False, poll_interval: float = 2.0):
+        """Yield server-sent events whenever the job's progress changes"""
+        last_state = None
+        _job_streams[job_id] = _job_streams.get(job_id, 0) + 1
+        try:
+            while True:
+                db = get_db_session()
+                try:
+                    job = await run_in_threadpool(ExtractionJobService.get_job, db, job_id, current_user_id, is_admin)
+                finally:
+                    db.close()
+
+                state = (job["status"], job["completed_pages"])
+                if state != last_state:
+                    last_state = state
+                    yield f"data: {json.dumps(job, default=str)}\n\n"
+                if job["status"] in TERMINAL_STATUSES:
+                    break
+
+                # Wake up on local progress, or poll in case another instance runs the job
+                event = _job_events.setdefault(job_id, asyncio.Event())
+                event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Finished or disconnected: don't leave the event behind for a job run elsewhere
+            _job_streams[job_id] -= 1
+            if _job_streams[job_id] == 0:
+                del _job_streams[job_id]
+                _job_events.pop(job_id, None)
@@ -0,0 +1,211 @@
+"""
+Idempotency-Key support for ledger writes.
+
+The first request with a key claims it in its own short transaction, so a
+concurrent retry sees the claim instead of running the write again. The
+write then stores its response on the claim in the same transaction as the
+ledger rows, so either both commit or neither does. A retry with the same
+key and body gets the stored response back from a single primary-key lookup;
+the same key with a different body is rejected. Client errors are stored
+too, while server errors release the key so the retry can run. Keys expire
+after IDEMPOTENCY_KEY_TTL_HOURS.
+
+A write cut off by a database outage leaves its claim unfinished. With the
+write journal on, the journal resumes it; otherwise the claim is released if
+the database still allows it, and a retry may take over a claim left
+unfinished for IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import IDEMPOTENCY_KEY_TTL_HOURS, IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS, IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS, LEDGER_JOURNAL_ENABLED
+from database.db_models import IdempotencyKey as DBIdempotencyKey
+from database.health import DatabaseUnavailableError
+from database.snapshot import SnapshotReadOnlyError, SnapshotSession
+from services.json_encoding import dumps
+
+# Keys are scoped to the route they were first used on
+LEDGER_CREATE_ROUTE = "POST /ledger/entries"
+LEDGER_BATCH_ROUTE = "POST /ledger/entries/batch"
+
+_cleanup_lock = threading.Lock()
+_last_cleanup = 0.0
+
+
+def _digest(value: Any) -> str:
+    body = json.dumps(jsonable_encoder(value), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _replay(row: DBIdempotencyKey) -> JSONResponse:
+    return JSONResponse(
+        status_code=row.status_code,
+        content=json.loads(row.response_body),
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class IdempotencyService:
+    @staticmethod
+    def _purge_expired(db: Session) -> None:
+        """Delete expired keys, at most once per cleanup interval per process"""
+        global _last_cleanup
+        with _cleanup_lock:
+            if time.monotonic() - _last_cleanup < IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS:
+                return
+            _last_cleanup = time.monotonic()
+        db.query(DBIdempotencyKey).filter(DBIdempotencyKey.expires_at <= func.now()).delete(synchronize_session=False)
+
+    @staticmethod
+    def _find(db: Session, user_id: int, key: str) -> Optional[DBIdempotencyKey]:
+        return db.query(DBIdempotencyKey).filter(
+            DBIdempotencyKey.user_id == user_id,
+            DBIdempotencyKey.key == key,
+            DBIdempotencyKey.expires_at > func.now()
+        ).first()
+
+    @staticmethod
+    def _check(row: DBIdempotencyKey, route: str, request_hash: str, resume: bool = False) -> Optional[JSONResponse]:
+        if row.route != route or row.request_hash != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if row.status_code is None:
+            if resume:
+                return None
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+        return _replay(row)
+
+    @staticmethod
+    def _take_over_stale(db: Session, row: DBIdempotencyKey, route: str, request_hash: str) -> bool:
+        """Claim an unfinished key left behind by an outage, if no journal will resume it"""
+        if LEDGER_JOURNAL_ENABLED or row.status_code is not None or row.route != route or row.request_hash != request_hash:
+            return False
+        now = datetime.now(timezone.utc)
+        # Conditional update, so only one of several concurrent retries takes it over
+        taken = db.query(DBIdempotencyKey).filter(
+            DBIdempotencyKey.user_id == row.user_id,
+            DBIdempotencyKey.key == row.key,
+            DBIdempotencyKey.status_code.is_(None),
+            DBIdempotencyKey.created_at <= now - timedelta(seconds=IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS)
+        ).update({"created_at": now}, synchronize_session=False)
+        db.commit()
+        return taken == 1
+
+    @staticmethod
+    def begin(db: Session, user_id: int, key: str, route: str, payload: Any, resume: bool = False) -> Optional[JSONResponse]:
+        """Claim a key, or return the stored response if this request was already handled
+
+        resume lets the write journal finish a request whose claim was left
+        unfinished by the outage that sent it to the journal.
+        """
+        if isinstance(db, SnapshotSession):
+            # Outage: the write journal dedupes keys until the database is back
+            raise SnapshotReadOnlyError()
+
+        request_hash = _digest(payload)
+        row = IdempotencyService._find(db, user_id, key)
+        if row is not None:
+            if not resume and IdempotencyService._take_over_stale(db, row, route, request_hash):
+                return None
+            return IdempotencyService._check(row, route, request_hash, resume)
+
+        IdempotencyService._purge_expired(db)
+        # An expired row still holds the primary key
+        db.query(DBIdempotencyKey).filter(
+            DBIdempotencyKey.user_id == user_id,
+            DBIdempotencyKey.key == key,
+            DBIdempotencyKey.expires_at <= func.now()
+        ).delete(synchronize_session=False)
+        db.add(DBIdempotencyKey(
+            user_id=user_id,
+            key=key,
+            route=route,
+            request_hash=request_hash,
+            expires_at=datetime.now(timezone.utc) + timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+        ))
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent request claimed it first
+            db.rollback()
+            row = IdempotencyService._find(db, user_id, key)
+            if row is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+            return IdempotencyService._check(row, route, request_hash)
+        return None
+
+    @staticmethod
+    def complete(db: Session, user_id: int, key: str, response: Any, status_code: int = 200) -> None:
+        """Attach the response to a claimed key; call before the write commits so both land together"""
+        body = dumps(response).decode("utf-8")
+        db.query(DBIdempotencyKey).filter(
+            DBIdempotencyKey.user_id == user_id,
+            DBIdempotencyKey.key == key
+        ).update({
+            "status_code": status_code,
+            "response_body": body,
+            "response_digest": hashlib.sha256(body.encode("utf-8")).hexdigest(),
+        }, synchronize_session=False)
+
+    @staticmethod
+    def _release(db: Session, user_id: int, key: str) -> None:
+        """Drop an unfinished claim so a retry can run; best effort during an outage"""
+        try:
+            db.rollback()
+            db.query(DBIdempotencyKey).filter(
+                DBIdempotencyKey.user_id == user_id,
+                DBIdempotencyKey.key == key,
+                DBIdempotencyKey.status_code.is_(None)
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            # Left for a retry to take over once it is stale
+            db.rollback()
+            print(f"⚠️ Could not release Idempotency-Key claim: {e}")
+
+    @staticmethod
+    def fail(db: Session, user_id: int, key: str, error: HTTPException) -> None:
+        """Store a client error for replay, or release the key after a server error"""
+        try:
+            db.rollback()
+            if error.status_code < 500:
+                IdempotencyService.complete(db, user_id, key, {"detail": error.detail, "error_type": "http_exception"}, error.status_code)
+            else:
+                db.query(DBIdempotencyKey).filter(
+                    DBIdempotencyKey.user_id == user_id,
+                    DBIdempotencyKey.key == key
+                ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            # The claim expires on its own; the original error matters more
+            db.rollback()
+            print(f"⚠️ Could not record Idempotency-Key outcome: {e}")
+
+    @staticmethod
+    def run(db: Session, user_id: int, key: Optional[str], route: str, payload: Any, write: Callable[[], Any], resume: bool = False) -> Any:
+        """Run write at most once per key; write must call complete() before it commits"""
+        if not key:
+            return write()
+        replay = IdempotencyService.begin(db, user_id, key, route, payload, resume)
+        if replay is not None:
+            return replay
+        try:
+            return write()
+        except DatabaseUnavailableError:
+            # With the journal on, the caller journals it and replay resumes this claim
+            if not LEDGER_JOURNAL_ENABLED:
+                IdempotencyService._release(db, user_id, key)
+            raise
+        except HTTPException as e:
+            IdempotencyService.fail(db, user_id, key, e)
+            raise
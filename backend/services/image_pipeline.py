@@ -0,0 +1,153 @@
+"""
+Off-loop image preprocessing for AI assistant uploads.
+
+Uploads are spooled to temporary files in chunks (enforcing the size limit as
+bytes arrive), then decoded and downscaled in a worker pool. JPEGs use PIL's
+draft mode so the decoder produces a reduced-scale image directly instead of
+decoding the full 12 MP frame, and thumbnail() finishes the resize.
+"""
+import asyncio
+import hashlib
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+from config import AI_MAX_IMAGE_BYTES, AI_MAX_IMAGES, AI_IMAGE_MAX_DIMENSION, AI_IMAGE_WORKERS
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+SPOOL_MEMORY_LIMIT = 1024 * 1024  # Roll over to disk beyond 1MB
+
+# PIL releases the GIL while decoding and resampling, so threads parallelize well
+# without having to pickle decoded images back from a process pool
+_executor = ThreadPoolExecutor(max_workers=AI_IMAGE_WORKERS, thread_name_prefix="ai-image")
+
+
+class SpooledImage:
+    def __init__(self, filename: str, content_type: str, file: BinaryIO, size: int, digest: str):
+        self.filename = filename
+        self.content_type = content_type
+        self.file = file
+        self.size = size
+        self.digest = digest
+
+
+async def spool_upload(upload: UploadFile, max_bytes: int = AI_MAX_IMAGE_BYTES) -> SpooledImage:
+    """Copy an upload to a temporary file in chunks, rejecting it once it exceeds max_bytes"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT)
+    hasher = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            spooled.close()
+            raise HTTPException(
+                status_code=413,
+                detail=f"Image '{upload.filename}' exceeds the {max_bytes // (1024 * 1024)}MB upload limit"
+            )
+        spooled.write(chunk)
+        hasher.update(chunk)
+    spooled.seek(0)
+    return SpooledImage(upload.filename, upload.content_type, spooled, size, hasher.hexdigest())
+
+
+def decode_image(file: BinaryIO, max_dimension: int = AI_IMAGE_MAX_DIMENSION) -> Tuple["Image.Image", Dict[str, Any]]:
+    """Decode and downscale an image, avoiding a full-resolution decode where possible"""
+    # Imported on first use so PIL stays out of worker cold starts
+    from PIL import Image
+
+    started = time.perf_counter()
+    image = Image.open(file)
+    source_size = image.size
+
+    # For JPEGs, let the decoder scale by 1/2, 1/4 or 1/8 while decoding
+    if image.format == "JPEG":
+        image.draft("RGB", (max_dimension, max_dimension))
+
+    # Convert to RGB if necessary
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    # Resize if too large (Gemini has size limits)
+    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    image.load()
+
+    return image, {
+        "source_size": list(source_size),
+        "output_size": list(image.size),
+        "decode_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+async def spool_images(uploads: List[UploadFile]) -> Tuple[List[SpooledImage], Dict[str, Any]]:
+    """Spool the image uploads of a request, enforcing count and size limits"""
+    image_uploads = [u for u in uploads if u.content_type and u.content_type.startswith("image/")]
+    if len(image_uploads) > AI_MAX_IMAGES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many images: {len(image_uploads)} (maximum {AI_MAX_IMAGES})"
+        )
+
+    timings: Dict[str, Any] = {"images": len(image_uploads)}
+    started = time.perf_counter()
+    spooled: List[SpooledImage] = []
+    try:
+        for upload in image_uploads:
+            spooled.append(await spool_upload(upload))
+    except Exception:
+        close_spooled(spooled)
+        raise
+    timings["spool_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    timings["bytes"] = sum(item.size for item in spooled)
+    return spooled, timings
+
+
+async def decode_images(spooled: List[SpooledImage]) -> Tuple[List["Image.Image"], Dict[str, Any]]:
+    """Decode and resize spooled images in parallel in the worker pool"""
+    if not spooled:
+        return [], {}
+
+    from PIL import Image
+
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        results = await asyncio.gather(*[
+            loop.run_in_executor(_executor, decode_image, item.file)
+            for item in spooled
+        ])
+    except (OSError, Image.DecompressionBombError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read image: {str(e)}")
+
+    timings = {
+        "decode_ms": round((time.perf_counter() - started) * 1000, 2),
+        "per_image": [
+            {"filename": item.filename, "bytes": item.size, **stats}
+            for item, (_, stats) in zip(spooled, results)
+        ],
+    }
+    return [image for image, _ in results], timings
+
+
+def close_spooled(spooled: List[SpooledImage]) -> None:
+    for item in spooled:
+        item.file.close()
+
+
+async def preprocess_images(uploads: List[UploadFile]) -> Tuple[List["Image.Image"], Dict[str, Any]]:
+    """Spool, decode and resize uploaded images in parallel, returning per-stage timings"""
+    spooled, timings = await spool_images(uploads)
+    try:
+        images, decode_timings = await decode_images(spooled)
+    finally:
+        close_spooled(spooled)
+    timings.update(decode_timings)
+    return images, timings
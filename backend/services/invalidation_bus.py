@@ -0,0 +1,215 @@
+"""
+Cross-worker cache invalidation over Postgres LISTEN/NOTIFY.
+
+Services call publish() inside the transaction that changes cached data.
+The NOTIFY is queued in that transaction, so Postgres delivers it to every
+listening worker only if the write commits; the local caches are evicted
+after commit. Each worker runs one background listener on a connection taken
+from the shared engine and evicts the keys named in incoming messages.
+
+Messages sent while a listener is disconnected are lost, so after any
+reconnect the listener flushes every cache before resuming.
+"""
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from config import CACHE_BUS_ENABLED, CACHE_BUS_CHANNEL, CACHE_BUS_HEARTBEAT_SECONDS, CACHE_BUS_RECONNECT_MAX_SECONDS
+
+# Identifies this worker so it can skip its own messages (it evicts on commit)
+ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_handlers: Dict[str, List[Callable[[Optional[Any]], None]]] = {}
+_handlers_lock = threading.Lock()
+
+_PENDING = "pending_invalidations"
+
+
+def subscribe(group: str, handler: Callable[[Optional[Any]], None]) -> None:
+    """Register an eviction handler; it gets the published key, or None to drop the whole group"""
+    with _handlers_lock:
+        _handlers.setdefault(group, []).append(handler)
+
+
+def evict(group: str, key: Optional[Any] = None) -> None:
+    """Run the local handlers for one group"""
+    with _handlers_lock:
+        handlers = list(_handlers.get(group, []))
+    for handler in handlers:
+        try:
+            handler(key)
+        except Exception as e:
+            print(f"⚠️ Cache eviction for {group} failed: {e}")
+
+
+def flush_all() -> None:
+    """Evict everything, used when messages may have been missed"""
+    with _handlers_lock:
+        groups = list(_handlers)
+    for group in groups:
+        evict(group)
+
+
+def publish(db: Session, group: str, key: Optional[Any] = None) -> None:
+    """Invalidate a cache group (or one key in it) everywhere once this transaction commits"""
+    if CACHE_BUS_ENABLED and db.get_bind().dialect.name == "postgresql":
+        payload = json.dumps({"origin": ORIGIN, "group": group, "key": key})
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CACHE_BUS_CHANNEL, "payload": payload})
+    db.info.setdefault(_PENDING, []).append((group, key))
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed(session: Session) -> None:
+    for group, key in session.info.pop(_PENDING, []):
+        evict(group, key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+class InvalidationListener:
+    """Background thread holding a LISTEN connection, reconnecting with backoff"""
+
+    def __init__(self, engine, channel: str = CACHE_BUS_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.connected = False
+        self.received = 0
+        self.reconnects = 0
+        self.flushes = 0
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _connect(self):
+        # Detached from the pool: the listener must not hold one of the request slots
+        connection = self.engine.raw_connection()
+        connection.detach()
+        driver_connection = connection.driver_connection
+        driver_connection.autocommit = True
+        with driver_connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection, driver_connection
+
+    def _run(self) -> None:
+        backoff = 1.0
+        attempts = 0
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection, driver_connection = self._connect()
+                self.connected = True
+                backoff = 1.0
+                # Anything published before LISTEN took effect was missed, including
+                # writes that landed while this worker was starting up
+                self.flushes += 1
+                flush_all()
+                if attempts:
+                    self.reconnects += 1
+                    print("🔄 Cache invalidation listener reconnected, flushed local caches")
+                attempts += 1
+                self._listen(driver_connection)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {str(e)}"[:200]
+                if self.connected:
+                    print(f"⚠️ Cache invalidation listener disconnected: {self.last_error}")
+                attempts += 1
+            finally:
+                self.connected = False
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, CACHE_BUS_RECONNECT_MAX_SECONDS)
+
+    def _listen(self, driver_connection) -> None:
+        last_heartbeat = time.monotonic()
+        while not self._stop.is_set():
+            readable, _, _ = select.select([driver_connection], [], [], 1.0)
+            if readable:
+                driver_connection.poll()
+                while driver_connection.notifies:
+                    self._handle(driver_connection.notifies.pop(0).payload)
+            if time.monotonic() - last_heartbeat >= CACHE_BUS_HEARTBEAT_SECONDS:
+                # A dead socket is not always readable; a round trip surfaces it
+                with driver_connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                last_heartbeat = time.monotonic()
+
+    def _handle(self, payload: str) -> None:
+        self.received += 1
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            self.flushes += 1
+            flush_all()
+            return
+        if message.get("origin") == ORIGIN:
+            return
+        evict(message.get("group"), message.get("key"))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with _handlers_lock:
+            groups = sorted(_handlers)
+        return {
+            "enabled": CACHE_BUS_ENABLED,
+            "channel": self.channel,
+            "origin": ORIGIN,
+            "connected": self.connected,
+            "received": self.received,
+            "reconnects": self.reconnects,
+            "flushes": self.flushes,
+            "last_error": self.last_error,
+            "groups": groups,
+        }
+
+
+_listener: Optional[InvalidationListener] = None
+
+
+def start_listener(engine) -> Optional[InvalidationListener]:
+    """Start this worker's listener (Postgres only)"""
+    global _listener
+    if not CACHE_BUS_ENABLED or engine.dialect.name != "postgresql":
+        return None
+    if _listener is None:
+        _listener = InvalidationListener(engine)
+        _listener.start()
+        print(f"📡 Cache invalidation listener started on channel '{CACHE_BUS_CHANNEL}'")
+    return _listener
+
+
+def stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_bus_stats() -> Dict[str, Any]:
+    if _listener is None:
+        return {"enabled": CACHE_BUS_ENABLED, "connected": False, "origin": ORIGIN}
+    return _listener.get_stats()
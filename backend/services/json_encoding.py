@@ -0,0 +1,39 @@
+"""
+Fast JSON encoding for API responses.
+
+orjson encodes the ledger, credit-card and user payload shapes - dicts of
+str, int, float, None and datetime, nested one level for the owning user -
+natively in C, producing the same JSON as jsonable_encoder followed by
+json.dumps (datetimes as ISO 8601, compact separators). Hot read paths call
+dumps() on their rows directly and skip jsonable_encoder's per-value Python
+walk; anything orjson doesn't know (pydantic models, Decimal, sets) falls back
+to jsonable_encoder for just that value.
+
+FastJSONResponse is the app's default response class, so every other route
+gets orjson rendering too (FastAPI still runs jsonable_encoder on values a
+route returns).
+"""
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Summary and grouping payloads can be keyed by year or id
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    return jsonable_encoder(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Encode a response payload to JSON bytes"""
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,217 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import BigInteger, cast, func, select
+from typing import List, Optional, Dict, Any
+from database.db_models import LedgerEntry as DBLedgerEntry, MerchantCategory as DBMerchantCategory, SpendingCategory as DBSpendingCategory, CreditCard as DBCreditCard, from_cents
+from fastapi import HTTPException
+from services.ledger_archive_service import LedgerArchiveService
+
+# Upper bound on rows returned by any aggregate, so answers stay compact
+MAX_ROWS = 50
+
+
+def _row_limit(limit: int) -> int:
+    # The chatbot tools pass model-chosen limits, so clamp rather than trust them
+    return max(1, min(limit, MAX_ROWS))
+
+
+def _sum_cents():
+    # SUM of an integer column is NUMERIC in PostgreSQL and comes back from psycopg2
+    # as a Decimal; cast it so from_cents returns a float the API and tools can encode
+    return cast(func.sum(DBLedgerEntry.amount_cents), BigInteger)
+
+
+def _filtered(query, user_id: int, year: Optional[int] = None, month: Optional[int] = None,
+              category: Optional[str] = None, credit_card: Optional[str] = None):
+    # Every aggregate is scoped to one user, served by ix_ledger_entries_user_period.
+    # Totals are summed as integer cents and converted to dollars only on the way out.
+    query = query.filter(DBLedgerEntry.user_id == user_id)
+    if year is not None:
+        query = query.filter(DBLedgerEntry.year == year)
+    if month is not None:
+        query = query.filter(DBLedgerEntry.month == month)
+    if category is not None:
+        query = query.filter(DBLedgerEntry.category_id.in_(
+            select(DBSpendingCategory.id).where(DBSpendingCategory.category_name == category)
+        ))
+    if credit_card is not None:
+        query = query.filter(DBLedgerEntry.credit_card_id.in_(
+            select(DBCreditCard.id).where(DBCreditCard.name == credit_card)
+        ))
+    return query
+
+
+def _merge_archived(hot: Dict[tuple, tuple], archived: Dict[tuple, tuple]) -> Dict[tuple, tuple]:
+    """Add archived (cents, entries) totals into the hot ones, per group key"""
+    merged = dict(hot)
+    for key, (cents, entries) in archived.items():
+        hot_cents, hot_entries = merged.get(key, (0, 0))
+        merged[key] = (hot_cents + cents, hot_entries + entries)
+    return merged
+
+
+class LedgerAggregateService:
+    @staticmethod
+    def get_monthly_totals(db: Session, user_id: int, year: Optional[int] = None, category: Optional[str] = None,
+                           credit_card: Optional[str] = None, limit: int = 12) -> List[Dict[str, Any]]:
+        """Get total spend per month, most recent first"""
+        try:
+            months = _filtered(
+                db.query(
+                    DBLedgerEntry.year,
+                    DBLedgerEntry.month,
+                    _sum_cents().label("total"),
+                    func.count(DBLedgerEntry.id).label("entries")
+                ),
+                user_id, year=year, category=category, credit_card=credit_card
+            ).group_by(DBLedgerEntry.year, DBLedgerEntry.month)
+
+            archived_years = LedgerArchiveService.removed_years(db, year)
+            if archived_years:
+                totals = _merge_archived(
+                    {(row.year, row.month): (row.total or 0, row.entries) for row in months.all()},
+                    LedgerArchiveService.get_totals(db, archived_years, user_id, ("year", "month"), category=category, credit_card=credit_card)
+                )
+                return [
+                    {"year": row_year, "month": row_month, "total": from_cents(cents), "entries": entries}
+                    for (row_year, row_month), (cents, entries) in sorted(totals.items(), reverse=True)[:_row_limit(limit)]
+                ]
+
+            rows = months.order_by(
+                DBLedgerEntry.year.desc(), DBLedgerEntry.month.desc()
+            ).limit(_row_limit(limit)).all()
+
+            return [
+                {"year": row.year, "month": row.month, "total": from_cents(row.total or 0), "entries": row.entries}
+                for row in rows
+            ]
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    @staticmethod
+    def get_category_totals(db: Session, user_id: int, year: Optional[int] = None, month: Optional[int] = None,
+                            credit_card: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get total spend per category, largest first"""
+        try:
+            # Aggregate on the narrow id column, then join the few resulting rows to names
+            total = _sum_cents().label("total")
+            grouped = _filtered(
+                db.query(DBLedgerEntry.category_id, total, func.count(DBLedgerEntry.id).label("entries")),
+                user_id, year=year, month=month, credit_card=credit_card
+            ).group_by(DBLedgerEntry.category_id)
+
+            archived_years = LedgerArchiveService.removed_years(db, year)
+            if archived_years:
+                merged = _merge_archived(
+                    {(row.category_id,): (row.total or 0, row.entries) for row in grouped.all()},
+                    LedgerArchiveService.get_totals(db, archived_years, user_id, ("category_id",), month=month, credit_card=credit_card)
+                )
+                top = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)[:_row_limit(limit)]
+                names = dict(db.query(DBSpendingCategory.id, DBSpendingCategory.category_name).filter(
+                    DBSpendingCategory.id.in_([category_id for (category_id,), _ in top])
+                ).all())
+                return [
+                    {"category": names.get(category_id), "total": from_cents(cents), "entries": entries}
+                    for (category_id,), (cents, entries) in top
+                ]
+
+            totals = grouped.subquery()
+            rows = db.query(DBSpendingCategory.category_name, totals.c.total, totals.c.entries).join(
+                totals, totals.c.category_id == DBSpendingCategory.id
+            ).order_by(totals.c.total.desc()).limit(_row_limit(limit)).all()
+
+            return [
+                {"category": row.category_name, "total": from_cents(row.total or 0), "entries": row.entries}
+                for row in rows
+            ]
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    @staticmethod
+    def get_card_totals(db: Session, user_id: int, year: Optional[int] = None, month: Optional[int] = None,
+                        category: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get total spend per credit card, largest first"""
+        try:
+            total = _sum_cents().label("total")
+            grouped = _filtered(
+                db.query(DBLedgerEntry.credit_card_id, total, func.count(DBLedgerEntry.id).label("entries")),
+                user_id, year=year, month=month, category=category
+            ).group_by(DBLedgerEntry.credit_card_id)
+
+            archived_years = LedgerArchiveService.removed_years(db, year)
+            if archived_years:
+                merged = _merge_archived(
+                    {(row.credit_card_id,): (row.total or 0, row.entries) for row in grouped.all()},
+                    LedgerArchiveService.get_totals(db, archived_years, user_id, ("credit_card_id",), month=month, category=category)
+                )
+                top = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)[:_row_limit(limit)]
+                names = dict(db.query(DBCreditCard.id, DBCreditCard.name).filter(
+                    DBCreditCard.id.in_([card_id for (card_id,), _ in top])
+                ).all())
+                return [
+                    {"credit_card": names.get(card_id), "total": from_cents(cents), "entries": entries}
+                    for (card_id,), (cents, entries) in top
+                ]
+
+            totals = grouped.subquery()
+            rows = db.query(DBCreditCard.name, totals.c.total, totals.c.entries).join(
+                totals, totals.c.credit_card_id == DBCreditCard.id
+            ).order_by(totals.c.total.desc()).limit(_row_limit(limit)).all()
+
+            return [
+                {"credit_card": row.name, "total": from_cents(row.total or 0), "entries": row.entries}
+                for row in rows
+            ]
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    @staticmethod
+    def get_total(db: Session, user_id: int, year: Optional[int] = None, month: Optional[int] = None,
+                  category: Optional[str] = None, credit_card: Optional[str] = None) -> Dict[str, Any]:
+        """Get the total spend matching the filters"""
+        try:
+            row = _filtered(
+                db.query(_sum_cents().label("total"), func.count(DBLedgerEntry.id).label("entries")),
+                user_id, year=year, month=month, category=category, credit_card=credit_card
+            ).one()
+            cents, entries = row.total or 0, row.entries
+
+            archived_years = LedgerArchiveService.removed_years(db, year)
+            if archived_years:
+                cents, entries = _merge_archived(
+                    {(): (cents, entries)},
+                    LedgerArchiveService.get_totals(db, archived_years, user_id, (), month=month, category=category, credit_card=credit_card)
+                )[()]
+
+            return {"total": from_cents(cents), "entries": entries}
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    @staticmethod
+    def get_top_merchants(db: Session, user_id: int, category: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the user's most frequently confirmed merchants
+
+        Ledger entries are monthly per-category totals without merchants, so
+        this ranks the learned merchant rules by how often they were accepted.
+        """
+        try:
+            query = db.query(DBMerchantCategory.merchant, DBMerchantCategory.hit_count, DBSpendingCategory.category_name).join(
+                DBSpendingCategory, DBMerchantCategory.category_id == DBSpendingCategory.id
+            ).filter(DBMerchantCategory.user_id == user_id)
+            if category is not None:
+                query = query.filter(DBSpendingCategory.category_name == category)
+            rows = query.order_by(DBMerchantCategory.hit_count.desc()).limit(_row_limit(limit)).all()
+
+            return [
+                {"merchant": row.merchant, "category": row.category_name, "times_confirmed": row.hit_count}
+                for row in rows
+            ]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
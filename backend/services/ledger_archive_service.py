@@ -0,0 +1,398 @@
+"""
+Cold archive of closed ledger years in Parquet files.
+
+An admin archives a closed year (at least LEDGER_ARCHIVE_MIN_AGE_YEARS before
+the current one): its ledger_entries rows are exported to a compressed
+Parquet file under LEDGER_ARCHIVE_DIR, written next to the final path,
+fsynced and swapped in, then checked against the table by row count and
+cent total. Archived years are read-only from then on. Optionally the rows
+are then deleted from ledger_entries, so the hot table and its indexes only
+cover active years. That leaves the file as the only copy of the year, so it
+is only allowed when LEDGER_ARCHIVE_DIR is explicitly set to storage every
+instance shares (a mounted bucket or network volume), never the local temp
+directory, and only after the file has been read back and verified.
+
+Years removed from the hot table are read back transparently: the ledger
+listing (JSON, Arrow, msgpack) appends their rows and the summaries add
+their totals, with names resolved against the current users, cards and
+categories, so cards and categories they use cannot be deleted. Deleting an
+archive puts removed rows back and reopens the year.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from config import (
+    COLUMNAR_BATCH_ROWS, LEDGER_ARCHIVE_COMPRESSION, LEDGER_ARCHIVE_DIR, LEDGER_ARCHIVE_DIR_CONFIGURED,
+    LEDGER_ARCHIVE_MIN_AGE_YEARS,
+)
+from database.db_models import (
+    CreditCard as DBCreditCard, LedgerArchive as DBLedgerArchive, LedgerEntry as DBLedgerEntry,
+    SpendingCategory as DBSpendingCategory, User as DBUser,
+)
+from services import invalidation_bus
+from services.change_feed import LEDGER_CHANGES
+from services.reference_cache import reference_cache, LEDGER_ARCHIVES
+
+# ledger_entries columns kept in the files, in order
+ARCHIVE_COLUMNS = [
+    ("id", "int64"),
+    ("user_id", "int64"),
+    ("year", "int32"),
+    ("month", "int32"),
+    ("category_id", "int64"),
+    ("amount_cents", "int64"),
+    ("credit_card_id", "int64"),
+    ("notes", "string"),
+    ("created_at", "timestamp"),
+    ("updated_at", "timestamp"),
+]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+        return pyarrow
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Ledger archives are not available on this server (pyarrow is not installed)")
+
+
+def _archive_schema(pa):
+    from services.columnar_encoding import arrow_schema
+    return arrow_schema(pa, ARCHIVE_COLUMNS)
+
+
+def _load_archives(db: Session) -> Dict[int, bool]:
+    return {row.year: row.removed_from_hot for row in db.query(DBLedgerArchive.year, DBLedgerArchive.removed_from_hot).all()}
+
+
+def _file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as archive:
+        for block in iter(lambda: archive.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _durable_archive_dir() -> bool:
+    """Whether LEDGER_ARCHIVE_DIR was set explicitly and is not instance-local temp storage"""
+    temp_dir = os.path.realpath(tempfile.gettempdir())
+    archive_dir = os.path.realpath(LEDGER_ARCHIVE_DIR)
+    return LEDGER_ARCHIVE_DIR_CONFIGURED and os.path.commonpath([archive_dir, temp_dir]) != temp_dir
+
+
+def _verify_file(pa, year: int, path: str, rows: int, total_cents: int) -> None:
+    """Read the whole file back and check it against the expected row count and cent total"""
+    try:
+        table = pa.parquet.read_table(path, schema=_archive_schema(pa))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Archive for ledger year {year} is unreadable: {str(e)}")
+    file_cents = pa.compute.sum(table["amount_cents"]).as_py() or 0
+    if (table.num_rows, file_cents) != (rows, total_cents):
+        raise HTTPException(status_code=500, detail=f"Archive for ledger year {year} failed verification")
+
+
+def _lookup(pa, table_ids, ids: List[int], values: List[Any], value_type):
+    """Map an id column to values through a small id -> value table"""
+    indices = pa.compute.index_in(table_ids, value_set=pa.array(ids, pa.int64()))
+    return pa.array(values, value_type).take(indices)
+
+
+class LedgerArchiveService:
+    @staticmethod
+    def get_archived_years(db: Session) -> Dict[int, bool]:
+        """Archived years, mapped to whether their rows were removed from the hot table"""
+        return reference_cache.get(LEDGER_ARCHIVES, "all", lambda: _load_archives(db)).value
+
+    @staticmethod
+    def removed_years(db: Session, year: Optional[int] = None) -> List[int]:
+        """Years that must be read from archive files, narrowed to one year if given"""
+        years = sorted(archived_year for archived_year, removed in LedgerArchiveService.get_archived_years(db).items() if removed)
+        return [archived_year for archived_year in years if year is None or archived_year == year]
+
+    @staticmethod
+    def ensure_writable(db: Session, *years: int) -> None:
+        """Reject writes to archived years"""
+        archived = LedgerArchiveService.get_archived_years(db)
+        for year in years:
+            if year in archived:
+                raise HTTPException(status_code=409, detail=f"Ledger year {year} is archived and read-only")
+
+    @staticmethod
+    def _read(db: Session, years: Sequence[int], user_id: Optional[int] = None, month: Optional[int] = None,
+              category: Optional[str] = None, credit_card: Optional[str] = None):
+        """Archived rows of the given years as one Arrow table, filtered like the hot queries"""
+        pa = _pyarrow()
+        filters = []
+        if user_id is not None:
+            filters.append(("user_id", "=", user_id))
+        if month is not None:
+            filters.append(("month", "=", month))
+        if category is not None:
+            category_ids = [row.id for row in db.query(DBSpendingCategory.id).filter(DBSpendingCategory.category_name == category)]
+            filters.append(("category_id", "in", category_ids or [-1]))
+        if credit_card is not None:
+            card_ids = [row.id for row in db.query(DBCreditCard.id).filter(DBCreditCard.name == credit_card)]
+            filters.append(("credit_card_id", "in", card_ids or [-1]))
+
+        paths = dict(db.query(DBLedgerArchive.year, DBLedgerArchive.file_path).filter(DBLedgerArchive.year.in_(years)).all())
+        tables = []
+        for year in years:
+            try:
+                tables.append(pa.parquet.read_table(paths[year], filters=filters or None, schema=_archive_schema(pa)))
+            except (KeyError, OSError) as e:
+                raise HTTPException(status_code=500, detail=f"Archive for ledger year {year} is unreadable: {str(e)}")
+        if not tables:
+            return _archive_schema(pa).empty_table()
+        return pa.concat_tables(tables)
+
+    @staticmethod
+    def count_references(db: Session, column: str, value: int) -> int:
+        """Archived rows, in years removed from the hot table, whose column (category_id, credit_card_id) is value"""
+        years = LedgerArchiveService.removed_years(db)
+        if not years:
+            return 0
+        pa = _pyarrow()
+        paths = dict(db.query(DBLedgerArchive.year, DBLedgerArchive.file_path).filter(DBLedgerArchive.year.in_(years)).all())
+        count = 0
+        for year in years:
+            try:
+                count += pa.parquet.read_table(paths[year], columns=[column], filters=[(column, "=", value)], schema=_archive_schema(pa)).num_rows
+            except (KeyError, OSError) as e:
+                raise HTTPException(status_code=500, detail=f"Archive for ledger year {year} is unreadable: {str(e)}")
+        return count
+
+    @staticmethod
+    def get_totals(db: Session, years: Sequence[int], user_id: int, keys: Tuple[str, ...], month: Optional[int] = None,
+                   category: Optional[str] = None, credit_card: Optional[str] = None) -> Dict[Tuple, Tuple[int, int]]:
+        """Cent totals and entry counts of archived rows, grouped by keys (archive column names)"""
+        pa = _pyarrow()
+        table = LedgerArchiveService._read(db, years, user_id, month, category, credit_card)
+        if table.num_rows == 0:
+            return {}
+        if not keys:
+            return {(): (pa.compute.sum(table["amount_cents"]).as_py(), table.num_rows)}
+        grouped = table.group_by(list(keys)).aggregate([("amount_cents", "sum"), ("id", "count")])
+        columns = [grouped[key].to_pylist() for key in keys]
+        return {
+            tuple(values[:-2]): (values[-2], values[-1])
+            for values in zip(*columns, grouped["amount_cents_sum"].to_pylist(), grouped["id_count"].to_pylist())
+        }
+
+    @staticmethod
+    def _resolved(db: Session, current_user_id: int, is_admin: bool):
+        """Archived rows of removed years with user, category and card names joined in, or None"""
+        years = LedgerArchiveService.removed_years(db)
+        if not years:
+            return None
+        pa = _pyarrow()
+        table = LedgerArchiveService._read(db, years, None if is_admin else current_user_id)
+        if table.num_rows == 0:
+            return None
+
+        user_ids = pa.compute.unique(table["user_id"]).to_pylist()
+        category_ids = pa.compute.unique(table["category_id"]).to_pylist()
+        card_ids = pa.compute.unique(table["credit_card_id"]).to_pylist()
+        users = db.query(DBUser.id, DBUser.name, DBUser.email).filter(DBUser.id.in_(user_ids)).all()
+        categories = db.query(DBSpendingCategory.id, DBSpendingCategory.category_name).filter(DBSpendingCategory.id.in_(category_ids)).all()
+        cards = db.query(DBCreditCard.id, DBCreditCard.name).filter(DBCreditCard.id.in_(card_ids)).all()
+
+        return pa.table({
+            "id": table["id"],
+            "user_id": table["user_id"],
+            "user_name": _lookup(pa, table["user_id"], [user.id for user in users], [user.name for user in users], pa.string()),
+            "user_email": _lookup(pa, table["user_id"], [user.id for user in users], [user.email for user in users], pa.string()),
+            "year": table["year"],
+            "month": table["month"],
+            "category": _lookup(pa, table["category_id"], [row.id for row in categories], [row.category_name for row in categories], pa.string()),
+            "amount": pa.compute.divide(table["amount_cents"].cast(pa.float64()), 100.0),
+            "credit_card": _lookup(pa, table["credit_card_id"], [row.id for row in cards], [row.name for row in cards], pa.string()),
+            "notes": table["notes"],
+            "created_at": table["created_at"],
+            "updated_at": table["updated_at"],
+        })
+
+    @staticmethod
+    def get_entries(db: Session, current_user_id: int, is_admin: bool = False) -> List[Dict[str, Any]]:
+        """Archived entries of removed years in the ledger listing's response shape"""
+        table = LedgerArchiveService._resolved(db, current_user_id, is_admin)
+        if table is None:
+            return []
+        return [{
+            "id": row["id"],
+            "user_id": row["user_id"],
+            "year": row["year"],
+            "month": row["month"],
+            "category": row["category"],
+            "amount": row["amount"],
+            "credit_card": row["credit_card"],
+            "notes": row["notes"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "user": {"id": row["user_id"], "name": row["user_name"], "email": row["user_email"]} if row["user_name"] is not None else None,
+        } for row in table.to_pylist()]
+
+    @staticmethod
+    def iter_entry_batches(db: Session, current_user_id: int, is_admin: bool = False, batch_rows: int = COLUMNAR_BATCH_ROWS) -> Iterator[Any]:
+        """Archived entries of removed years as Arrow record batches in LEDGER_ENTRY_COLUMNS order"""
+        table = LedgerArchiveService._resolved(db, current_user_id, is_admin)
+        if table is not None:
+            yield from table.to_batches(max_chunksize=batch_rows)
+
+    @staticmethod
+    def list_archives(db: Session) -> Dict[str, Any]:
+        """Archived years and the size of the hot table"""
+        hot = db.query(func.count(DBLedgerEntry.id), func.min(DBLedgerEntry.year), func.max(DBLedgerEntry.year)).one()
+        archives = db.query(DBLedgerArchive).order_by(DBLedgerArchive.year).all()
+        return {
+            "directory": LEDGER_ARCHIVE_DIR,
+            "durable": _durable_archive_dir(),
+            "closed_through": datetime.now(timezone.utc).year - LEDGER_ARCHIVE_MIN_AGE_YEARS,
+            "hot": {"entries": hot[0], "first_year": hot[1], "last_year": hot[2]},
+            "archives": [{
+                "year": archive.year,
+                "file_path": archive.file_path,
+                "file_bytes": os.path.getsize(archive.file_path) if os.path.exists(archive.file_path) else None,
+                "row_count": archive.row_count,
+                "total": archive.total_cents / 100,
+                "checksum": archive.checksum,
+                "removed_from_hot": archive.removed_from_hot,
+                "archived_at": archive.archived_at,
+                "removed_at": archive.removed_at,
+            } for archive in archives],
+        }
+
+    @staticmethod
+    def _export(db: Session, year: int, path: str) -> Tuple[int, int]:
+        """Write the year's hot rows to path; returns (rows, cent total)"""
+        pa = _pyarrow()
+        schema = _archive_schema(pa)
+        columns = [getattr(DBLedgerEntry, name) for name, _ in ARCHIVE_COLUMNS]
+        # Sorted so per-user reads skip whole row groups
+        query = select(*columns).where(DBLedgerEntry.year == year).order_by(
+            DBLedgerEntry.user_id, DBLedgerEntry.month, DBLedgerEntry.id
+        ).execution_options(yield_per=COLUMNAR_BATCH_ROWS)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        rows = total_cents = 0
+        try:
+            with pa.parquet.ParquetWriter(temporary_path, schema, compression=LEDGER_ARCHIVE_COMPRESSION) as writer:
+                for partition in db.execute(query).partitions():
+                    values = list(zip(*partition))
+                    writer.write_batch(pa.record_batch(
+                        [pa.array(column, field.type) for column, field in zip(values, schema)], schema=schema
+                    ))
+                    rows += len(partition)
+                    total_cents += sum(values[5])
+            with open(temporary_path, "rb") as archive:
+                os.fsync(archive.fileno())
+            if pa.parquet.read_metadata(temporary_path).num_rows != rows:
+                raise HTTPException(status_code=500, detail=f"Archive for ledger year {year} failed verification")
+            os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return rows, total_cents
+
+    @staticmethod
+    def archive_year(db: Session, year: int, remove_from_hot: bool = False) -> Dict[str, Any]:
+        """Export a closed year to Parquet, optionally removing its rows from ledger_entries"""
+        pa = _pyarrow()
+        closed_through = datetime.now(timezone.utc).year - LEDGER_ARCHIVE_MIN_AGE_YEARS
+        if year > closed_through:
+            raise HTTPException(status_code=400, detail=f"Only years up to {closed_through} are closed and can be archived")
+        if remove_from_hot and not _durable_archive_dir():
+            # Other instances could not read the file, and it would vanish with this one
+            raise HTTPException(
+                status_code=400,
+                detail="Removing rows from the hot table needs LEDGER_ARCHIVE_DIR set to storage shared by every instance"
+            )
+
+        archive = db.get(DBLedgerArchive, year)
+        if archive is not None and archive.removed_from_hot:
+            raise HTTPException(status_code=409, detail=f"Ledger year {year} is already archived and removed from the hot table")
+        created = archive is None
+        path = os.path.join(LEDGER_ARCHIVE_DIR, f"ledger_{year}.parquet")
+        if created:
+            # Close the year to writes before exporting, so the file and the table can't drift apart
+            archive = DBLedgerArchive(year=year, file_path=path, row_count=0, total_cents=0, removed_from_hot=False)
+            db.add(archive)
+            invalidation_bus.publish(db, LEDGER_ARCHIVES)
+            db.commit()
+
+        try:
+            rows, total_cents = LedgerArchiveService._export(db, year, path)
+            if rows == 0:
+                raise HTTPException(status_code=404, detail=f"No ledger entries for {year}")
+            # A write that slipped in before the year was closed shows up here
+            hot_rows, hot_cents = db.query(func.count(DBLedgerEntry.id), func.coalesce(func.sum(DBLedgerEntry.amount_cents), 0)).filter(
+                DBLedgerEntry.year == year
+            ).one()
+            if (hot_rows, hot_cents) != (rows, total_cents):
+                raise HTTPException(status_code=409, detail=f"Ledger year {year} changed during the export, please retry")
+
+            archive.file_path = path
+            archive.row_count = rows
+            archive.total_cents = total_cents
+            archive.checksum = _file_checksum(path)
+            archive.archived_at = func.now()
+            if remove_from_hot:
+                # The file becomes the only copy: make sure it reads back in full first
+                _verify_file(pa, year, path, rows, total_cents)
+                deleted = db.query(DBLedgerEntry).filter(DBLedgerEntry.year == year).delete(synchronize_session=False)
+                if deleted != rows:
+                    raise HTTPException(status_code=409, detail=f"Ledger year {year} changed during the export, please retry")
+                archive.removed_from_hot = True
+                archive.removed_at = func.now()
+                # Too many rows for row-level events; subscribers refetch instead
+                invalidation_bus.publish(db, LEDGER_CHANGES)
+            invalidation_bus.publish(db, LEDGER_ARCHIVES)
+            db.commit()
+        except Exception:
+            db.rollback()
+            if created:
+                db.query(DBLedgerArchive).filter(DBLedgerArchive.year == year).delete(synchronize_session=False)
+                invalidation_bus.publish(db, LEDGER_ARCHIVES)
+                db.commit()
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        print(f"🗄️ Archived ledger year {year}: {rows} entries to {path}{', removed from the hot table' if remove_from_hot else ''}")
+        return next(item for item in LedgerArchiveService.list_archives(db)["archives"] if item["year"] == year)
+
+    @staticmethod
+    def restore_year(db: Session, year: int) -> Dict[str, Any]:
+        """Put a removed year's rows back into ledger_entries and reopen the year"""
+        archive = db.get(DBLedgerArchive, year)
+        if archive is None:
+            raise HTTPException(status_code=404, detail=f"Ledger year {year} is not archived")
+
+        restored = 0
+        if archive.removed_from_hot:
+            pa = _pyarrow()
+            table = pa.parquet.read_table(archive.file_path, schema=_archive_schema(pa))
+            if _file_checksum(archive.file_path) != archive.checksum or table.num_rows != archive.row_count:
+                raise HTTPException(status_code=500, detail=f"Archive for ledger year {year} failed verification")
+            for batch in table.to_batches(max_chunksize=COLUMNAR_BATCH_ROWS):
+                db.execute(DBLedgerEntry.__table__.insert(), batch.to_pylist())
+            restored = table.num_rows
+            invalidation_bus.publish(db, LEDGER_CHANGES)
+
+        path = archive.file_path
+        db.delete(archive)
+        invalidation_bus.publish(db, LEDGER_ARCHIVES)
+        db.commit()
+        if os.path.exists(path):
+            os.remove(path)
+        print(f"♻️ Restored ledger year {year} ({restored} entries back in the hot table)")
+        return {"year": year, "restored_entries": restored}
@@ -0,0 +1,308 @@
+"""
+Local write-ahead journal for new ledger entries during database outages.
+
+When a create or batch request can't reach the database, the entries are
+appended to a JSON-lines journal (fsynced before the client gets 202) under
+an idempotency key - the request's Idempotency-Key header, or a generated
+one. A background worker replays queued requests in order through the normal
+LedgerService paths once the database is back, so validation, change events
+and cache invalidation behave exactly as for a live write. Replays record
+their result in idempotency_keys, so a client retrying its key afterwards
+gets the replayed response.
+
+The journal is event-sourced: "queued" records carry the request, and
+"resolved" records mark it applied, conflicting (unique_ledger_entry) or
+rejected. Workers share the file through an flock held only for each read or
+append, never across a database write, so requests journaling during a replay
+don't wait on it; a second flock makes sure only one worker replays at a time.
+Resolved records stay visible through the status endpoint for
+LEDGER_JOURNAL_RETENTION_HOURS, then are compacted away.
+
+Journaling is only enabled with LEDGER_JOURNAL_PATH on a persistent volume;
+otherwise writes during an outage fail with 503 as before. It also needs the
+read-only snapshot, which authenticates the request while the database is
+down, so config refuses to start with journaling on and the snapshot off.
+"""
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from config import LEDGER_JOURNAL_ENABLED, LEDGER_JOURNAL_PATH, LEDGER_JOURNAL_REPLAY_INTERVAL_SECONDS, LEDGER_JOURNAL_RETENTION_HOURS
+from database.database import get_db_session
+from database.health import DatabaseUnavailableError, database_health
+from database.models import CreateLedgerEntryRequest
+
+QUEUED = "queued"
+APPLIED = "applied"
+CONFLICT = "conflict"
+REJECTED = "rejected"
+
+CREATE = "create"
+BATCH = "batch"
+
+
+def _caused_by(exc: BaseException, error_type: type) -> bool:
+    while exc is not None:
+        if isinstance(exc, error_type):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class LedgerJournal:
+    def __init__(self, path: Optional[str] = LEDGER_JOURNAL_PATH):
+        self.path = path
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.replayed = 0
+        self.last_error: Optional[str] = None
+
+    @contextmanager
+    def _locked(self, suffix: str = "lock", blocking: bool = True):
+        """Exclusive across threads and worker processes; yields False if not blocking and already held"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.{suffix}", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        with open(self.path, "a", encoding="utf-8") as journal:
+            journal.write(json.dumps(record) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        """Fold the journal into one record per key, in queue order"""
+        records: Dict[str, Dict[str, Any]] = {}
+        if not self.path or not os.path.exists(self.path):
+            return records
+        with open(self.path, encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append; its request never got a 202
+                    continue
+                if record["event"] == "queued":
+                    records[record["key"]] = {**record, "status": QUEUED}
+                elif record["key"] in records:
+                    records[record["key"]].update(record)
+        return records
+
+    def enqueue(self, op: str, entries: List[CreateLedgerEntryRequest], user_id: int, key: Optional[str] = None) -> Dict[str, Any]:
+        """Durably queue a create (one entry) or batch request; repeating a key returns the original"""
+        key = key or str(uuid.uuid4())
+        with self._locked():
+            existing = self._read().get(key)
+            if existing is not None:
+                if existing["user_id"] != user_id:
+                    raise HTTPException(status_code=409, detail="Idempotency-Key is already in use")
+                return self._to_response(existing)
+            record = {
+                "event": "queued",
+                "key": key,
+                "op": op,
+                "user_id": user_id,
+                "entries": jsonable_encoder(entries),
+                "queued_at": datetime.utcnow().isoformat(),
+            }
+            self._append(record)
+        print(f"📝 Journaled {op} of {len(entries)} ledger entr{'y' if len(entries) == 1 else 'ies'} for user {user_id} while the database is down")
+        return self._to_response({**record, "status": QUEUED})
+
+    def _resolve(self, key: str, status: str, detail: Optional[str] = None, entry_ids: Optional[List[int]] = None) -> None:
+        with self._locked():
+            self._append({
+                "event": "resolved",
+                "key": key,
+                "status": status,
+                "detail": detail,
+                "entry_ids": entry_ids or [],
+                "resolved_at": datetime.utcnow().isoformat(),
+            })
+
+    def _apply(self, record: Dict[str, Any]) -> List[int]:
+        from services.ledger_service import LedgerService
+        from services.idempotency_service import IdempotencyService, LEDGER_CREATE_ROUTE, LEDGER_BATCH_ROUTE
+        entries = [CreateLedgerEntryRequest(**entry) for entry in record["entries"]]
+        user_id, key = record["user_id"], record["key"]
+        db = get_db_session()
+        try:
+            # Stored under the journal key too, so a client retrying after the outage gets this result
+            if record["op"] == CREATE:
+                result = IdempotencyService.run(
+                    db, user_id, key, LEDGER_CREATE_ROUTE, entries[0],
+                    lambda: LedgerService.create_ledger_entry(db, entries[0], user_id, key),
+                    resume=True
+                )
+            else:
+                result = IdempotencyService.run(
+                    db, user_id, key, LEDGER_BATCH_ROUTE, entries,
+                    lambda: LedgerService.create_ledger_entries_batch(db, entries, user_id, key),
+                    resume=True
+                )
+            if isinstance(result, JSONResponse):
+                # Already handled before the outage cut the request off
+                body = json.loads(result.body)
+                if result.status_code >= 400:
+                    raise HTTPException(status_code=result.status_code, detail=body.get("detail"))
+                result = body
+            return [result["id"]] if record["op"] == CREATE else [entry["id"] for entry in result]
+        finally:
+            db.close()
+
+    def replay(self) -> int:
+        """Apply queued requests in order, stopping at the first one the database can't take yet"""
+        applied = 0
+        with self._locked("replay.lock", blocking=False) as replaying:
+            if not replaying:
+                # Another worker is replaying
+                return 0
+            with self._locked():
+                queued = [record for record in self._read().values() if record["status"] == QUEUED]
+            # Requests journaled from here on are picked up by the next pass
+            for record in queued:
+                try:
+                    entry_ids = self._apply(record)
+                except DatabaseUnavailableError:
+                    break
+                except HTTPException as e:
+                    if e.status_code == 409 or _caused_by(e, IntegrityError):
+                        self._resolve(record["key"], CONFLICT, e.detail)
+                        print(f"⚠️ Journaled ledger write {record['key']} conflicts with an existing entry")
+                    elif e.status_code < 500:
+                        self._resolve(record["key"], REJECTED, e.detail)
+                    else:
+                        # Keep the order: later writes wait until this one can be applied
+                        self.last_error = str(e.detail)[:200]
+                        break
+                    continue
+                self._resolve(record["key"], APPLIED, entry_ids=entry_ids)
+                applied += 1
+            with self._locked():
+                self._compact()
+        if applied:
+            self.replayed += applied
+            print(f"✅ Replayed {applied} journaled ledger write(s)")
+        return applied
+
+    def _compact(self) -> None:
+        """Rewrite the journal without resolved records past retention"""
+        records = self._read()
+        cutoff = (datetime.utcnow() - timedelta(hours=LEDGER_JOURNAL_RETENTION_HOURS)).isoformat()
+        expired = [key for key, record in records.items() if record["status"] != QUEUED and record["resolved_at"] < cutoff]
+        if not expired:
+            return
+        temporary_path = f"{self.path}.compact"
+        with open(temporary_path, "w", encoding="utf-8") as journal:
+            for key, record in records.items():
+                if key in expired:
+                    continue
+                queued = {field: record[field] for field in ("key", "op", "user_id", "entries", "queued_at")}
+                journal.write(json.dumps({"event": "queued", **queued}) + "\n")
+                if record["status"] != QUEUED:
+                    resolved = {field: record[field] for field in ("key", "status", "detail", "entry_ids", "resolved_at")}
+                    journal.write(json.dumps({"event": "resolved", **resolved}) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temporary_path, self.path)
+
+    def has_pending(self) -> bool:
+        return any(record["status"] == QUEUED for record in self._read().values())
+
+    def start(self) -> None:
+        if not LEDGER_JOURNAL_ENABLED or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ledger-journal-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if database_health.available:
+                try:
+                    if self.has_pending():
+                        self.replay()
+                except Exception as e:
+                    self.last_error = f"{type(e).__name__}: {str(e)}"[:200]
+                    print(f"⚠️ Ledger journal replay failed: {self.last_error}")
+            self._wake.wait(LEDGER_JOURNAL_REPLAY_INTERVAL_SECONDS)
+            self._wake.clear()
+
+    @staticmethod
+    def _to_response(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "key": record["key"],
+            "op": record["op"],
+            "status": record["status"],
+            "user_id": record["user_id"],
+            "entries": len(record["entries"]),
+            "queued_at": record["queued_at"],
+            "resolved_at": record.get("resolved_at"),
+            "detail": record.get("detail"),
+            "entry_ids": record.get("entry_ids", []),
+        }
+
+    def get_status(self, user_id: int, is_admin: bool = False) -> Dict[str, Any]:
+        """Journaled writes visible to the user, newest first, with per-status counts"""
+        records = [
+            self._to_response(record) for record in self._read().values()
+            if is_admin or record["user_id"] == user_id
+        ]
+        counts = {status: 0 for status in (QUEUED, APPLIED, CONFLICT, REJECTED)}
+        for record in records:
+            counts[record["status"]] += 1
+        return {
+            "enabled": LEDGER_JOURNAL_ENABLED,
+            "counts": counts,
+            "writes": list(reversed(records)),
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": LEDGER_JOURNAL_ENABLED,
+            "path": self.path,
+            "running": self._thread is not None,
+            "replayed": self.replayed,
+            "last_error": self.last_error,
+        }
+
+
+# Shared by every request in this process
+ledger_journal = LedgerJournal()
+
+
+async def journal_response(op: str, entries: List[CreateLedgerEntryRequest], user_id: int, key: Optional[str] = None) -> JSONResponse:
+    """202 for a write that couldn't reach the database and was journaled instead"""
+    # The flock wait and fsync stay off the event loop
+    content = await run_in_threadpool(ledger_journal.enqueue, op, entries, user_id, key)
+    return JSONResponse(status_code=202, content=content)
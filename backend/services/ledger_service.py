@@ -1,13 +1,116 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional, Dict, Any
-from database.db_models import LedgerEntry as DBLedgerEntry, User as DBUser
+from typing import List, Optional, Dict, Any, Iterator, Tuple
+from database.db_models import LedgerEntry as DBLedgerEntry, User as DBUser, CreditCard as DBCreditCard, SpendingCategory as DBSpendingCategory, to_cents
 from database.models import CreateLedgerEntryRequest, UpdateLedgerEntryRequest
+from services.reference_cache import SPENDING_CATEGORIES
+from services import invalidation_bus
+from services.change_feed import publish_change
+from services.idempotency_service import IdempotencyService
+from services.ledger_archive_service import LedgerArchiveService
 from fastapi import HTTPException
 
+# The catch-all category the AI assistant falls back to; the only one created on demand
+OTHERS_CATEGORY = "Others"
+
+def _resolve_category_id(db: Session, category_name: str) -> int:
+    """Look up a category by name, creating only the AI assistant's "Others" category if missing"""
+    category = db.query(DBSpendingCategory).filter(DBSpendingCategory.category_name == category_name).first()
+    if category is None:
+        if category_name != OTHERS_CATEGORY:
+            raise HTTPException(status_code=400, detail=f"Spending category '{category_name}' not found")
+        category = DBSpendingCategory(category_name=category_name)
+        db.add(category)
+        db.flush()
+        invalidation_bus.publish(db, SPENDING_CATEGORIES)
+        publish_change(db, "spending_category", "created", {"id": category.id, "category_name": category.category_name})
+    return category.id
+
+def _resolve_credit_card_id(db: Session, card_name: str, user_id: int) -> int:
+    """Look up a card by name, preferring the entry owner's card"""
+    card = db.query(DBCreditCard).filter(
+        DBCreditCard.name == card_name
+    ).order_by((DBCreditCard.user_id == user_id).desc(), DBCreditCard.id).first()
+    if card is None:
+        raise HTTPException(status_code=400, detail=f"Credit card '{card_name}' not found")
+    return card.id
+
+def _entry_to_dict(entry: DBLedgerEntry) -> Dict[str, Any]:
+    """Response shape shared by the ledger endpoints and change events"""
+    user_info = {
+        "id": entry.user.id,
+        "name": entry.user.name,
+        "email": entry.user.email
+    } if entry.user else None
+    
+    return {
+        "id": entry.id,
+        "user_id": entry.user_id,
+        "year": entry.year,
+        "month": entry.month,
+        "category": entry.category,
+        "amount": entry.amount,
+        "credit_card": entry.credit_card,
+        "notes": entry.notes,
+        "created_at": entry.created_at,
+        "updated_at": entry.updated_at,
+        "user": user_info
+    }
+
+# Column order and types of iter_ledger_entry_rows, for the columnar encoders
+LEDGER_ENTRY_COLUMNS = [
+    ("id", "int64"),
+    ("user_id", "int64"),
+    ("user_name", "string"),
+    ("user_email", "string"),
+    ("year", "int32"),
+    ("month", "int32"),
+    ("category", "string"),
+    ("amount", "cents"),
+    ("credit_card", "string"),
+    ("notes", "string"),
+    ("created_at", "timestamp"),
+    ("updated_at", "timestamp"),
+]
+
 class LedgerService:
+    @staticmethod
+    def iter_ledger_entry_rows(db: Session, current_user_id: int, is_admin: bool = False, batch_rows: int = 10000) -> Iterator[List[Tuple]]:
+        """Yield ledger entries as plain tuples in LEDGER_ENTRY_COLUMNS order, batch_rows at a time
+
+        Selects columns instead of ORM objects and streams from a server-side
+        cursor, so large exports never hold a full ORM result in memory.
+        Years archived out of the hot table follow as Arrow record batches.
+        """
+        query = select(
+            DBLedgerEntry.id,
+            DBLedgerEntry.user_id,
+            DBUser.name,
+            DBUser.email,
+            DBLedgerEntry.year,
+            DBLedgerEntry.month,
+            DBSpendingCategory.category_name,
+            DBLedgerEntry.amount_cents,
+            DBCreditCard.name,
+            DBLedgerEntry.notes,
+            DBLedgerEntry.created_at,
+            DBLedgerEntry.updated_at
+        ).join(DBUser, DBLedgerEntry.user_id == DBUser.id).join(
+            DBSpendingCategory, DBLedgerEntry.category_id == DBSpendingCategory.id
+        ).join(DBCreditCard, DBLedgerEntry.credit_card_id == DBCreditCard.id)
+        if not is_admin:
+            query = query.where(DBLedgerEntry.user_id == current_user_id)
+        try:
+            result = db.execute(query.execution_options(yield_per=batch_rows))
+            for partition in result.partitions():
+                yield partition
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        yield from LedgerArchiveService.iter_entry_batches(db, current_user_id, is_admin, batch_rows)
+
     @staticmethod
     def get_ledger_entries(db: Session, current_user_id: int, is_admin: bool = False) -> List[Dict[str, Any]]:
-        """Get all ledger entries - admin can see all, others see only their own"""
+        """Get all ledger entries, including archived years - admin can see all, others see only their own"""
         try:
             if is_admin:
                 entries = db.query(DBLedgerEntry).options(joinedload(DBLedgerEntry.user)).all()
@@ -17,48 +120,32 @@ class LedgerService:
                 ).all()
             
             # Convert to response format
-            result = []
-            for entry in entries:
-                user_info = {
-                    "id": entry.user.id,
-                    "name": entry.user.name,
-                    "email": entry.user.email
-                } if entry.user else None
-                
-                result.append({
-                    "id": entry.id,
-                    "user_id": entry.user_id,
-                    "year": entry.year,
-                    "month": entry.month,
-                    "category": entry.category,
-                    "amount": entry.amount,
-                    "credit_card": entry.credit_card,
-                    "notes": entry.notes,
-                    "created_at": entry.created_at,
-                    "updated_at": entry.updated_at,
-                    "user": user_info
-                })
-            
-            return result
+            result = [_entry_to_dict(entry) for entry in entries]
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        return result + LedgerArchiveService.get_entries(db, current_user_id, is_admin)
 
     @staticmethod
-    def create_ledger_entry(db: Session, entry_data: CreateLedgerEntryRequest, current_user_id: int) -> Dict[str, Any]:
-        """Create a new ledger entry"""
+    def create_ledger_entry(db: Session, entry_data: CreateLedgerEntryRequest, current_user_id: int, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Create a new ledger entry, storing the response under idempotency_key in the same transaction"""
         try:
+            LedgerArchiveService.ensure_writable(db, entry_data.year)
+            
             # Verify the user exists
             db_user = db.query(DBUser).filter(DBUser.id == entry_data.user_id).first()
             if not db_user:
                 raise HTTPException(status_code=400, detail=f"User with ID {entry_data.user_id} not found")
             
+            category_id = _resolve_category_id(db, entry_data.category)
+            credit_card_id = _resolve_credit_card_id(db, entry_data.credit_card, entry_data.user_id)
+            
             # Check for existing entry with same key tuple
             existing_entry = db.query(DBLedgerEntry).filter(
                 DBLedgerEntry.year == entry_data.year,
                 DBLedgerEntry.month == entry_data.month,
                 DBLedgerEntry.user_id == entry_data.user_id,
-                DBLedgerEntry.credit_card == entry_data.credit_card,
-                DBLedgerEntry.category == entry_data.category
+                DBLedgerEntry.credit_card_id == credit_card_id,
+                DBLedgerEntry.category_id == category_id
             ).first()
             
             if existing_entry:
@@ -72,36 +159,24 @@ class LedgerService:
                 user_id=entry_data.user_id,
                 year=entry_data.year,
                 month=entry_data.month,
-                category=entry_data.category,
-                amount=entry_data.amount,
-                credit_card=entry_data.credit_card,
+                category_id=category_id,
+                amount_cents=to_cents(entry_data.amount),
+                credit_card_id=credit_card_id,
                 notes=entry_data.notes
             )
             
             db.add(db_entry)
-            db.commit()
+            db.flush()
             db.refresh(db_entry)
             
-            # Return the created entry with user information
-            user_info = {
-                "id": db_user.id,
-                "name": db_user.name,
-                "email": db_user.email
-            }
+            # Return the created entry with user information, and push it to open sessions
+            result = _entry_to_dict(db_entry)
+            publish_change(db, "ledger_entry", "created", result, [db_entry.user_id])
+            if idempotency_key:
+                IdempotencyService.complete(db, current_user_id, idempotency_key, result)
+            db.commit()
             
-            return {
-                "id": db_entry.id,
-                "user_id": db_entry.user_id,
-                "year": db_entry.year,
-                "month": db_entry.month,
-                "category": db_entry.category,
-                "amount": db_entry.amount,
-                "credit_card": db_entry.credit_card,
-                "notes": db_entry.notes,
-                "created_at": db_entry.created_at,
-                "updated_at": db_entry.updated_at,
-                "user": user_info
-            }
+            return result
         except HTTPException:
             raise
         except Exception as e:
@@ -125,25 +200,7 @@ class LedgerService:
                 raise HTTPException(status_code=404, detail="Ledger entry not found")
             
             # Return the entry with user information
-            user_info = {
-                "id": db_entry.user.id,
-                "name": db_entry.user.name,
-                "email": db_entry.user.email
-            } if db_entry.user else None
-            
-            return {
-                "id": db_entry.id,
-                "user_id": db_entry.user_id,
-                "year": db_entry.year,
-                "month": db_entry.month,
-                "category": db_entry.category,
-                "amount": db_entry.amount,
-                "credit_card": db_entry.credit_card,
-                "notes": db_entry.notes,
-                "created_at": db_entry.created_at,
-                "updated_at": db_entry.updated_at,
-                "user": user_info
-            }
+            return _entry_to_dict(db_entry)
         except HTTPException:
             raise
         except Exception as e:
@@ -164,6 +221,7 @@ class LedgerService:
             
             if not db_entry:
                 raise HTTPException(status_code=404, detail="Ledger entry not found")
+            LedgerArchiveService.ensure_writable(db, db_entry.year, entry_update.year)
             
             # Verify the new user exists if user_id is being changed
             if entry_update.user_id != db_entry.user_id:
@@ -172,37 +230,26 @@ class LedgerService:
                     raise HTTPException(status_code=400, detail=f"User with ID {entry_update.user_id} not found")
             
             # Update the entry
+            previous_user_id = db_entry.user_id
             db_entry.user_id = entry_update.user_id
             db_entry.year = entry_update.year
             db_entry.month = entry_update.month
-            db_entry.category = entry_update.category
-            db_entry.amount = entry_update.amount
-            db_entry.credit_card = entry_update.credit_card
+            db_entry.category_id = _resolve_category_id(db, entry_update.category)
+            db_entry.amount_cents = to_cents(entry_update.amount)
+            db_entry.credit_card_id = _resolve_credit_card_id(db, entry_update.credit_card, entry_update.user_id)
             db_entry.notes = entry_update.notes
             
-            db.commit()
+            db.flush()
             db.refresh(db_entry)
             
-            # Get user information from the joined load
-            user_info = {
-                "id": db_entry.user.id,
-                "name": db_entry.user.name,
-                "email": db_entry.user.email
-            } if db_entry.user else None
+            result = _entry_to_dict(db_entry)
+            if previous_user_id != db_entry.user_id:
+                # The previous owner can no longer see the entry
+                publish_change(db, "ledger_entry", "deleted", {"id": db_entry.id, "user_id": previous_user_id}, [previous_user_id])
+            publish_change(db, "ledger_entry", "updated", result, [db_entry.user_id])
+            db.commit()
             
-            return {
-                "id": db_entry.id,
-                "user_id": db_entry.user_id,
-                "year": db_entry.year,
-                "month": db_entry.month,
-                "category": db_entry.category,
-                "amount": db_entry.amount,
-                "credit_card": db_entry.credit_card,
-                "notes": db_entry.notes,
-                "created_at": db_entry.created_at,
-                "updated_at": db_entry.updated_at,
-                "user": user_info
-            }
+            return result
         except HTTPException:
             raise
         except Exception as e:
@@ -224,8 +271,10 @@ class LedgerService:
             
             if not db_entry:
                 raise HTTPException(status_code=404, detail="Ledger entry not found")
+            LedgerArchiveService.ensure_writable(db, db_entry.year)
             
             db.delete(db_entry)
+            publish_change(db, "ledger_entry", "deleted", {"id": db_entry.id, "user_id": db_entry.user_id}, [db_entry.user_id])
             db.commit()
             
             return {"message": "Ledger entry deleted successfully"}
@@ -236,9 +285,10 @@ class LedgerService:
             raise HTTPException(status_code=500, detail=f"Failed to delete ledger entry: {str(e)}")
 
     @staticmethod
-    def create_ledger_entries_batch(db: Session, entries_data: List[CreateLedgerEntryRequest], current_user_id: int) -> List[Dict[str, Any]]:
-        """Create multiple ledger entries in a batch"""
+    def create_ledger_entries_batch(db: Session, entries_data: List[CreateLedgerEntryRequest], current_user_id: int, idempotency_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Create multiple ledger entries in a batch, storing the response under idempotency_key in the same transaction"""
         try:
+            LedgerArchiveService.ensure_writable(db, *{entry_data.year for entry_data in entries_data})
             created_entries = []
             
             for entry_data in entries_data:
@@ -247,13 +297,16 @@ class LedgerService:
                 if not db_user:
                     raise HTTPException(status_code=400, detail=f"User with ID {entry_data.user_id} not found")
                 
+                category_id = _resolve_category_id(db, entry_data.category)
+                credit_card_id = _resolve_credit_card_id(db, entry_data.credit_card, entry_data.user_id)
+                
                 # Check for existing entry with same key tuple
                 existing_entry = db.query(DBLedgerEntry).filter(
                     DBLedgerEntry.year == entry_data.year,
                     DBLedgerEntry.month == entry_data.month,
                     DBLedgerEntry.user_id == entry_data.user_id,
-                    DBLedgerEntry.credit_card == entry_data.credit_card,
-                    DBLedgerEntry.category == entry_data.category
+                    DBLedgerEntry.credit_card_id == credit_card_id,
+                    DBLedgerEntry.category_id == category_id
                 ).first()
                 
                 if existing_entry:
@@ -267,40 +320,28 @@ class LedgerService:
                     user_id=entry_data.user_id,
                     year=entry_data.year,
                     month=entry_data.month,
-                    category=entry_data.category,
-                    amount=entry_data.amount,
-                    credit_card=entry_data.credit_card,
+                    category_id=category_id,
+                    amount_cents=to_cents(entry_data.amount),
+                    credit_card_id=credit_card_id,
                     notes=entry_data.notes
                 )
                 
                 db.add(db_entry)
                 created_entries.append(db_entry)
             
-            db.commit()
+            db.flush()
             
-            # Return the created entries with user information
+            # Return the created entries with user information, one change event per row
             result = []
             for db_entry in created_entries:
                 db.refresh(db_entry)
-                user_info = {
-                    "id": db_entry.user.id,
-                    "name": db_entry.user.name,
-                    "email": db_entry.user.email
-                } if db_entry.user else None
-                
-                result.append({
-                    "id": db_entry.id,
-                    "user_id": db_entry.user_id,
-                    "year": db_entry.year,
-                    "month": db_entry.month,
-                    "category": db_entry.category,
-                    "amount": db_entry.amount,
-                    "credit_card": db_entry.credit_card,
-                    "notes": db_entry.notes,
-                    "created_at": db_entry.created_at,
-                    "updated_at": db_entry.updated_at,
-                    "user": user_info
-                })
+                entry = _entry_to_dict(db_entry)
+                publish_change(db, "ledger_entry", "created", entry, [db_entry.user_id])
+                result.append(entry)
+            
+            if idempotency_key:
+                IdempotencyService.complete(db, current_user_id, idempotency_key, result)
+            db.commit()
             
             return result
         except HTTPException:
@@ -0,0 +1,395 @@
+"""
+Pluggable model client used by the AI assistant and chatbot services.
+
+The services talk to a small ModelClient interface instead of genai.Client, so
+the backend can be switched (LLM_BACKEND) between the real Gemini API and an
+offline FakeModelClient with scripted responses, configurable latency and
+streaming cadence, and injected errors for load and regression testing.
+Whichever backend is selected is wrapped in InstrumentedModelClient, which
+retries transient failures and records every call in llm_metrics.
+"""
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    LLM_BACKEND, GOOGLE_API_KEY, FAKE_LLM_SCRIPT, FAKE_LLM_LATENCY_MS, FAKE_LLM_CHUNK_CHARS,
+    FAKE_LLM_CHUNK_INTERVAL_MS, FAKE_LLM_ERROR_RATE, FAKE_LLM_SEED, LLM_MAX_RETRIES, LLM_RETRY_BACKOFF_SECONDS
+)
+from services.llm_metrics import LLMCall, llm_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ModelResponse:
+    def __init__(self, text: str, prompt_tokens: Optional[int] = None, output_tokens: Optional[int] = None,
+                 function_calls: Optional[List[Dict[str, Any]]] = None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        self.function_calls = function_calls or []  # [{"name": ..., "args": {...}}]
+        self.call: Optional[LLMCall] = None  # Set by InstrumentedModelClient
+
+
+class ModelClientError(Exception):
+    """Raised by clients for failed model calls"""
+
+
+class ModelClient(ABC):
+    """Interface for model backends. Configs are plain dicts of GenerateContentConfig fields."""
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, model: str, contents: List[Any], config: Optional[Dict[str, Any]] = None) -> ModelResponse:
+        """One complete response"""
+
+    @abstractmethod
+    def generate_stream(self, model: str, contents: List[Any], config: Optional[Dict[str, Any]] = None) -> Iterator[ModelResponse]:
+        """The response as a sequence of chunks"""
+
+    @abstractmethod
+    async def agenerate(self, model: str, contents: List[Any], config: Optional[Dict[str, Any]] = None) -> ModelResponse:
+        """generate for async callers"""
+
+    @abstractmethod
+    def agenerate_stream(self, model: str, contents: List[Any], config: Optional[Dict[str, Any]] = None) -> AsyncIterator[ModelResponse]:
+        """generate_stream for async callers; implemented as an async generator"""
+
+
+def _usage(response: Any) -> Dict[str, Any]:
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None) if usage else None,
+        "output_tokens": getattr(usage, "candidates_token_count", None) if usage else None,
+        "function_calls": [
+            {"name": call.name, "args": dict(call.args or {})}
+            for call in getattr(response, "function_calls", None) or []
+        ],
+    }
+
+
+class GenAIModelClient(ModelClient):
+    """Google Gemini backend"""
+
+    name = "genai"
+
+    def __init__(self, api_key: str):
+        from google import genai
+        self._client = genai.Client(api_key=api_key)
+
+    def generate(self, model, contents, config=None):
+        response = self._client.models.generate_content(model=model, contents=contents, config=config)
+        return ModelResponse(response.text or "", **_usage(response))
+
+    def generate_stream(self, model, contents, config=None):
+        for chunk in self._client.models.generate_content_stream(model=model, contents=contents, config=config):
+            yield ModelResponse(chunk.text or "", **_usage(chunk))
+
+    async def agenerate(self, model, contents, config=None):
+        response = await self._client.aio.models.generate_content(model=model, contents=contents, config=config)
+        return ModelResponse(response.text or "", **_usage(response))
+
+    async def agenerate_stream(self, model, contents, config=None):
+        stream = await self._client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+        async for chunk in stream:
+            yield ModelResponse(chunk.text or "", **_usage(chunk))
+
+
+DEFAULT_FAKE_EXTRACTION = json.dumps([
+    {"category": "Groceries", "amount": 84.27, "notes": "Sum: 'TRADER JOE S' ($45.10) + 'SAFEWAY' ($39.17) = $84.27.", "merchants": ["TRADER JOE S", "SAFEWAY"]},
+    {"category": "Others", "amount": 12.5, "notes": "From 'MISC' row.", "merchants": ["MISC"]},
+], indent=2)
+
+DEFAULT_FAKE_CHAT = "This is a response from the offline fake model backend.\n[eom]"
+
+
+def _estimate_tokens(value: Any) -> int:
+    if isinstance(value, str):
+        return math.ceil(len(value) / 4)
+    if isinstance(value, dict):
+        return sum(_estimate_tokens(part.get("text", "")) for part in value.get("parts", []))
+    if isinstance(value, list):
+        return sum(_estimate_tokens(item) for item in value)
+    return 258  # Gemini bills a fixed token count per image
+
+
+def _has_function_response(contents: List[Any]) -> bool:
+    return any(
+        "function_response" in part
+        for item in contents if isinstance(item, dict)
+        for part in item.get("parts", [])
+    )
+
+
+def _contents_text(contents: List[Any]) -> str:
+    texts = []
+    for item in contents:
+        if isinstance(item, str):
+            texts.append(item)
+        elif isinstance(item, dict):
+            texts.extend(part.get("text", "") for part in item.get("parts", []))
+    return "\n".join(texts)
+
+
+class FakeModelClient(ModelClient):
+    """Offline backend with scripted responses, simulated latency and injected errors
+
+    The optional script is a JSON file of the form
+    {"responses": [{"match": "substring", "text": "..."}], "default": "..."}.
+    The first response whose match appears in the system instruction or
+    contents is returned; without a match, extraction-style prompts get a
+    sample JSON array and everything else a short chat reply. A response may
+    also list "function_calls" ([{"name": ..., "args": {...}}]), returned
+    until the contents carry a function response.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        script: Optional[Dict[str, Any]] = None,
+        latency_ms: float = 0,
+        chunk_chars: int = 40,
+        chunk_interval_ms: float = 0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.script = script or {}
+        self.latency_ms = latency_ms
+        self.chunk_chars = max(chunk_chars, 1)
+        self.chunk_interval_ms = chunk_interval_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    @classmethod
+    def from_config(cls) -> "FakeModelClient":
+        script = None
+        if FAKE_LLM_SCRIPT:
+            with open(FAKE_LLM_SCRIPT) as f:
+                script = json.load(f)
+        return cls(
+            script=script,
+            latency_ms=FAKE_LLM_LATENCY_MS,
+            chunk_chars=FAKE_LLM_CHUNK_CHARS,
+            chunk_interval_ms=FAKE_LLM_CHUNK_INTERVAL_MS,
+            error_rate=FAKE_LLM_ERROR_RATE,
+            seed=FAKE_LLM_SEED,
+        )
+
+    def _respond(self, contents: List[Any], config: Optional[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        self.calls += 1
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise ModelClientError("Injected fake model error")
+
+        system_instruction = (config or {}).get("system_instruction") or ""
+        haystack = f"{system_instruction}\n{_contents_text(contents)}"
+        answered = _has_function_response(contents)
+        for response in self.script.get("responses", []):
+            if response.get("match", "") in haystack:
+                if response.get("function_calls") and not answered and (config or {}).get("tools"):
+                    return "", response["function_calls"]
+                return response.get("text", ""), []
+        if "default" in self.script:
+            return self.script["default"], []
+        return (DEFAULT_FAKE_EXTRACTION if "JSON array" in haystack else DEFAULT_FAKE_CHAT), []
+
+    def _chunks(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+
+    def _response(self, text: str, function_calls: List[Dict[str, Any]], contents: List[Any], config: Optional[Dict[str, Any]]) -> ModelResponse:
+        system_instruction = (config or {}).get("system_instruction") or ""
+        return ModelResponse(
+            text,
+            prompt_tokens=_estimate_tokens(contents) + _estimate_tokens(system_instruction),
+            output_tokens=_estimate_tokens(text),
+            function_calls=function_calls,
+        )
+
+    def generate(self, model, contents, config=None):
+        time.sleep(self.latency_ms / 1000)
+        text, function_calls = self._respond(contents, config)
+        return self._response(text, function_calls, contents, config)
+
+    def generate_stream(self, model, contents, config=None):
+        time.sleep(self.latency_ms / 1000)
+        text, function_calls = self._respond(contents, config)
+        chunks = self._chunks(text)
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(self.chunk_interval_ms / 1000)
+            # Like Gemini, usage metadata is reported on the final chunk
+            if index == len(chunks) - 1:
+                final = self._response(text, function_calls, contents, config)
+                final.text = chunk
+                yield final
+            else:
+                yield ModelResponse(chunk)
+
+    async def agenerate(self, model, contents, config=None):
+        await asyncio.sleep(self.latency_ms / 1000)
+        text, function_calls = self._respond(contents, config)
+        return self._response(text, function_calls, contents, config)
+
+    async def agenerate_stream(self, model, contents, config=None):
+        await asyncio.sleep(self.latency_ms / 1000)
+        text, function_calls = self._respond(contents, config)
+        chunks = self._chunks(text)
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(self.chunk_interval_ms / 1000)
+            if index == len(chunks) - 1:
+                final = self._response(text, function_calls, contents, config)
+                final.text = chunk
+                yield final
+            else:
+                yield ModelResponse(chunk)
+
+
+# Rate limits and temporary unavailability are worth retrying; bad requests are not
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def _is_retryable(error: Exception) -> bool:
+    return isinstance(error, ModelClientError) or getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+
+class InstrumentedModelClient(ModelClient):
+    """Wraps a backend with retries and per-call metrics
+
+    Every method also takes the route and user the call is made for, plus the
+    time it already spent queued, so metrics can be broken down by both. The
+    returned response (or every streamed chunk) carries the LLMCall in .call.
+    Streams are only retried if they fail before the first chunk.
+    """
+
+    def __init__(self, backend: ModelClient, max_retries: int = LLM_MAX_RETRIES, retry_backoff: float = LLM_RETRY_BACKOFF_SECONDS):
+        self.backend = backend
+        self.name = backend.name
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def _should_retry(self, call: LLMCall, error: Exception) -> bool:
+        return call.retries < self.max_retries and _is_retryable(error)
+
+    def _backoff(self, call: LLMCall) -> float:
+        return self.retry_backoff * (2 ** call.retries)
+
+    def generate(self, model, contents, config=None, route: str = "unknown", user_id: Optional[int] = None, queue_time: float = 0.0):
+        call = LLMCall(route, user_id, queue_time)
+        try:
+            while True:
+                try:
+                    response = self.backend.generate(model, contents, config)
+                    break
+                except Exception as e:
+                    if not self._should_retry(call, e):
+                        raise
+                    time.sleep(self._backoff(call))
+                    call.retries += 1
+        except BaseException as e:
+            llm_metrics.finish(call, e)
+            raise
+        call.usage(response)
+        llm_metrics.finish(call)
+        response.call = call
+        return response
+
+    def generate_stream(self, model, contents, config=None, route: str = "unknown", user_id: Optional[int] = None, queue_time: float = 0.0):
+        call = LLMCall(route, user_id, queue_time)
+        error = None
+        try:
+            while True:
+                received = False
+                try:
+                    for chunk in self.backend.generate_stream(model, contents, config):
+                        received = True
+                        if chunk.text:
+                            call.first_token()
+                        call.usage(chunk)
+                        chunk.call = call
+                        yield chunk
+                    break
+                except Exception as e:
+                    if received or not self._should_retry(call, e):
+                        raise
+                    time.sleep(self._backoff(call))
+                    call.retries += 1
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            llm_metrics.finish(call, error)
+
+    async def agenerate(self, model, contents, config=None, route: str = "unknown", user_id: Optional[int] = None, queue_time: float = 0.0):
+        call = LLMCall(route, user_id, queue_time)
+        try:
+            while True:
+                try:
+                    response = await self.backend.agenerate(model, contents, config)
+                    break
+                except Exception as e:
+                    if not self._should_retry(call, e):
+                        raise
+                    await asyncio.sleep(self._backoff(call))
+                    call.retries += 1
+        except BaseException as e:
+            # Includes cancellation by a caller's timeout
+            llm_metrics.finish(call, e)
+            raise
+        call.usage(response)
+        llm_metrics.finish(call)
+        response.call = call
+        return response
+
+    async def agenerate_stream(self, model, contents, config=None, route: str = "unknown", user_id: Optional[int] = None, queue_time: float = 0.0):
+        call = LLMCall(route, user_id, queue_time)
+        error = None
+        try:
+            while True:
+                received = False
+                try:
+                    async for chunk in self.backend.agenerate_stream(model, contents, config):
+                        received = True
+                        if chunk.text:
+                            call.first_token()
+                        call.usage(chunk)
+                        chunk.call = call
+                        yield chunk
+                    break
+                except Exception as e:
+                    if received or not self._should_retry(call, e):
+                        raise
+                    await asyncio.sleep(self._backoff(call))
+                    call.retries += 1
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            llm_metrics.finish(call, error)
+
+
+_client: Optional[InstrumentedModelClient] = None
+_client_initialized = False
+
+
+def get_model_client() -> Optional[InstrumentedModelClient]:
+    """Get the configured model client, or None if the real backend has no API key"""
+    global _client, _client_initialized
+    if not _client_initialized:
+        # Only marked initialized once built, so a failure (e.g. a bad FAKE_LLM_SCRIPT) is raised again, not cached as None
+        if LLM_BACKEND == "fake":
+            logger.info("Using offline fake model backend")
+            _client = InstrumentedModelClient(FakeModelClient.from_config())
+        elif LLM_BACKEND == "genai":
+            _client = InstrumentedModelClient(GenAIModelClient(GOOGLE_API_KEY)) if GOOGLE_API_KEY else None
+        else:
+            raise ValueError(f"❌ Unrecognized LLM_BACKEND: '{LLM_BACKEND}'. Must be 'genai' or 'fake'")
+        _client_initialized = True
+    return _client
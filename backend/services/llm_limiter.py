@@ -0,0 +1,108 @@
+"""
+Concurrency limiting for model calls.
+
+Bounds how many model requests the process has in flight (and how many a
+single user may have), so a burst of slow statement extractions queues up
+instead of exhausting the instance. Tracks queue-time metrics for each slot.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+
+class LLMConcurrencyLimiter:
+    """Process-wide and per-user concurrency cap for model calls"""
+
+    def __init__(self, max_concurrent: int, max_per_user: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.queue_timeout = queue_timeout
+        self._global = asyncio.Semaphore(max_concurrent)
+        self._per_user: Dict[Any, asyncio.Semaphore] = {}
+        self._per_user_refs: Dict[Any, int] = {}
+        self._in_flight = 0
+        self._waiting = 0
+        self._acquired = 0
+        self._rejected = 0
+        self._total_queue_time = 0.0
+        self._max_queue_time = 0.0
+
+    def _user_semaphore(self, user_id: Any) -> asyncio.Semaphore:
+        semaphore = self._per_user.get(user_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_per_user)
+            self._per_user[user_id] = semaphore
+        self._per_user_refs[user_id] = self._per_user_refs.get(user_id, 0) + 1
+        return semaphore
+
+    def _release_user(self, user_id: Any) -> None:
+        # Forget idle users so the map doesn't grow with every caller ever seen
+        self._per_user_refs[user_id] -= 1
+        if self._per_user_refs[user_id] == 0:
+            del self._per_user_refs[user_id]
+            del self._per_user[user_id]
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[Any] = None):
+        """Wait for a free slot, failing with 429 if the queue wait times out"""
+        user_semaphore = self._user_semaphore(user_id) if user_id is not None else None
+        started = time.perf_counter()
+        self._waiting += 1
+        user_acquired = False
+        global_acquired = False
+        try:
+            deadline = started + self.queue_timeout
+            if user_semaphore is not None:
+                await asyncio.wait_for(user_semaphore.acquire(), timeout=self.queue_timeout)
+                user_acquired = True
+            await asyncio.wait_for(self._global.acquire(), timeout=max(deadline - time.perf_counter(), 0))
+            global_acquired = True
+        except BaseException as e:
+            # Also on cancellation (client disconnect), or the user stays locked out
+            if global_acquired:
+                self._global.release()
+            if user_acquired:
+                user_semaphore.release()
+            if user_semaphore is not None:
+                self._release_user(user_id)
+            if isinstance(e, asyncio.TimeoutError):
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="AI service is busy. Please try again in a moment."
+                )
+            raise
+        finally:
+            self._waiting -= 1
+
+        queue_time = time.perf_counter() - started
+        self._acquired += 1
+        self._total_queue_time += queue_time
+        self._max_queue_time = max(self._max_queue_time, queue_time)
+        self._in_flight += 1
+        try:
+            yield queue_time
+        finally:
+            self._in_flight -= 1
+            if global_acquired:
+                self._global.release()
+            if user_acquired:
+                user_semaphore.release()
+            if user_semaphore is not None:
+                self._release_user(user_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get limiter and queue-time statistics"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_per_user": self.max_per_user,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "acquired": self._acquired,
+            "rejected": self._rejected,
+            "avg_queue_ms": round(self._total_queue_time / self._acquired * 1000, 2) if self._acquired else 0.0,
+            "max_queue_ms": round(self._max_queue_time * 1000, 2),
+        }
@@ -0,0 +1,177 @@
+"""
+Per-call instrumentation for model requests.
+
+Every model call records its queue time, time to first token, total time,
+prompt/output tokens (from usage metadata) and retries. Totals are kept per
+route and per user, with a short window of recent calls for percentiles, and
+are exposed through the debug and Prometheus metrics endpoints.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from config import LLM_INPUT_PRICE_PER_MILLION, LLM_OUTPUT_PRICE_PER_MILLION
+
+RECENT_CALLS = 200  # Calls kept per route for latency percentiles
+
+
+def estimate_cost(prompt_tokens: int, output_tokens: int) -> float:
+    return (prompt_tokens * LLM_INPUT_PRICE_PER_MILLION + output_tokens * LLM_OUTPUT_PRICE_PER_MILLION) / 1_000_000
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)], 2)
+
+
+class _Totals:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.queue_ms = 0.0
+        self.total_ms = 0.0
+
+    def add(self, call: "LLMCall") -> None:
+        self.calls += 1
+        self.errors += 1 if call.error else 0
+        self.retries += call.retries
+        self.prompt_tokens += call.prompt_tokens or 0
+        self.output_tokens += call.output_tokens or 0
+        self.queue_ms += call.queue_ms
+        self.total_ms += call.total_ms or 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(estimate_cost(self.prompt_tokens, self.output_tokens), 6),
+            "avg_queue_ms": round(self.queue_ms / self.calls, 2) if self.calls else None,
+            "avg_total_ms": round(self.total_ms / self.calls, 2) if self.calls else None,
+        }
+
+
+class LLMCall:
+    """Measurements for one model call, filled in as the call progresses"""
+
+    def __init__(self, route: str, user_id: Optional[int], queue_time: float = 0.0):
+        self.route = route
+        self.user_id = user_id
+        self.queue_ms = round(queue_time * 1000, 2)
+        self.retries = 0
+        self.ttft_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+        self.prompt_tokens: Optional[int] = None
+        self.output_tokens: Optional[int] = None
+        self.error: Optional[str] = None
+        self._started = time.perf_counter()
+
+    def first_token(self) -> None:
+        if self.ttft_ms is None:
+            self.ttft_ms = round((time.perf_counter() - self._started) * 1000, 2)
+
+    def usage(self, response: Any) -> None:
+        # Streams report usage on the last chunk, so keep the latest non-empty values
+        if response.prompt_tokens is not None:
+            self.prompt_tokens = response.prompt_tokens
+        if response.output_tokens is not None:
+            self.output_tokens = response.output_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "user_id": self.user_id,
+            "queue_ms": self.queue_ms,
+            "ttft_ms": self.ttft_ms,
+            "total_ms": self.total_ms,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "retries": self.retries,
+            "error": self.error,
+        }
+
+
+class LLMMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, _Totals] = {}
+        self._users: Dict[int, _Totals] = {}
+        self._recent: Dict[str, Deque[LLMCall]] = {}
+
+    def finish(self, call: LLMCall, error: Optional[BaseException] = None) -> None:
+        """Record a completed (or failed) call"""
+        call.total_ms = round((time.perf_counter() - call._started) * 1000, 2)
+        if call.ttft_ms is None and error is None:
+            call.ttft_ms = call.total_ms
+        if error is not None:
+            call.error = f"{type(error).__name__}: {str(error)}"[:200]
+
+        with self._lock:
+            self._routes.setdefault(call.route, _Totals()).add(call)
+            if call.user_id is not None:
+                self._users.setdefault(call.user_id, _Totals()).add(call)
+            self._recent.setdefault(call.route, deque(maxlen=RECENT_CALLS)).append(call)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._users.clear()
+            self._recent.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {}
+            for route, totals in self._routes.items():
+                recent = list(self._recent.get(route, []))
+                total_ms = [call.total_ms for call in recent if call.total_ms is not None]
+                ttft_ms = [call.ttft_ms for call in recent if call.ttft_ms is not None]
+                routes[route] = {
+                    **totals.to_dict(),
+                    "p50_total_ms": _percentile(total_ms, 0.5),
+                    "p95_total_ms": _percentile(total_ms, 0.95),
+                    "p50_ttft_ms": _percentile(ttft_ms, 0.5),
+                    "p95_ttft_ms": _percentile(ttft_ms, 0.95),
+                    "last_call": recent[-1].to_dict() if recent else None,
+                }
+            return {
+                "routes": routes,
+                "users": {user_id: totals.to_dict() for user_id, totals in self._users.items()},
+            }
+
+    def get_call_counts(self) -> Dict[str, Dict[str, int]]:
+        """Calls and errors per route, with nothing identifying users or requests"""
+        with self._lock:
+            return {route: {"calls": totals.calls, "errors": totals.errors} for route, totals in self._routes.items()}
+
+    def render_prometheus(self) -> str:
+        """Render route totals in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            routes = {route: totals.to_dict() for route, totals in self._routes.items()}
+        for metric, field, kind in (
+            ("llm_calls_total", "calls", "counter"),
+            ("llm_errors_total", "errors", "counter"),
+            ("llm_retries_total", "retries", "counter"),
+            ("llm_prompt_tokens_total", "prompt_tokens", "counter"),
+            ("llm_output_tokens_total", "output_tokens", "counter"),
+            ("llm_cost_usd_total", "cost_usd", "counter"),
+            ("llm_avg_queue_ms", "avg_queue_ms", "gauge"),
+            ("llm_avg_total_ms", "avg_total_ms", "gauge"),
+        ):
+            lines.append(f"# TYPE {metric} {kind}")
+            for route, totals in routes.items():
+                if totals[field] is not None:
+                    lines.append(f'{metric}{{route="{route}"}} {totals[field]}')
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every model call in this process
+llm_metrics = LLMMetrics()
@@ -0,0 +1,199 @@
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Dict, Any, Optional
+from database.db_models import MerchantCategory as DBMerchantCategory, SpendingCategory as DBSpendingCategory
+from services.merchant_matcher import MerchantMatcher, normalize_merchant
+from services import invalidation_bus
+from services.ledger_service import OTHERS_CATEGORY
+from fastapi import HTTPException
+import re
+import threading
+
+# Last dollar amount on a statement line, e.g. "12.50", "$1,234.56", "-3.00", "(3.00)"
+_AMOUNT_PATTERN = re.compile(r"(?<![\w.])(-|\()?\$?(\d{1,3}(?:,\d{3})+|\d+)\.(\d{2})\)?(?![\w.])")
+
+# Compiled matchers per user, rebuilt after the user's rules change
+_matchers: Dict[int, MerchantMatcher] = {}
+_matchers_lock = threading.Lock()
+
+MERCHANT_MATCHERS = "merchant_matchers"
+
+
+def _parse_amount(line: str) -> Optional[float]:
+    matches = list(_AMOUNT_PATTERN.finditer(line))
+    if not matches:
+        return None
+    match = matches[-1]
+    amount = float(f"{match.group(2).replace(',', '')}.{match.group(3)}")
+    return -amount if match.group(1) else amount
+
+
+class MerchantCategoryService:
+    @staticmethod
+    def get_matcher(db: Session, user_id: int) -> MerchantMatcher:
+        """Get the compiled merchant matcher for a user, building it on first use"""
+        with _matchers_lock:
+            matcher = _matchers.get(user_id)
+        if matcher is not None:
+            return matcher
+
+        rules = db.query(DBMerchantCategory).options(joinedload(DBMerchantCategory.category)).filter(
+            DBMerchantCategory.user_id == user_id
+        ).all()
+        matcher = MerchantMatcher({rule.merchant: rule.category.category_name for rule in rules})
+        with _matchers_lock:
+            _matchers[user_id] = matcher
+        return matcher
+
+    @staticmethod
+    def invalidate(user_id: Optional[int] = None) -> None:
+        """Drop compiled matchers so they are rebuilt from the database"""
+        with _matchers_lock:
+            if user_id is None:
+                _matchers.clear()
+            else:
+                _matchers.pop(user_id, None)
+
+    @staticmethod
+    def categorize_lines(db: Session, user_id: int, prompt: str) -> Dict[str, Any]:
+        """Resolve statement lines from known merchants locally
+
+        Returns one aggregated entry per category for the resolved lines, the
+        prompt with those lines removed, and how many lines were resolved.
+        """
+        try:
+            matcher = MerchantCategoryService.get_matcher(db, user_id)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+        if matcher.size == 0:
+            return {"entries": [], "remaining_prompt": prompt, "resolved_lines": 0}
+
+        by_category: Dict[str, Dict[str, Any]] = {}
+        remaining = []
+        resolved_lines = 0
+        for line in prompt.splitlines():
+            amount = _parse_amount(line)
+            match = matcher.match(line) if amount is not None else None
+            if match is None:
+                remaining.append(line)
+                continue
+
+            merchant, category = match
+            resolved_lines += 1
+            group = by_category.setdefault(category, {"amount": 0.0, "parts": [], "merchants": []})
+            group["amount"] += amount
+            group["parts"].append(f"'{merchant}' (${amount:.2f})")
+            if merchant not in group["merchants"]:
+                group["merchants"].append(merchant)
+
+        entries = []
+        for category, group in by_category.items():
+            total = round(group["amount"], 2)
+            notes = f"Local: {group['parts'][0]}" if len(group["parts"]) == 1 else f"Local sum: {' + '.join(group['parts'])} = ${total:.2f}"
+            entries.append({
+                "category": category,
+                "amount": total,
+                "notes": notes,
+                "merchants": group["merchants"]
+            })
+
+        return {"entries": entries, "remaining_prompt": "\n".join(remaining), "resolved_lines": resolved_lines}
+
+    @staticmethod
+    def learn_merchants(db: Session, user_id: int, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Record merchant-to-category mappings from entries the user accepted"""
+        try:
+            categories = {cat.category_name: cat.id for cat in db.query(DBSpendingCategory).all()}
+
+            mappings: Dict[str, int] = {}
+            for entry in entries:
+                if entry.get("category") == OTHERS_CATEGORY:
+                    # The model's fallback, not a choice worth repeating without it
+                    continue
+                category_id = categories.get(entry.get("category"))
+                if category_id is None:
+                    # Unknown categories carry no useful signal
+                    continue
+                for merchant in entry.get("merchants") or []:
+                    key = normalize_merchant(merchant)
+                    if key:
+                        mappings[key] = category_id
+
+            if not mappings:
+                return {"learned": 0}
+
+            existing = {
+                rule.merchant: rule
+                for rule in db.query(DBMerchantCategory).filter(
+                    DBMerchantCategory.user_id == user_id,
+                    DBMerchantCategory.merchant.in_(list(mappings.keys()))
+                ).all()
+            }
+            for merchant, category_id in mappings.items():
+                rule = existing.get(merchant)
+                if rule is None:
+                    db.add(DBMerchantCategory(user_id=user_id, merchant=merchant, category_id=category_id, hit_count=1))
+                elif rule.category_id == category_id:
+                    rule.hit_count += 1
+                else:
+                    # The user recategorized this merchant - the latest choice wins
+                    rule.category_id = category_id
+                    rule.hit_count = 1
+
+            invalidation_bus.publish(db, MERCHANT_MATCHERS, user_id)
+            db.commit()
+            return {"learned": len(mappings)}
+        except HTTPException:
+            raise
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"Failed to learn merchant categories: {str(e)}")
+
+    @staticmethod
+    def get_merchant_rules(db: Session, user_id: int) -> List[Dict[str, Any]]:
+        """Get a user's merchant-to-category rules"""
+        try:
+            rules = db.query(DBMerchantCategory).options(joinedload(DBMerchantCategory.category)).filter(
+                DBMerchantCategory.user_id == user_id
+            ).order_by(DBMerchantCategory.hit_count.desc()).all()
+
+            return [
+                {
+                    "id": rule.id,
+                    "merchant": rule.merchant,
+                    "category_id": rule.category_id,
+                    "category": rule.category.category_name,
+                    "hit_count": rule.hit_count,
+                    "created_at": rule.created_at,
+                    "updated_at": rule.updated_at
+                }
+                for rule in rules
+            ]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    @staticmethod
+    def delete_merchant_rule(db: Session, rule_id: int, user_id: int) -> Dict[str, str]:
+        """Delete one of the user's merchant rules"""
+        try:
+            rule = db.query(DBMerchantCategory).filter(
+                DBMerchantCategory.id == rule_id,
+                DBMerchantCategory.user_id == user_id
+            ).first()
+
+            if not rule:
+                raise HTTPException(status_code=404, detail="Merchant rule not found")
+
+            db.delete(rule)
+            invalidation_bus.publish(db, MERCHANT_MATCHERS, user_id)
+            db.commit()
+
+            return {"message": "Merchant rule deleted successfully"}
+        except HTTPException:
+            raise
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"Failed to delete merchant rule: {str(e)}")
+
+
+invalidation_bus.subscribe(MERCHANT_MATCHERS, MerchantCategoryService.invalidate)
@@ -0,0 +1,79 @@
+"""
+Aho-Corasick matcher for known merchant names.
+
+Compiles a user's merchant-to-category index into an automaton once, so each
+statement line is matched against every known merchant in a single pass over
+the line instead of one substring search per merchant.
+"""
+import re
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+
+
+def normalize_merchant(text: str) -> str:
+    """Uppercase and collapse punctuation/whitespace so 'Trader Joe's #552' ~ 'TRADER JOE S 552'"""
+    return " ".join(_NON_ALNUM.sub(" ", text.upper()).split())
+
+
+class MerchantMatcher:
+    def __init__(self, merchants: Dict[str, str]):
+        """Build the automaton from a {merchant: category_name} mapping"""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[Tuple[str, str]]] = [None]  # Merchant ending at each state
+        self.size = 0
+
+        for merchant, category in merchants.items():
+            key = normalize_merchant(merchant)
+            if key:
+                self._add(key, category)
+                self.size += 1
+        self._build_failure_links()
+
+    def _add(self, key: str, category: str) -> None:
+        state = 0
+        for char in key:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            state = next_state
+        self._output[state] = (key, category)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+
+    def match(self, text: str) -> Optional[Tuple[str, str]]:
+        """Return (merchant, category) for the longest known merchant in text, if any"""
+        normalized = f" {normalize_merchant(text)} "
+        best: Optional[Tuple[str, str]] = None
+        state = 0
+        for index, char in enumerate(normalized):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+
+            # Walk the suffix chain: every merchant ending at this position
+            candidate = state
+            while candidate:
+                found = self._output[candidate]
+                if found and (best is None or len(found[0]) > len(best[0])):
+                    # Only accept whole-word matches, e.g. 'UBER' must not match 'UBEREATS'
+                    start = index - len(found[0]) + 1
+                    if normalized[start - 1] == " " and normalized[index + 1] == " ":
+                        best = found
+                candidate = self._fail[candidate]
+        return best
@@ -0,0 +1,187 @@
+"""
+Prompt assembly for the AI assistant and chatbot.
+
+Templates are dedented and compiled once at import. The rendered extraction
+system instruction is cached per category list, and is sent only as the
+system instruction rather than repeated in the request contents. User input
+is fitted to a token budget before it is sent, compacting and then
+truncating long pasted statements.
+"""
+import re
+import textwrap
+import threading
+from collections import OrderedDict
+from string import Template
+from typing import Any, Dict, List, Tuple
+
+from config import AI_PROMPT_TOKEN_BUDGET, CHAT_MESSAGE_TOKEN_BUDGET
+from services.chat_history import estimate_tokens, CHARS_PER_TOKEN
+
+EXTRACTION_SYSTEM_TEMPLATE = Template(textwrap.dedent("""\
+    You are an AI assistant that extracts expense information from credit card statements and receipts.
+
+    IMPORTANT: You must use ONLY these exact category names from the database:
+    $categories
+
+    If an expense doesn't match any of these categories, categorize it as "Others".
+
+    Analyze the provided text and images to identify expense entries. For each expense found, extract:
+    - Category (MUST be one of the exact categories listed above, or "Others" if no match)
+    - Amount (as a number)
+    - Year and month if mentioned in the text/image
+    - Notes explaining how the amount was calculated from the user input
+    - Merchants: the merchant names from the input that make up the amount
+
+    Aggregate the "Others" category into one entry. In the notes field, explain how you calculated
+    the amount from the input.
+
+    Return your response as a valid JSON array with this exact structure:
+    [
+        {
+            "category": "string (must be one of the exact categories listed above)",
+            "amount": number,
+            "year": number (optional),
+            "month": number (optional, 1-12),
+            "notes": "string explaining how this amount was calculated from the input",
+            "merchants": ["merchant names included in this entry (optional)"]
+        }
+    ]
+
+    Guidelines:
+    - If no year/month is mentioned, omit those fields
+    - List merchant names as they appear in the input; omit merchants if there are none
+    - Categories MUST be exact matches from the provided list, or "Others"
+    - Amounts can be positive or negative numbers (negative for credits/refunds)
+    - Include both expenses (positive) and credits/refunds (negative)
+    - In the notes field, explain how you calculated the amount from the input
+    - If you're unsure about any field, omit it rather than guess
+    - Sum up multiple small expenses into single entries when appropriate
+    - Notes should be short, but concise and to the point
+
+    Example Notes:
+    - Bad note: Extracted from the 'Shopping' row in the provided spending breakdown.
+    - Bad note: Calculated by summing 'Personal' ($$13.42) and 'Home' ($$11.67) expenses, as these categories are not in the allowed list.
+    - Good note: From 'Shopping' row.
+    - Good note: Sum: 'Personal' ($$13.42) + 'Home' ($$11.67) = $$25.09.
+    """))
+
+EXTRACTION_USER_TEMPLATE = Template("User input: $prompt")
+
+PAGE_USER_TEMPLATE = Template("User input: $prompt\n\nThis is page $page of $total of the statement.")
+
+CHAT_SYSTEM_PROMPT = textwrap.dedent("""\
+    You are a helpful AI assistant for a personal life tracking application.
+
+    Your role is to help users with:
+    - General questions about their personal data
+    - Guidance on using the application features
+    - Simple calculations and analysis
+    - Friendly conversation and support
+
+    Keep your responses:
+    - Helpful and informative
+    - Conversational and friendly
+    - Concise but thorough (aim for 2-3 sentences)
+    - Focused on personal life tracking topics when relevant
+
+    You can help with questions about expenses, fitness tracking, travel, weather, and general life management topics.
+
+    When the user asks about their own spending, call the provided tools to look up totals instead of guessing.
+    Tool amounts are in dollars and cover only this user's ledger.
+
+    ALWAYS add [eom] at the end of your response, in a new line.
+
+    IMPORTANT: Keep responses concise and complete. Avoid long, rambling responses.
+    """)
+
+_INNER_WHITESPACE = re.compile(r"[ \t]{2,}")
+_HAS_DIGIT = re.compile(r"\d")
+
+# Rendered system prompts per category list; category changes produce a new key
+_SYSTEM_PROMPT_CACHE_SIZE = 32
+_system_prompts: "OrderedDict[Tuple[str, ...], str]" = OrderedDict()
+_system_prompts_lock = threading.Lock()
+
+
+def render_extraction_system_prompt(category_names: List[str]) -> str:
+    """Render the extraction system instruction, cached per category list"""
+    key = tuple(category_names)
+    with _system_prompts_lock:
+        prompt = _system_prompts.get(key)
+        if prompt is not None:
+            _system_prompts.move_to_end(key)
+            return prompt
+
+    prompt = EXTRACTION_SYSTEM_TEMPLATE.substitute(categories=", ".join(category_names))
+    with _system_prompts_lock:
+        _system_prompts[key] = prompt
+        while len(_system_prompts) > _SYSTEM_PROMPT_CACHE_SIZE:
+            _system_prompts.popitem(last=False)
+    return prompt
+
+
+def fit_to_budget(text: str, token_budget: int, drop_lines_without_digits: bool = True) -> Tuple[str, Dict[str, Any]]:
+    """Fit user input into a token budget
+
+    Tries progressively lossier steps and stops as soon as the text fits:
+    collapse repeated whitespace and blank lines, optionally drop lines
+    without any digits (headers, marketing copy - statement rows carry
+    amounts or dates), then keep the leading lines that fit and note how
+    many were cut.
+    """
+    stats = {"original_tokens": estimate_tokens(text), "compacted": False, "truncated_lines": 0}
+    if stats["original_tokens"] <= token_budget:
+        stats["tokens"] = stats["original_tokens"]
+        return text, stats
+
+    stats["compacted"] = True
+    lines = [_INNER_WHITESPACE.sub(" ", line).strip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    if drop_lines_without_digits and estimate_tokens("\n".join(lines)) > token_budget:
+        lines = [line for line in lines if _HAS_DIGIT.search(line)]
+
+    compacted = "\n".join(lines)
+    if estimate_tokens(compacted) > token_budget:
+        kept: List[str] = []
+        used = 0
+        for line in lines:
+            line_tokens = estimate_tokens(line) + 1  # Newline
+            if used + line_tokens > token_budget:
+                break
+            kept.append(line)
+            used += line_tokens
+        if not kept and lines:
+            # One enormous line - cut it at the budget
+            kept = [lines[0][:token_budget * CHARS_PER_TOKEN]]
+        stats["truncated_lines"] = len(lines) - len(kept)
+        compacted = "\n".join(kept)
+        if stats["truncated_lines"]:
+            compacted += f"\n[{stats['truncated_lines']} more lines truncated]"
+
+    stats["tokens"] = estimate_tokens(compacted)
+    return compacted, stats
+
+
+def build_extraction_prompt(category_names: List[str], prompt: str) -> Dict[str, Any]:
+    """Build the system instruction and user content for an extraction request"""
+    system_prompt = render_extraction_system_prompt(category_names)
+    user_input, stats = fit_to_budget(prompt, AI_PROMPT_TOKEN_BUDGET)
+    user_content = EXTRACTION_USER_TEMPLATE.substitute(prompt=user_input)
+    stats["system_tokens"] = estimate_tokens(system_prompt)
+    return {
+        "system_prompt": system_prompt,
+        "user_content": user_content,
+        "stats": stats,
+    }
+
+
+def build_page_content(prompt: str, page: int, total: int) -> str:
+    """Build the user content for one page of a multi-page extraction job"""
+    user_input, _ = fit_to_budget(prompt, AI_PROMPT_TOKEN_BUDGET)
+    return PAGE_USER_TEMPLATE.substitute(prompt=user_input, page=page, total=total)
+
+
+def fit_chat_message(message: str) -> str:
+    """Fit a chat message into the per-message token budget"""
+    fitted, _ = fit_to_budget(message, CHAT_MESSAGE_TOKEN_BUDGET, drop_lines_without_digits=False)
+    return fitted
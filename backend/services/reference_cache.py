@@ -0,0 +1,109 @@
+"""
+In-process cache for small, rarely changing reference data: spending
+categories, credit cards, user names and archived ledger years.
+
+Entries are grouped (one group per table) and each group carries a version
+that is bumped whenever the invalidation bus evicts the group - after a
+committed create/update/delete in this worker or a NOTIFY from another. A
+load that raced with an invalidation is returned to its caller but not
+stored, so a stale read never outlives the write. Every entry carries its
+serialized JSON body, so hits skip serialization, and an ETag derived from
+it, letting routes answer revalidations with 304.
+"""
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+from services import invalidation_bus
+from services.json_encoding import dumps
+
+SPENDING_CATEGORIES = "spending_categories"
+CREDIT_CARDS = "credit_cards"
+USERS = "users"
+LEDGER_ARCHIVES = "ledger_archives"
+
+# Browsers keep the body but must revalidate, so edits show up immediately
+CACHE_CONTROL = "private, no-cache"
+
+
+class CachedReference(NamedTuple):
+    value: Any
+    body: bytes
+    etag: str
+
+
+def _cached_reference(value: Any) -> CachedReference:
+    body = dumps(value)
+    return CachedReference(value=value, body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+class ReferenceCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._entries: Dict[Tuple[str, Hashable], CachedReference] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, group: str, scope: Hashable, loader: Callable[[], Any]) -> CachedReference:
+        """Get a cached value, loading and storing it on a miss"""
+        key = (group, scope)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+            version = self._versions.get(group, 0)
+
+        value = loader()
+        cached = _cached_reference(value)
+        with self._lock:
+            # Skip the store if the group was invalidated while loading
+            if self._versions.get(group, 0) == version:
+                self._entries[key] = cached
+        return cached
+
+    def invalidate(self, *groups: str) -> None:
+        """Drop every entry in the given groups"""
+        with self._lock:
+            for group in groups:
+                self._versions[group] = self._versions.get(group, 0) + 1
+                for key in [key for key in self._entries if key[0] == group]:
+                    del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for group in list(self._versions):
+                self._versions[group] += 1
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "versions": dict(self._versions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+def reference_response(request: Request, cached: CachedReference) -> Response:
+    """Return a cached value with its ETag, or 304 if the client already has it"""
+    headers = {"ETag": cached.etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match: Optional[str] = request.headers.get("if-none-match")
+    if if_none_match and cached.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+# Shared by every request in this process
+reference_cache = ReferenceCache()
+
+for _group in (SPENDING_CATEGORIES, CREDIT_CARDS, USERS, LEDGER_ARCHIVES):
+    invalidation_bus.subscribe(_group, lambda key, group=_group: reference_cache.invalidate(group))
@@ -0,0 +1,118 @@
+"""
+Single-flight coalescing of identical concurrent GET requests.
+
+When the dashboard opens, several components and tabs fire the same reads at
+once. The first request for a key runs the query (in the threadpool, off the
+event loop) and every identical request that arrives while it is in flight
+awaits the same result instead of running its own query and serialization.
+
+A key is (route, normalized query string, user scope, data version). The data
+version counts invalidation-bus evictions of the groups the route reads, so a
+request that starts after a write has committed never joins a flight that
+started before it. Nothing is kept once a flight finishes - this only merges
+requests that overlap in time.
+
+A flight outlives the request that started it when that client disconnects,
+so the loader gets a session of the flight's own (the snapshot's while the
+database circuit is open, as with get_db) rather than the leader's, which
+dependency teardown closes.
+"""
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import REQUEST_COALESCING_ENABLED
+from database.database import get_request_session
+from services import invalidation_bus
+from services.change_feed import LEDGER_CHANGES
+from services.json_encoding import dumps
+from services.reference_cache import CREDIT_CARDS, SPENDING_CATEGORIES, USERS
+
+# Ledger rows embed user names, and card/category changes reach them as ledger events
+LEDGER_GROUPS = (LEDGER_CHANGES, USERS)
+
+
+def _load(request: Request, loader: Callable[[Session], Any]) -> Any:
+    db = get_request_session(request)
+    try:
+        return loader(db)
+    finally:
+        db.close()
+
+
+class RequestCoalescer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def bump(self, group: str) -> None:
+        """Start a new data version; later requests won't join flights from before it"""
+        with self._lock:
+            self._versions[group] = self._versions.get(group, 0) + 1
+
+    def key(self, request: Request, scope: Hashable, groups: Tuple[str, ...]) -> Hashable:
+        """Coalescing key for a request reading the given invalidation groups"""
+        route = request.scope.get("route")
+        query = tuple(sorted(request.query_params.multi_items()))
+        with self._lock:
+            versions = tuple(self._versions.get(group, 0) for group in groups)
+        # Snapshot reads must not be shared with live ones, or across snapshot copies
+        source = getattr(request.state, "snapshot_taken_at", None)
+        return (request.method, route.path if route else request.url.path, query, scope, source, versions)
+
+    async def run(self, request: Request, key: Hashable, loader: Callable[[Session], Any]) -> Any:
+        """Run loader on a new session in the threadpool, or await the identical call already in flight"""
+        if not REQUEST_COALESCING_ENABLED:
+            return await run_in_threadpool(_load, request, loader)
+
+        flight = self._flights.get(key)
+        if flight is not None and flight.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            flight = asyncio.ensure_future(run_in_threadpool(_load, request, loader))
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._finish(key, done))
+        # Shielded: a disconnecting client must not cancel the query for the others
+        return await asyncio.shield(flight)
+
+    def _finish(self, key: Hashable, flight: asyncio.Task) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # Mark the exception retrieved when nobody was left awaiting it
+            flight.exception()
+
+    async def json_response(self, request: Request, scope: Hashable, groups: Tuple[str, ...], loader: Callable[[Session], Any]) -> Response:
+        """Coalesced JSON response; the body is serialized once per flight"""
+        body = await self.run(
+            request,
+            self.key(request, scope, groups),
+            lambda db: dumps(loader(db))
+        )
+        return Response(content=body, media_type="application/json")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            versions = dict(self._versions)
+        return {
+            "enabled": REQUEST_COALESCING_ENABLED,
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "versions": versions,
+        }
+
+
+# Shared by every request in this process
+request_coalescer = RequestCoalescer()
+
+for _group in (LEDGER_CHANGES, CREDIT_CARDS, SPENDING_CATEGORIES, USERS):
+    invalidation_bus.subscribe(_group, lambda key, group=_group: request_coalescer.bump(group))
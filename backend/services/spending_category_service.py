@@ -2,28 +2,51 @@ from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from database.db_models import SpendingCategory as DBSpendingCategory, LedgerEntry as DBLedgerEntry
 from database.models import CreateSpendingCategoryRequest, UpdateSpendingCategoryRequest, SpendingCategory
+from services.merchant_category_service import MERCHANT_MATCHERS
+from services.reference_cache import reference_cache, CachedReference, SPENDING_CATEGORIES
+from services import invalidation_bus
+from services.change_feed import publish_change
+from services.ledger_archive_service import LedgerArchiveService
 from fastapi import HTTPException
 
+def _load_spending_categories(db: Session) -> List[SpendingCategory]:
+    try:
+        categories = db.query(DBSpendingCategory).all()
+        
+        # Convert to Pydantic models for response
+        result = []
+        for category in categories:
+            result.append(SpendingCategory(
+                id=category.id,
+                category_name=category.category_name,
+                created_at=category.created_at,
+                updated_at=category.updated_at
+            ))
+        
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 class SpendingCategoryService:
     @staticmethod
-    def get_spending_categories(db: Session) -> List[SpendingCategory]:
-        """Get all spending categories"""
-        try:
-            categories = db.query(DBSpendingCategory).all()
-            
-            # Convert to Pydantic models for response
-            result = []
-            for category in categories:
-                result.append(SpendingCategory(
-                    id=category.id,
-                    category_name=category.category_name,
-                    created_at=category.created_at,
-                    updated_at=category.updated_at
-                ))
-            
-            return result
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    def get_spending_categories(db: Session) -> CachedReference:
+        """Get all spending categories and their ETag from the reference cache"""
+        return reference_cache.get(SPENDING_CATEGORIES, "all", lambda: _load_spending_categories(db))
+
+    @staticmethod
+    def get_category_names(db: Session) -> List[str]:
+        """Get all spending category names from the reference cache"""
+        return reference_cache.get(
+            SPENDING_CATEGORIES, "names",
+            lambda: [category.category_name for category in _load_spending_categories(db)]
+        ).value
+
+    @staticmethod
+    def invalidate(db: Session) -> None:
+        """Drop cached categories and everything derived from their names once db commits"""
+        invalidation_bus.publish(db, SPENDING_CATEGORIES)
+        # Compiled merchant matchers embed category names
+        invalidation_bus.publish(db, MERCHANT_MATCHERS)
 
     @staticmethod
     def create_spending_category(db: Session, category_data: CreateSpendingCategoryRequest) -> SpendingCategory:
@@ -43,16 +66,21 @@ class SpendingCategoryService:
             )
             
             db.add(db_category)
-            db.commit()
+            db.flush()
             db.refresh(db_category)
             
             # Return the created category
-            return SpendingCategory(
+            result = SpendingCategory(
                 id=db_category.id,
                 category_name=db_category.category_name,
                 created_at=db_category.created_at,
                 updated_at=db_category.updated_at
             )
+            SpendingCategoryService.invalidate(db)
+            publish_change(db, "spending_category", "created", result.model_dump())
+            db.commit()
+            
+            return result
         except HTTPException:
             raise
         except Exception as e:
@@ -83,7 +111,7 @@ class SpendingCategoryService:
 
     @staticmethod
     def update_spending_category(db: Session, category_id: int, category_update: UpdateSpendingCategoryRequest) -> Dict[str, Any]:
-        """Update a spending category and update all related ledger entries"""
+        """Update a spending category"""
         try:
             # Check if new name already exists
             existing_category = db.query(DBSpendingCategory).filter(
@@ -102,34 +130,25 @@ class SpendingCategoryService:
             if not db_category:
                 raise HTTPException(status_code=404, detail="Spending category not found")
             
-            # Store the old category name for updating ledger entries
-            old_category_name = db_category.category_name
-            new_category_name = category_update.category_name
-            
-            # Update the category
-            db_category.category_name = new_category_name
+            # Update the category; ledger entries reference it by id and pick up the new name
+            db_category.category_name = category_update.category_name
+            db.flush()
+            db.refresh(db_category)
             
-            # Update all related ledger entries efficiently
-            # Use a single UPDATE query instead of iterating
-            result = db.query(DBLedgerEntry).filter(
-                DBLedgerEntry.category == old_category_name
-            ).update(
-                {DBLedgerEntry.category: new_category_name},
-                synchronize_session=False
+            category = SpendingCategory(
+                id=db_category.id,
+                category_name=db_category.category_name,
+                created_at=db_category.created_at,
+                updated_at=db_category.updated_at
             )
-            updated_count = result
-            
+            SpendingCategoryService.invalidate(db)
+            # Clients relabel their ledger entries from this event
+            publish_change(db, "spending_category", "updated", category.model_dump())
             db.commit()
-            db.refresh(db_category)
             
             return {
-                "category": SpendingCategory(
-                    id=db_category.id,
-                    category_name=db_category.category_name,
-                    created_at=db_category.created_at,
-                    updated_at=db_category.updated_at
-                ),
-                "message": f"Category updated successfully. {updated_count} ledger entries were also updated."
+                "category": category,
+                "message": "Category updated successfully."
             }
         except HTTPException:
             raise
@@ -141,7 +160,7 @@ class SpendingCategoryService:
 
     @staticmethod
     def delete_spending_category(db: Session, category_id: int) -> Dict[str, str]:
-        """Delete a spending category - prevents deletion if related ledger entries exist"""
+        """Delete a spending category - prevents deletion if related ledger entries exist, archived or not"""
         try:
             db_category = db.query(DBSpendingCategory).filter(
                 DBSpendingCategory.id == category_id
@@ -150,10 +169,10 @@ class SpendingCategoryService:
             if not db_category:
                 raise HTTPException(status_code=404, detail="Spending category not found")
             
-            # Check for related ledger entries
+            # Check for related ledger entries, including years removed to the archive
             related_entries = db.query(DBLedgerEntry).filter(
-                DBLedgerEntry.category == db_category.category_name
-            ).count()
+                DBLedgerEntry.category_id == db_category.id
+            ).count() + LedgerArchiveService.count_references(db, "category_id", db_category.id)
             
             if related_entries > 0:
                 raise HTTPException(
@@ -162,6 +181,8 @@ class SpendingCategoryService:
                 )
             
             db.delete(db_category)
+            SpendingCategoryService.invalidate(db)
+            publish_change(db, "spending_category", "deleted", {"id": db_category.id})
             db.commit()
             
             return {"message": "Spending category deleted successfully"}
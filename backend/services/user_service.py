@@ -1,9 +1,11 @@
 from sqlalchemy.orm import Session
-from database.db_models import User, UserRole
+from database.db_models import User, UserRole, from_cents
 from database.models import User as UserSchema
 from typing import Optional, List
 import json
 from config import DATABASE_URL
+from services.reference_cache import reference_cache, CachedReference, USERS, CREDIT_CARDS
+from services import invalidation_bus
 
 class UserService:
     @staticmethod
@@ -70,6 +72,7 @@ class UserService:
                 role=role
             )
             db.add(db_user)
+            invalidation_bus.publish(db, USERS)
             db.commit()
             db.refresh(db_user)
             print(f"User created successfully: {db_user.email} (ID: {db_user.id})")
@@ -93,6 +96,9 @@ class UserService:
         if "picture_url" in user_data:
             db_user.picture_url = user_data["picture_url"]
         
+        # Credit card listings embed the owner's name
+        invalidation_bus.publish(db, USERS)
+        invalidation_bus.publish(db, CREDIT_CARDS)
         db.commit()
         db.refresh(db_user)
         return db_user
@@ -126,7 +132,7 @@ class UserService:
         ledger_count = len(user.ledger_entries)
         
         # Calculate total expenses
-        total_expenses = sum(entry.amount for entry in user.ledger_entries)
+        total_expenses = from_cents(sum(entry.amount_cents for entry in user.ledger_entries))
         
         return {
             "id": user.id,
@@ -148,6 +154,14 @@ class UserService:
         """Get all users (admin only)"""
         return db.query(User).order_by(User.created_at.desc()).all()
     
+    @staticmethod
+    def get_user_names(db: Session) -> CachedReference:
+        """Get id, name and email of every user for dropdowns, with its ETag"""
+        return reference_cache.get(USERS, "names", lambda: [
+            {"id": user.id, "name": user.name, "email": user.email}
+            for user in UserService.get_all_users(db)
+        ])
+    
     @staticmethod
     def create_user_with_role(db: Session, user_data: dict, role: UserRole) -> User:
         """Create a new user with specified role"""
@@ -163,6 +177,7 @@ class UserService:
             role=role
         )
         db.add(db_user)
+        invalidation_bus.publish(db, USERS)
         db.commit()
         db.refresh(db_user)
         return db_user
@@ -196,6 +211,8 @@ class UserService:
         # Note: No need to update ledger entries since they now use user_id
         # The user_id relationship will automatically maintain referential integrity
         
+        invalidation_bus.publish(db, USERS)
+        invalidation_bus.publish(db, CREDIT_CARDS)
         db.commit()
         db.refresh(db_user)
         return db_user
@@ -234,6 +251,7 @@ class UserService:
             
             # If no related data, safe to delete
             db.delete(db_user)
+            invalidation_bus.publish(db, USERS)
             db.commit()
             return {"success": True, "message": "User deleted successfully"}
             
@@ -0,0 +1,107 @@
+"""
+AIAssistantService extraction with locally resolved merchants, against an
+offline fake model client and without a database.
+"""
+import asyncio
+import io
+import json
+
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+import services.ai_assistant_service as ai_assistant_service
+from services.ai_assistant_service import AIAssistantService
+from services.ai_result_cache import TTLCache
+from services.llm_client import FakeModelClient, InstrumentedModelClient
+from services.merchant_category_service import MerchantCategoryService
+from services.merchant_matcher import MerchantMatcher
+
+USER_ID = 7
+RECEIPT_ENTRY = {"category": "Travel", "amount": 42.0, "year": 2025, "month": 3, "notes": "Taxi receipt"}
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Fake model that reads one Travel entry off any image, and a matcher that knows Starbucks"""
+    backend = FakeModelClient(script={"default": json.dumps([RECEIPT_ENTRY])})
+    client = InstrumentedModelClient(backend, max_retries=0, retry_backoff=0)
+    monkeypatch.setattr(ai_assistant_service, "get_model_client", lambda: client)
+    monkeypatch.setattr(AIAssistantService, "get_available_categories", staticmethod(lambda db: ["Food", "Travel"]))
+    monkeypatch.setattr(MerchantCategoryService, "get_matcher", staticmethod(lambda db, user_id: MerchantMatcher({"Starbucks": "Food"})))
+
+    async def decode_images(spooled):
+        return [f"<image {item.digest[:8]}>" for item in spooled], {}
+
+    monkeypatch.setattr(ai_assistant_service, "decode_images", decode_images)
+    monkeypatch.setattr(ai_assistant_service, "result_cache", TTLCache(max_entries=16, ttl_seconds=60))
+    return backend
+
+
+def receipt():
+    return UploadFile(io.BytesIO(b"receipt image bytes"), filename="receipt.png", headers=Headers({"content-type": "image/png"}))
+
+
+def process(prompt, images):
+    return asyncio.run(AIAssistantService.process_expense_with_ai(None, prompt, images, user_id=USER_ID))
+
+
+def test_text_resolved_locally_skips_the_model(backend):
+    response = process("STARBUCKS #123 $5.25", [])
+
+    assert backend.calls == 0
+    assert response.lines_resolved_locally == 1
+    assert [(entry.category, entry.amount) for entry in response.entries] == [("Food", 5.25)]
+
+
+def test_cached_resubmission_with_images_keeps_image_entries(backend):
+    prompt = "STARBUCKS #123 $5.25"
+    first = process(prompt, [receipt()])
+    second = process(prompt, [receipt()])
+
+    # The second request is served from the result cache, not skipped as all-local
+    assert backend.calls == 1
+    assert second.cached
+    expected = [("Travel", 42.0), ("Food", 5.25)]
+    assert [(entry.category, entry.amount) for entry in first.entries] == expected
+    assert [(entry.category, entry.amount) for entry in second.entries] == expected
+
+
+def stream(prompt, images):
+    async def collect():
+        slots = {}
+        events = await AIAssistantService.start_expense_stream(None, prompt, images, user_id=USER_ID)
+        async for chunk in events:
+            payload = json.loads(chunk[len("data: "):])
+            if payload["type"] == "entry":
+                slots[payload["index"]] = payload["entry"]
+            elif payload["type"] == "error":
+                raise AssertionError(payload["detail"])
+        return [slots[index] for index in sorted(slots)]
+    return asyncio.run(collect())
+
+
+def test_stream_merges_like_the_non_stream_path(backend, monkeypatch):
+    # Two model entries for the same category and period stay separate; the local one folds into the first
+    backend.script = {"default": json.dumps([
+        {"category": "Food", "amount": 10.0, "year": 2025, "month": 3, "notes": "Groceries"},
+        {"category": "Food", "amount": 20.0, "year": 2025, "month": 3, "notes": "Restaurant"},
+    ])}
+    local = {"category": "Food", "amount": 5.25, "year": 2025, "month": 3, "notes": "Local: 'STARBUCKS' ($5.25)", "merchants": ["STARBUCKS"]}
+    monkeypatch.setattr(MerchantCategoryService, "categorize_lines", staticmethod(
+        lambda db, user_id, prompt: {"entries": [local], "remaining_prompt": "RESTAURANT $20.00", "resolved_lines": 1}
+    ))
+    prompt = "STARBUCKS #123 $5.25\nRESTAURANT $20.00"
+
+    processed = process(prompt, [])
+    ai_assistant_service.result_cache.clear()
+    streamed = stream(prompt, [])
+
+    def summary(entries):
+        return sorted((entry["category"], entry["amount"], entry["notes"]) for entry in entries)
+
+    assert backend.calls == 2
+    assert summary(entry.model_dump() for entry in processed.entries) == summary(streamed) == [
+        ("Food", 15.25, "Groceries; Local: 'STARBUCKS' ($5.25)"),
+        ("Food", 20.0, "Restaurant"),
+    ]
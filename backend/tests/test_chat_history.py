@@ -0,0 +1,118 @@
+"""
+ChatHistoryManager against an offline fake model client: budget accounting,
+compaction into the rolling summary, and summarization failures.
+"""
+import asyncio
+import threading
+
+from services.chat_history import ChatHistoryManager, estimate_tokens
+from services.llm_client import FakeModelClient, InstrumentedModelClient
+
+
+class RecordingModelClient(FakeModelClient):
+    """Fake backend that remembers what it was asked to summarize and on which thread"""
+
+    def __init__(self, summary: str = "User asked about groceries.", **kwargs):
+        super().__init__(script={"default": summary}, **kwargs)
+        self.prompts = []
+        self.threads = []
+
+    def generate(self, model, contents, config=None):
+        self.prompts.append(contents[0])
+        self.threads.append(threading.current_thread())
+        return super().generate(model, contents, config)
+
+
+def make_history(backend, token_budget=40, keep_recent_turns=2):
+    client = InstrumentedModelClient(backend, max_retries=0, retry_backoff=0)
+    return ChatHistoryManager(client, "fake-model", token_budget=token_budget, keep_recent_turns=keep_recent_turns)
+
+
+def exchange(index):
+    # 40 characters each way, 10 approximate tokens per turn
+    return f"question {index:02d} ".ljust(40, "q"), f"answer {index:02d} ".ljust(40, "a")
+
+
+def test_history_under_budget_is_sent_verbatim():
+    backend = RecordingModelClient()
+    history = make_history(backend, token_budget=1000)
+    history.add_exchange(*exchange(1))
+
+    contents = history.build_contents("next")
+
+    assert backend.calls == 0
+    assert history.total_tokens == 2 * estimate_tokens(exchange(1)[0])
+    assert [content["role"] for content in contents] == ["user", "model", "user"]
+    assert contents[-1]["parts"][0]["text"] == "next"
+
+
+def test_over_budget_compacts_older_turns_into_summary():
+    backend = RecordingModelClient()
+    history = make_history(backend, token_budget=40, keep_recent_turns=2)
+    for index in range(1, 3):
+        history.add_exchange(*exchange(index))
+    assert backend.calls == 0
+
+    history.add_exchange(*exchange(3))
+
+    assert backend.calls == 1
+    assert history.compactions == 1
+    assert history.summary == "User asked about groceries."
+    assert [turn.content for turn in history.turns] == list(exchange(3))
+    assert exchange(1)[0] in backend.prompts[0] and exchange(2)[1] in backend.prompts[0]
+    assert exchange(3)[0] not in backend.prompts[0]
+    assert history.total_tokens <= history.token_budget
+
+
+def test_summary_is_sent_first_and_carried_into_the_next_compaction():
+    backend = RecordingModelClient()
+    history = make_history(backend, token_budget=40, keep_recent_turns=2)
+    for index in range(1, 6):
+        history.add_exchange(*exchange(index))
+
+    contents = history.build_contents("next")
+
+    # Once a summary exists every further exchange goes over the small budget
+    assert backend.calls == 3
+    assert "Earlier summary: User asked about groceries." in backend.prompts[1]
+    assert contents[0]["parts"][0]["text"] == "Summary of our conversation so far: User asked about groceries."
+    assert contents[1]["role"] == "model"
+    assert [content["parts"][0]["text"] for content in contents[2:]] == [*exchange(5), "next"]
+
+
+def test_failed_summary_drops_old_turns():
+    backend = RecordingModelClient(error_rate=1.0)
+    history = make_history(backend, token_budget=40, keep_recent_turns=2)
+    for index in range(1, 4):
+        history.add_exchange(*exchange(index))
+
+    assert backend.calls == 1
+    assert history.summary == ""
+    assert [turn.content for turn in history.turns] == list(exchange(3))
+    assert history.compactions == 1
+
+
+def test_reset_clears_summary_and_turns():
+    history = make_history(RecordingModelClient())
+    for index in range(1, 4):
+        history.add_exchange(*exchange(index))
+
+    history.reset()
+
+    assert history.summary == "" and history.turns == []
+    assert len(history.build_contents("next")) == 1
+
+
+def test_async_add_exchange_summarizes_off_the_event_loop():
+    backend = RecordingModelClient()
+    history = make_history(backend, token_budget=40, keep_recent_turns=2)
+
+    async def run():
+        for index in range(1, 4):
+            await history.aadd_exchange(*exchange(index))
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+
+    assert history.compactions == 1
+    assert backend.threads and all(thread is not loop_thread for thread in backend.threads)
@@ -0,0 +1,92 @@
+"""
+IncrementalExpenseParser: entries are emitted as their objects complete,
+whatever the chunking, and string contents never confuse the brace count.
+"""
+import json
+
+import pytest
+
+from services.expense_stream_parser import IncrementalExpenseParser
+
+ENTRIES = [
+    {"category": "Food", "amount": 12.5, "notes": "Dinner {with} friends", "merchants": ["Joe's \"Diner\""]},
+    {"category": "Travel", "amount": 40.0, "notes": "Path C:\\trips\\ and a } brace", "merchants": []},
+]
+
+
+def feed_all(parser, chunks):
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items
+
+
+def test_objects_are_emitted_as_soon_as_they_close():
+    parser = IncrementalExpenseParser()
+
+    assert parser.feed('[{"category": "Food", "amount": 1') == []
+    assert parser.feed('}, {"category": "Travel"') == [{"category": "Food", "amount": 1}]
+    assert parser.feed(', "amount": 2}]') == [{"category": "Travel", "amount": 2}]
+    assert parser.done
+
+
+def test_braces_and_escaped_quotes_inside_strings():
+    parser = IncrementalExpenseParser()
+
+    assert parser.feed(json.dumps(ENTRIES)) == ENTRIES
+    assert parser.done
+    assert parser.errors == []
+
+
+def test_code_fence_and_surrounding_text_are_skipped():
+    parser = IncrementalExpenseParser()
+    text = f"Here are the entries:\n```json\n{json.dumps(ENTRIES, indent=2)}\n```\nLet me know if you need more."
+
+    assert parser.feed(text) == ENTRIES
+    assert parser.done
+    # Everything fed is kept for the raw response
+    assert parser.text == text
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_chunks_split_inside_tokens(size):
+    # Small chunks cut through keys, numbers, escape sequences and the fence
+    text = f"```json\n{json.dumps(ENTRIES)}\n```"
+    parser = IncrementalExpenseParser()
+
+    items = feed_all(parser, [text[i:i + size] for i in range(0, len(text), size)])
+
+    assert items == ENTRIES
+    assert parser.done
+
+
+def test_split_between_backslash_and_escaped_quote():
+    raw = json.dumps([{"category": "Food", "amount": 3, "notes": 'say "hi"'}])
+    split = raw.index('\\"') + 1
+    parser = IncrementalExpenseParser()
+
+    assert feed_all(parser, [raw[:split], raw[split:]]) == [{"category": "Food", "amount": 3, "notes": 'say "hi"'}]
+
+
+def test_invalid_object_is_recorded_and_parsing_continues():
+    parser = IncrementalExpenseParser()
+
+    items = parser.feed('[{"category": "Food", "amount": }, {"category": "Travel", "amount": 2}]')
+
+    assert items == [{"category": "Travel", "amount": 2}]
+    assert len(parser.errors) == 1
+
+
+def test_text_after_the_array_is_ignored():
+    parser = IncrementalExpenseParser()
+
+    assert parser.feed('[{"category": "Food", "amount": 1}] [{"category": "Travel", "amount": 2}]') == [{"category": "Food", "amount": 1}]
+    assert parser.feed('{"category": "Other", "amount": 3}') == []
+    assert parser.done
+
+
+def test_truncated_response_is_not_done():
+    parser = IncrementalExpenseParser()
+
+    assert parser.feed('[{"category": "Food", "amount": 1}, {"category": "Tra') == [{"category": "Food", "amount": 1}]
+    assert not parser.done
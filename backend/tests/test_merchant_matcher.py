@@ -0,0 +1,66 @@
+"""
+MerchantMatcher: Aho-Corasick matching of known merchants against statement
+lines, with overlapping patterns, failure links and whole-word matches.
+"""
+import pytest
+
+from services.merchant_matcher import MerchantMatcher, normalize_merchant
+
+
+def test_normalize_merchant():
+    assert normalize_merchant("Trader Joe's #552") == "TRADER JOE S 552"
+    assert normalize_merchant("  amazon.com*MK1 ") == "AMAZON COM MK1"
+    assert normalize_merchant("--") == ""
+
+
+def test_empty_names_are_not_counted():
+    matcher = MerchantMatcher({"Starbucks": "Food", "---": "Food"})
+
+    assert matcher.size == 1
+    assert MerchantMatcher({}).match("STARBUCKS $5.00") is None
+
+
+def test_match_is_normalized():
+    matcher = MerchantMatcher({"Trader Joe's": "Groceries"})
+
+    assert matcher.match("03/14 TRADER JOE'S #552 PORTLAND $45.10") == ("TRADER JOE S", "Groceries")
+
+
+def test_failure_link_reaches_a_pattern_starting_mid_match():
+    # After "TRADER JOE" the automaton must fall back to the "JOE" prefix to find "JOE S PIZZA"
+    matcher = MerchantMatcher({"Trader Joe": "Groceries", "Joe's Pizza": "Restaurants"})
+
+    assert matcher.match("TRADER JOE S PIZZA $10.00") == ("JOE S PIZZA", "Restaurants")
+    assert matcher.match("TRADER JOE $10.00") == ("TRADER JOE", "Groceries")
+    assert matcher.match("JOE S PIZZA $10.00") == ("JOE S PIZZA", "Restaurants")
+
+
+def test_failure_link_after_a_partial_match():
+    # "SHELL OIL" is a dead end at "SHELL " + "G", but "SHELL" itself is still found through the output chain
+    matcher = MerchantMatcher({"Shell Oil": "Gas", "Shell": "Gas Station", "Hell Pizza": "Restaurants"})
+
+    assert matcher.match("SHELL GAS 123 $40.00") == ("SHELL", "Gas Station")
+    assert matcher.match("SHELL OIL 123 $40.00") == ("SHELL OIL", "Gas")
+    # "HELL PIZZA" is found inside "XSHELL PIZZA" through the failure links, but is not a whole word there
+    assert matcher.match("XSHELL PIZZA $9.00") is None
+    assert matcher.match("SHELL HELL PIZZA $9.00") == ("HELL PIZZA", "Restaurants")
+
+
+def test_nested_patterns_prefer_the_longest():
+    matcher = MerchantMatcher({"Air Canada": "Travel", "Canada": "Others", "Canada Dry": "Food"})
+
+    assert matcher.match("AIR CANADA 0142 $320.00") == ("AIR CANADA", "Travel")
+    assert matcher.match("CANADA DRY $3.00") == ("CANADA DRY", "Food")
+    assert matcher.match("CANADA POST $3.00") == ("CANADA", "Others")
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("UBER TRIP $12.00", ("UBER", "Travel")),
+    ("UBER EATS ORDER $25.00", ("UBER EATS", "Food")),
+    ("UBEREATS $25.00", None),
+    ("SUPERUBER $5.00", None),
+])
+def test_only_whole_words_match(line, expected):
+    matcher = MerchantMatcher({"Uber": "Travel", "Uber Eats": "Food"})
+
+    assert matcher.match(line) == expected
@@ -0,0 +1,45 @@
+"""
+Dollar/cent conversion used by every ledger write and total.
+"""
+import pytest
+
+from database.db_models import from_cents, to_cents
+
+
+@pytest.mark.parametrize("amount, cents", [
+    (0, 0),
+    (12.34, 1234),
+    (0.1 + 0.2, 30),
+    (1.005, 101),  # 100.49999... as a binary float, but half up from the decimal text
+    (2.675, 268),
+    (0.004, 0),
+    (0.005, 1),
+    (19.995, 2000),
+    (1234567.89, 123456789),
+])
+def test_to_cents_rounds_half_up(amount, cents):
+    assert to_cents(amount) == cents
+
+
+@pytest.mark.parametrize("amount, cents", [
+    (-12.34, -1234),
+    (-0.005, -1),  # Half away from zero
+    (-1.005, -101),
+    (-0.004, 0),
+])
+def test_to_cents_negative_amounts(amount, cents):
+    assert to_cents(amount) == cents
+
+
+def test_to_cents_returns_int():
+    assert type(to_cents(5)) is int
+
+
+@pytest.mark.parametrize("cents, amount", [(0, 0.0), (1234, 12.34), (-505, -5.05), (1, 0.01)])
+def test_from_cents(cents, amount):
+    assert from_cents(cents) == amount
+
+
+@pytest.mark.parametrize("amount", [0.01, 0.1, 9.99, 12.34, -7.5, 1234567.89])
+def test_round_trip(amount):
+    assert from_cents(to_cents(amount)) == amount
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Archive closed ledger years to Parquet
+
+Exports every closed year still in the hot table (or the years given) with
+LedgerArchiveService, the same code path as POST /ledger/archives/{year}, so
+it can run from cron. Years already archived are re-exported unless their
+rows were removed from the hot table. Needs pyarrow.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from sqlalchemy import distinct
+
+from config import LEDGER_ARCHIVE_MIN_AGE_YEARS
+from database.database import get_db_session
+from database.db_models import LedgerEntry as DBLedgerEntry
+from services.ledger_archive_service import LedgerArchiveService
+
+
+def closed_years(db) -> list:
+    """Years in the hot table that are old enough to archive"""
+    closed_through = datetime.now(timezone.utc).year - LEDGER_ARCHIVE_MIN_AGE_YEARS
+    return [row[0] for row in db.query(distinct(DBLedgerEntry.year)).filter(DBLedgerEntry.year <= closed_through).order_by(DBLedgerEntry.year)]
+
+
+def archive_years(years=None, remove_from_hot: bool = False) -> bool:
+    print("🗄️ Ledger Year Archive")
+    print("=" * 50)
+
+    db = get_db_session()
+    passed = True
+    try:
+        for year in years or closed_years(db):
+            try:
+                archive = LedgerArchiveService.archive_year(db, year, remove_from_hot)
+                print(f"   {year}: {archive['row_count']} entries, ${archive['total']:.2f}, {archive['file_bytes']} bytes")
+            except HTTPException as e:
+                print(f"❌ {year}: {e.detail}")
+                passed = False
+    finally:
+        db.close()
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("years", type=int, nargs="*", help="Years to archive (default: every closed year in the hot table)")
+    parser.add_argument("--remove-from-hot", action="store_true", help="Delete archived rows from ledger_entries")
+    args = parser.parse_args()
+
+    try:
+        passed = archive_years(args.years, args.remove_from_hot)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    sys.exit(0 if passed else 1)
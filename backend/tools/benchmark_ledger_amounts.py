@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Ledger amount storage benchmark
+
+Compares double precision, BIGINT cents and NUMERIC(12,2) amount columns on
+a scratch table: SUM throughput over a covering index, index size, and the
+rounding drift a float sum accumulates. Runs against DATABASE_URL inside a
+transaction that is rolled back, so no data is left behind.
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+ROWS = 1_000_000
+RUNS = 5
+
+COLUMNS = {
+    "float8": "amount_float double precision NOT NULL",
+    "bigint cents": "amount_cents bigint NOT NULL",
+    "numeric(12,2)": "amount_numeric numeric(12,2) NOT NULL",
+}
+
+SUMS = {
+    "float8": "SELECT user_id, SUM(amount_float) FROM bench_ledger GROUP BY user_id",
+    "bigint cents": "SELECT user_id, SUM(amount_cents) FROM bench_ledger GROUP BY user_id",
+    "numeric(12,2)": "SELECT user_id, SUM(amount_numeric) FROM bench_ledger GROUP BY user_id",
+}
+
+INDEXES = {
+    "float8": "amount_float",
+    "bigint cents": "amount_cents",
+    "numeric(12,2)": "amount_numeric",
+}
+
+
+def create_table(connection, rows: int):
+    """Fill a temporary table with the same random amounts in every representation"""
+    connection.execute(text(f"""
+        CREATE TEMP TABLE bench_ledger (
+            id serial PRIMARY KEY,
+            user_id integer NOT NULL,
+            {', '.join(COLUMNS.values())}
+        ) ON COMMIT DROP
+    """))
+    connection.execute(text("""
+        INSERT INTO bench_ledger (user_id, amount_cents, amount_float, amount_numeric)
+        SELECT user_id, cents, cents / 100.0, cents / 100.0
+        FROM (
+            SELECT (random() * 100)::int AS user_id, (random() * 200000 - 20000)::bigint AS cents
+            FROM generate_series(1, :rows)
+        ) source
+    """), {"rows": rows})
+    for label, column in INDEXES.items():
+        connection.execute(text(f"CREATE INDEX bench_{column} ON bench_ledger (user_id) INCLUDE ({column})"))
+    connection.execute(text("ANALYZE bench_ledger"))
+
+
+def time_sums(connection):
+    """Time each GROUP BY SUM, keeping the best of several runs"""
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    results = {}
+    for label, query in SUMS.items():
+        best = None
+        for _ in range(RUNS):
+            started = time.perf_counter()
+            connection.execute(text(query)).fetchall()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = best
+    return results
+
+
+def index_sizes(connection):
+    return {
+        label: connection.execute(text(f"SELECT pg_relation_size('bench_{column}')")).scalar()
+        for label, column in INDEXES.items()
+    }
+
+
+def rounding_drift(connection):
+    """Largest per-user difference between the float sum and the exact cent sum"""
+    return connection.execute(text("""
+        SELECT MAX(ABS(float_total::numeric - cents_total / 100.0)) FROM (
+            SELECT SUM(amount_float) AS float_total, SUM(amount_cents) AS cents_total
+            FROM bench_ledger GROUP BY user_id
+        ) totals
+    """)).scalar()
+
+
+def run_benchmark(database_url: str, rows: int = ROWS):
+    print("📏 Ledger Amount Storage Benchmark")
+    print("=" * 50)
+
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            print(f"🛠️ Creating {rows:,} scratch rows...")
+            create_table(connection, rows)
+
+            timings = time_sums(connection)
+            sizes = index_sizes(connection)
+            drift = rounding_drift(connection)
+
+            print(f"\n📊 SUM per user (best of {RUNS}) and covering index size")
+            for label in SUMS:
+                throughput = rows / timings[label] / 1_000_000
+                print(f"   {label:<14} {timings[label] * 1000:8.1f} ms  {throughput:6.1f} M rows/s  {sizes[label] / 1024 / 1024:7.1f} MB")
+            print(f"\n🎯 Max float8 rounding drift per user: ${drift}")
+        finally:
+            transaction.rollback()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("❌ DATABASE_URL is not set")
+        sys.exit(1)
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    try:
+        run_benchmark(database_url, rows)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
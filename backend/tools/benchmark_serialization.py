@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark
+
+Compares FastAPI's default path (jsonable_encoder, then JSONResponse's
+json.dumps) with the orjson encoder in services/json_encoding.py on synthetic
+ledger, credit-card and user payloads. Reports the best time of several runs
+and the peak memory of one encode (tracemalloc), and checks both paths decode
+to the same JSON. Ledger rows are also encoded in the Arrow stream and msgpack
+columnar formats when pyarrow / msgpack are installed. No database needed.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services.columnar_encoding import ARROW_STREAM, MSGPACK, encode_columns
+from services.json_encoding import dumps
+from services.ledger_service import LEDGER_ENTRY_COLUMNS
+
+ROW_COUNTS = [10_000, 100_000]
+RUNS = 3
+
+CATEGORIES = ["Food", "Travel", "Utilities", "Shopping", "Health"]
+CARDS = ["Visa", "Amex", "Discover"]
+
+
+def ledger_rows(count: int):
+    """Rows shaped like LedgerService responses"""
+    users = [{"id": user_id, "name": f"User {user_id}", "email": f"user{user_id}@example.com"} for user_id in range(1, 5)]
+    created = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    return [{
+        "id": index,
+        "user_id": users[index % 4]["id"],
+        "year": 2020 + index % 5,
+        "month": 1 + index % 12,
+        "category": CATEGORIES[index % len(CATEGORIES)],
+        "amount": round(10 + (index % 5000) / 7, 2),
+        "credit_card": CARDS[index % len(CARDS)],
+        "notes": None if index % 3 else f"note {index}",
+        "created_at": created + timedelta(minutes=index),
+        "updated_at": None if index % 2 else created + timedelta(days=1, minutes=index),
+        "user": users[index % 4],
+    } for index in range(count)]
+
+
+def credit_card_rows(count: int):
+    """Rows shaped like CreditCardService responses"""
+    opened = datetime(2018, 6, 1)
+    return [{
+        "id": index,
+        "user_id": 1 + index % 4,
+        "name": f"{CARDS[index % len(CARDS)]} {index}",
+        "opening_time": opened + timedelta(days=index % 2000),
+        "created_at": opened + timedelta(days=index % 2000, seconds=index),
+        "updated_at": None,
+        "user": {"id": 1 + index % 4, "name": f"User {1 + index % 4}", "email": f"user{1 + index % 4}@example.com"},
+    } for index in range(count)]
+
+
+def user_rows(count: int):
+    """Rows shaped like UserService responses"""
+    joined = datetime(2022, 3, 14, 9, 26, 53)
+    return [{
+        "id": index,
+        "email": f"user{index}@example.com",
+        "name": f"User {index}",
+        "role": "ADMIN" if index % 50 == 0 else "REGULAR",
+        "is_active": bool(index % 10),
+        "created_at": joined + timedelta(hours=index),
+        "updated_at": None,
+    } for index in range(count)]
+
+
+SHAPES = {"ledger": ledger_rows, "credit_cards": credit_card_rows, "users": user_rows}
+
+
+def default_encode(rows) -> bytes:
+    """What FastAPI does with a returned list: jsonable_encoder, then json.dumps"""
+    return JSONResponse(content=jsonable_encoder(rows)).body
+
+
+ENCODERS = {"default": default_encode, "orjson": dumps}
+
+COLUMNAR_FORMATS = {"arrow": ARROW_STREAM, "msgpack": MSGPACK}
+BATCH_ROWS = 65536
+
+
+def ledger_partitions(rows):
+    """Ledger rows as the tuples the columnar path fetches, in BATCH_ROWS partitions"""
+    tuples = [(
+        row["id"], row["user_id"], row["user"]["name"], row["user"]["email"], row["year"], row["month"],
+        row["category"], round(row["amount"] * 100), row["credit_card"], row["notes"], row["created_at"], row["updated_at"],
+    ) for row in rows]
+    return [tuples[start:start + BATCH_ROWS] for start in range(0, len(tuples), BATCH_ROWS)]
+
+
+def columnar_encoder(media_type: str):
+    """An encoder for one columnar format, or None if its package is not installed"""
+    try:
+        encode_columns(media_type, LEDGER_ENTRY_COLUMNS, [])
+    except HTTPException:
+        return None
+    return lambda partitions: b"".join(encode_columns(media_type, LEDGER_ENTRY_COLUMNS, partitions))
+
+
+def measure(encode, rows, runs: int):
+    """Best time over runs, and peak traced memory of one extra run"""
+    best = float("inf")
+    for _ in range(runs):
+        gc.collect()
+        started = time.perf_counter()
+        body = encode(rows)
+        best = min(best, time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    encode(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / (1024 * 1024), body
+
+
+def run_benchmark(row_counts, runs: int = RUNS) -> bool:
+    print("🚀 Response Serialization Benchmark")
+    print("=" * 70)
+    print(f"{'shape':<14}{'rows':>9}  {'encoder':<9}{'time ms':>10}{'peak MiB':>11}{'body MiB':>11}{'speedup':>9}")
+
+    passed = True
+    for name, build in SHAPES.items():
+        for count in row_counts:
+            rows = build(count)
+            results = {encoder: measure(encode, rows, runs) for encoder, encode in ENCODERS.items()}
+            default_ms = results["default"][0]
+            for encoder, (elapsed_ms, peak_mib, body) in results.items():
+                speedup = f"{default_ms / elapsed_ms:.1f}x" if encoder != "default" else ""
+                print(f"{name:<14}{count:>9}  {encoder:<9}{elapsed_ms:>10.1f}{peak_mib:>11.1f}{len(body) / (1024 * 1024):>11.1f}{speedup:>9}")
+            if json.loads(results["default"][2]) != json.loads(results["orjson"][2]):
+                print(f"❌ {name}: orjson output differs from the default encoder")
+                passed = False
+            if name == "ledger":
+                partitions = ledger_partitions(rows)
+                for encoder, media_type in COLUMNAR_FORMATS.items():
+                    encode = columnar_encoder(media_type)
+                    if encode is None:
+                        print(f"{name:<14}{count:>9}  {encoder:<9}{'(not installed)':>21}")
+                        continue
+                    elapsed_ms, peak_mib, body = measure(encode, partitions, runs)
+                    print(f"{name:<14}{count:>9}  {encoder:<9}{elapsed_ms:>10.1f}{peak_mib:>11.1f}{len(body) / (1024 * 1024):>11.1f}{f'{default_ms / elapsed_ms:.1f}x':>9}")
+
+    if passed:
+        print("\n✅ Both encoders produce the same JSON")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=ROW_COUNTS)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    args = parser.parse_args()
+
+    try:
+        passed = run_benchmark(args.rows, args.runs)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    sys.exit(0 if passed else 1)
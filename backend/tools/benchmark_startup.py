@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Backend cold-start benchmark
+
+Measures how long a fresh interpreter takes to import the app and run its
+startup hooks, and checks that modules only needed on first use (the model
+SDK, PIL, requests) stay out of the import path. Every run is a separate
+subprocess so nothing is shared between measurements. Exits non-zero when a
+budget is exceeded, so regressions fail CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUNS = 5
+TOP_MODULES = 10
+
+# Imported on first use only; loading any of these at startup is a regression
+LAZY_MODULES = ["google.genai", "PIL.Image", "requests"]
+
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+CHILD = f"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def run_startup():
+    await main.app.router.startup()
+    ready = time.perf_counter()
+    await main.app.router.shutdown()
+    return ready
+
+ready = asyncio.run(run_startup())
+print({RESULT_MARKER!r} + json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "eager": [name for name in {LAZY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_child(args):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+
+def measure_once():
+    """Import the app and run its startup hooks in a fresh interpreter"""
+    completed = run_child(["-c", CHILD])
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"Benchmark child failed:\n{completed.stdout[-2000:]}\n{completed.stderr[-2000:]}")
+
+
+def slowest_imports(limit: int = TOP_MODULES):
+    """Modules with the highest self import time, from -X importtime"""
+    completed = run_child(["-X", "importtime", "-c", "import main"])
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((int(self_us), int(cumulative_us), name.strip()))
+    return sorted(modules, reverse=True)[:limit]
+
+
+def run_benchmark(runs: int = RUNS, max_import_ms: float = None, max_startup_ms: float = None) -> bool:
+    print("🚀 Backend Cold-Start Benchmark")
+    print("=" * 50)
+
+    results = [measure_once() for _ in range(runs)]
+    import_ms = statistics.median(result["import_ms"] for result in results)
+    startup_ms = statistics.median(result["startup_ms"] for result in results)
+    eager = sorted({name for result in results for name in result["eager"]})
+
+    print(f"\n📊 Median of {runs} runs")
+    print(f"   import main      {import_ms:8.1f} ms")
+    print(f"   startup hooks    {startup_ms:8.1f} ms")
+
+    print(f"\n🐢 Slowest imports (self time)")
+    for self_us, cumulative_us, name in slowest_imports():
+        print(f"   {self_us / 1000:7.1f} ms  {cumulative_us / 1000:7.1f} ms cumulative  {name}")
+
+    passed = True
+    if eager:
+        print(f"\n❌ Imported at startup but should load on first use: {', '.join(eager)}")
+        passed = False
+    if max_import_ms is not None and import_ms > max_import_ms:
+        print(f"\n❌ Import time {import_ms:.1f} ms exceeds the {max_import_ms:.0f} ms budget")
+        passed = False
+    if max_startup_ms is not None and startup_ms > max_startup_ms:
+        print(f"\n❌ Startup time {startup_ms:.1f} ms exceeds the {max_startup_ms:.0f} ms budget")
+        passed = False
+    if passed:
+        print("\n✅ Cold start within budget")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-startup-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    try:
+        passed = run_benchmark(args.runs, args.max_import_ms, args.max_startup_ms)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    sys.exit(0 if passed else 1)
@@ -8,6 +8,7 @@ interface ExpenseEntry {
   year?: number;
   month?: number;
   notes?: string;
+  merchants?: string[];
 }
 
 interface AIAssistantResponse {
@@ -15,6 +16,7 @@ interface AIAssistantResponse {
   confidence: number;
   raw_response: string;
   full_prompt: string;
+  lines_resolved_locally?: number;
 }
 
 interface AIAssistantProps {
@@ -94,14 +96,77 @@ const AIAssistant: React.FC<AIAssistantProps> = ({ onConfirmEntries, onClose, cu
     setError(null);
     setAiResponse(null);
 
+    const formData = new FormData();
+    formData.append('prompt', prompt);
+    
+    if (image) {
+      formData.append('images', image);
+    }
+
+    // Try streaming first so the review table fills in as entries are extracted
     try {
-      const formData = new FormData();
-      formData.append('prompt', prompt);
-      
-      if (image) {
-        formData.append('images', image);
+      const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+      const response = await fetch(`${API_URL}/ai-assistant/process-expense-stream`, {
+        method: 'POST',
+        credentials: 'include',
+        body: formData
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      const reader = response.body?.getReader();
+      if (!reader) {
+        throw new Error('Streaming not supported');
+      }
+
+      const decoder = new TextDecoder();
+      const streamedEntries: ExpenseEntry[] = [];
+      let buffer = '';
+      setEditingEntries([]);
+
+      try {
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+
+          buffer += decoder.decode(value, { stream: true });
+          const events = buffer.split('\n\n');
+          buffer = events.pop() || '';
+
+          for (const rawEvent of events) {
+            if (!rawEvent.startsWith('data: ')) continue;
+            const event = JSON.parse(rawEvent.slice(6));
+
+            if (event.type === 'entry') {
+              // Entries for a category already shown replace that row
+              streamedEntries[event.index ?? streamedEntries.length] = event.entry;
+              setEditingEntries([...streamedEntries]);
+              setIsEditing(true);
+            } else if (event.type === 'done') {
+              setAiResponse({
+                entries: streamedEntries,
+                confidence: event.confidence,
+                raw_response: event.raw_response,
+                full_prompt: event.full_prompt,
+                lines_resolved_locally: event.lines_resolved_locally
+              });
+            } else if (event.type === 'error') {
+              setError(event.detail || 'Failed to process with AI');
+            }
+          }
+        }
+      } finally {
+        reader.releaseLock();
       }
+      setIsProcessing(false);
+      return;
+    } catch (streamingError) {
+      console.warn('Streaming failed, falling back to regular API:', streamingError);
+    }
 
+    try {
       const response = await api.post('/ai-assistant/process-expense', formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
@@ -141,6 +206,13 @@ const AIAssistant: React.FC<AIAssistantProps> = ({ onConfirmEntries, onClose, cu
     try {
       const createdCount = await onConfirmEntries(editingEntries, selectedUser, selectedCreditCard);
       setCreatedEntriesCount(createdCount);
+
+      // Teach the local categorizer which merchants belong to which category
+      api.post('/ai-assistant/merchant-rules/learn', {
+        entries: editingEntries
+          .filter(entry => entry.merchants && entry.merchants.length > 0)
+          .map(entry => ({ category: entry.category, merchants: entry.merchants }))
+      }).catch(err => console.warn('Failed to learn merchant categories:', err));
       setShowSuccessPopup(true);
     } catch (err: any) {
       setSubmitError(err.response?.data?.detail || err.message || 'Failed to add entries');
@@ -1,6 +1,7 @@
 import { useState } from 'react';
 import api from '../../../config/api';
 import { LedgerEntry } from '../types';
+import { upsertById } from '../utils/changeEvents';
 
 export const useLedgerActions = (
   ledgerData: LedgerEntry[],
@@ -137,9 +138,15 @@ export const useLedgerActions = (
       // Add entries using batch endpoint
       const response = await api.post('/ledger/entries/batch', { entries: ledgerEntries });
       
-      // Add the new entries to the beginning of the list
+      // The database is down: the server journaled the entries, and they arrive over the change feed once saved
+      if (response.status === 202) {
+        setError(`The database is offline. ${response.data.entries} entries were queued and will be saved once it is back.`);
+        return response.data.entries;
+      }
+      
+      // Add the new entries to the beginning of the list (the change feed may have added them already)
       const newEntries = response.data;
-      setLedgerData(prevData => [...newEntries, ...prevData]);
+      setLedgerData(prevData => upsertById(prevData, newEntries));
       
       setError(null);
       
@@ -165,9 +172,15 @@ export const useLedgerActions = (
       // Add entries using batch endpoint
       const response = await api.post('/ledger/entries/batch', { entries: entries });
       
-      // Add the new entries to the beginning of the list
+      // The database is down: the server journaled the entries, and they arrive over the change feed once saved
+      if (response.status === 202) {
+        setError(`The database is offline. ${response.data.entries} entries were queued and will be saved once it is back.`);
+        return response.data.entries;
+      }
+      
+      // Add the new entries to the beginning of the list (the change feed may have added them already)
       const newEntries = response.data;
-      setLedgerData(prevData => [...newEntries, ...prevData]);
+      setLedgerData(prevData => upsertById(prevData, newEntries));
       
       setError(null);
       
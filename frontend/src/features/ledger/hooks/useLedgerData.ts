@@ -1,6 +1,7 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import api from '../../../config/api';
-import { LedgerEntry, User, CreditCard, SpendingCategory } from '../types';
+import { LedgerEntry, User, CreditCard, SpendingCategory, LedgerChangeEvent } from '../types';
+import { applyChange, relabelCategory, relabelCreditCard } from '../utils/changeEvents';
 
 export const useLedgerData = () => {
   const [ledgerData, setLedgerData] = useState<LedgerEntry[]>([]);
@@ -63,6 +64,61 @@ export const useLedgerData = () => {
     fetchSpendingCategories();
   }, [fetchLedgerData, fetchUsers, fetchCreditCards, fetchSpendingCategories]);
 
+  // Latest reference lists, for relabeling entries when a card or category is renamed
+  const creditCardsRef = useRef<CreditCard[]>([]);
+  const spendingCategoriesRef = useRef<SpendingCategory[]>([]);
+  creditCardsRef.current = creditCards;
+  spendingCategoriesRef.current = spendingCategories;
+
+  // Patch local state from server-sent change events (this tab, other tabs, other household members)
+  useEffect(() => {
+    const source = new EventSource(`${api.defaults.baseURL}/ledger/changes`, { withCredentials: true });
+    let connectedBefore = false;
+
+    const resync = () => {
+      fetchLedgerData();
+      fetchCreditCards();
+      fetchSpendingCategories();
+    };
+
+    source.onmessage = (message) => {
+      const event: LedgerChangeEvent = JSON.parse(message.data);
+      switch (event.type) {
+        case 'ready':
+          // Changes made while the stream was down were missed
+          if (connectedBefore) {
+            resync();
+          }
+          connectedBefore = true;
+          break;
+        case 'resync':
+          resync();
+          break;
+        case 'ledger_entry':
+          setLedgerData(prevData => applyChange(prevData, event.action, event.data));
+          break;
+        case 'credit_card': {
+          const previous = creditCardsRef.current.find(card => card.id === event.data.id);
+          setCreditCards(prevCards => applyChange(prevCards, event.action, event.data));
+          if (event.action === 'updated') {
+            setLedgerData(prevData => relabelCreditCard(prevData, previous, event.data));
+          }
+          break;
+        }
+        case 'spending_category': {
+          const previous = spendingCategoriesRef.current.find(category => category.id === event.data.id);
+          setSpendingCategories(prevCategories => applyChange(prevCategories, event.action, event.data));
+          if (event.action === 'updated') {
+            setLedgerData(prevData => relabelCategory(prevData, previous, event.data));
+          }
+          break;
+        }
+      }
+    };
+
+    return () => source.close();
+  }, [fetchLedgerData, fetchCreditCards, fetchSpendingCategories]);
+
   return {
     ledgerData,
     setLedgerData,
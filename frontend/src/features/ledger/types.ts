@@ -36,6 +36,16 @@ export interface SpendingCategory {
   category_name: string;
 }
 
+export type ChangeAction = 'created' | 'updated' | 'deleted';
+
+// Server-sent events from /ledger/changes
+export type LedgerChangeEvent =
+  | { type: 'ready' }
+  | { type: 'resync' }
+  | { type: 'ledger_entry'; action: ChangeAction; data: LedgerEntry }
+  | { type: 'credit_card'; action: ChangeAction; data: CreditCard }
+  | { type: 'spending_category'; action: ChangeAction; data: SpendingCategory };
+
 export type TimeRange = 'all-time' | 'year-to-date' | string;
 export type DataSource = 'database';
 export type SelectedView = 'monthly-trend' | 'category-details' | 'credit-card-details' | 'detailed-data';
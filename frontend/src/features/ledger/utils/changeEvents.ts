@@ -0,0 +1,34 @@
+import { ChangeAction, CreditCard, LedgerEntry, SpendingCategory } from '../types';
+
+// Replace rows that are already present and prepend new ones, so applying
+// the same change twice (API response and change event) is harmless
+export const upsertById = <T extends { id: number }>(rows: T[], changed: T[]): T[] => {
+  const byId = new Map(changed.map(row => [row.id, row]));
+  const updated = rows.map(row => byId.get(row.id) ?? row);
+  const existingIds = new Set(rows.map(row => row.id));
+  return [...changed.filter(row => !existingIds.has(row.id)), ...updated];
+};
+
+export const applyChange = <T extends { id: number }>(rows: T[], action: ChangeAction, row: T): T[] =>
+  action === 'deleted' ? rows.filter(existing => existing.id !== row.id) : upsertById(rows, [row]);
+
+// Ledger entries carry card and category names, so renames relabel them in place
+export const relabelCreditCard = (entries: LedgerEntry[], previous: CreditCard | undefined, card: CreditCard): LedgerEntry[] => {
+  if (!previous || previous.name === card.name) {
+    return entries;
+  }
+  return entries.map(entry =>
+    entry.credit_card === previous.name && entry.user_id === previous.user_id
+      ? { ...entry, credit_card: card.name }
+      : entry
+  );
+};
+
+export const relabelCategory = (entries: LedgerEntry[], previous: SpendingCategory | undefined, category: SpendingCategory): LedgerEntry[] => {
+  if (!previous || previous.category_name === category.category_name) {
+    return entries;
+  }
+  return entries.map(entry =>
+    entry.category === previous.category_name ? { ...entry, category: category.category_name } : entry
+  );
+};